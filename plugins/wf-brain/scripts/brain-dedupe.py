@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+wf-brain dedupe - batch duplicate detection for the brain review queue
+======================================================================
+`checkDuplicate` / `hybridSearch` in mcp-server/lib/search.js compare one
+embedding at a time in JS loops, which is fine per `brain_store` call but
+makes reviewing a large `pending` queue O(n·m). This maintenance command
+does the whole comparison in one vectorized pass:
+
+1. Load every `entries` embedding and every `pending` (status='pending')
+   embedding into one contiguous, L2-normalized float32 matrix. The matrix
+   is cached as `.npy` keyed on the brain.db size/mtime and memory-mapped
+   on reuse, so repeat runs skip SQLite entirely.
+2. Compute cosine similarity tile by tile (`--block` rows × `--block`
+   columns), so peak memory is the matrix plus one block² tile no matter
+   how many entries there are.
+3. Flag pending rows whose best match is above `--threshold` (same 0.92
+   cut-off as `checkDuplicate`), and union-find near-identical rows into
+   clusters. The default `--scope=pending` only compares the queue against
+   everything (m·n); `--scope=all` also clusters entries among themselves,
+   which is quadratic in the brain size.
+4. Write a review report (markdown or JSON) for `/wf-brain:review`.
+
+The brain DB is opened read-only; nothing is approved or rejected here.
+
+Requires NumPy (`pip install numpy`).
+
+Usage:
+  python3 brain-dedupe.py [--db=.claude/brain.db] [--threshold=0.92]
+                          [--scope=pending|all] [--format=md|json]
+                          [--out=FILE] [--block=2048] [--cache-dir=DIR]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+EMBEDDING_DIM = 384            # Xenova/all-MiniLM-L6-v2 (mcp-server/lib/embed.js)
+DEFAULT_THRESHOLD = 0.92       # matches checkDuplicate's `1 - dist > 0.92`
+DEFAULT_BLOCK = 2048           # tile edge; 2048² float32 ≈ 16 MB
+DEFAULT_CACHE_DIR = Path.home() / ".wf-state" / "brain"
+SNIPPET_CHARS = 160
+
+KIND_ENTRY = 0
+KIND_PENDING = 1
+_KIND_NAMES = {KIND_ENTRY: "entry", KIND_PENDING: "pending"}
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def _find_brain_db(start: Path) -> Optional[Path]:
+    """Walk up from `start` for `.claude/brain.db` (mirrors `findBrainDb`)."""
+    for directory in (start, *start.parents):
+        candidate = directory / ".claude" / "brain.db"
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _connect_ro(db_path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+
+
+def _db_signature(db_path: Path) -> str:
+    """size/mtime of brain.db and its WAL; an empty WAL counts as absent."""
+    parts = []
+    for suffix in ("", "-wal"):
+        try:
+            st = os.stat(f"{db_path}{suffix}")
+        except OSError:
+            st = None
+        parts.append(f"{st.st_size}-{st.st_mtime_ns}" if st and st.st_size else "x")
+    return "_".join(parts)
+
+
+def _embedding_rows(conn: sqlite3.Connection) -> Iterator[Tuple[int, int, bytes]]:
+    yield from (
+        (KIND_ENTRY, row_id, blob)
+        for row_id, blob in conn.execute(
+            "SELECT id, embedding FROM entries WHERE embedding IS NOT NULL ORDER BY id"
+        )
+    )
+    yield from (
+        (KIND_PENDING, row_id, blob)
+        for row_id, blob in conn.execute(
+            "SELECT id, embedding FROM pending "
+            "WHERE status = 'pending' AND embedding IS NOT NULL ORDER BY id"
+        )
+    )
+
+
+def build_matrix(conn: sqlite3.Connection, dim: int = EMBEDDING_DIM) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Read embeddings into `(matrix, keys)`.
+
+    `matrix` is (n, dim) float32 with unit-length rows; `keys` is (n, 2)
+    int64 of `(kind, id)`. Rows are written into a preallocated buffer that
+    grows geometrically, so peak memory stays ~1× the final matrix instead
+    of a Python list of n small arrays. Blobs of the wrong length and
+    all-zero vectors are skipped.
+    """
+    (expected,) = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM entries WHERE embedding IS NOT NULL)"
+        " + (SELECT COUNT(*) FROM pending WHERE status = 'pending' AND embedding IS NOT NULL)"
+    ).fetchone()
+    capacity = max(int(expected), 1)
+    matrix = np.empty((capacity, dim), dtype=np.float32)
+    keys = np.empty((capacity, 2), dtype=np.int64)
+    n = 0
+    width = dim * 4
+    for kind, row_id, blob in _embedding_rows(conn):
+        if blob is None or len(blob) != width:
+            continue
+        if n == capacity:
+            capacity *= 2
+            matrix = np.resize(matrix, (capacity, dim))
+            keys = np.resize(keys, (capacity, 2))
+        matrix[n] = np.frombuffer(blob, dtype=np.float32)
+        keys[n] = (kind, row_id)
+        n += 1
+
+    matrix, keys = matrix[:n], keys[:n]
+    norms = np.linalg.norm(matrix, axis=1)
+    live = norms > 0
+    matrix = matrix[live]
+    matrix /= norms[live, None]
+    return np.ascontiguousarray(matrix), keys[live]
+
+
+def load_matrix(db_path: Path, cache_dir: Optional[Path]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Cached `build_matrix`: reuse (memory-mapped) while brain.db is unchanged."""
+    if cache_dir is None:
+        conn = _connect_ro(db_path)
+        try:
+            return build_matrix(conn)
+        finally:
+            conn.close()
+
+    prefix = hashlib.sha1(str(db_path.resolve()).encode()).hexdigest()[:16]
+    stem = cache_dir / f"{prefix}-{_db_signature(db_path)}"
+    matrix_file = Path(f"{stem}.matrix.npy")
+    keys_file = Path(f"{stem}.keys.npy")
+    if matrix_file.exists() and keys_file.exists():
+        try:
+            return np.load(matrix_file, mmap_mode="r"), np.load(keys_file)
+        except (OSError, ValueError):
+            pass  # corrupt cache — rebuild below
+
+    conn = _connect_ro(db_path)
+    try:
+        matrix, keys = build_matrix(conn)
+    finally:
+        conn.close()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for stale in cache_dir.glob(f"{prefix}-*.npy"):
+        stale.unlink(missing_ok=True)
+    for target, array in ((matrix_file, matrix), (keys_file, keys)):
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, target)
+    return matrix, keys
+
+
+# =============================================================================
+# SIMILARITY
+# =============================================================================
+
+class _DisjointSet:
+    """Union-find over row indices (path halving + union by size)."""
+
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+        self.size = np.ones(n, dtype=np.int64)
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return int(i)
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
+def similar_pairs(
+    matrix: "np.ndarray",
+    threshold: float,
+    block: int = DEFAULT_BLOCK,
+    rows: Optional["np.ndarray"] = None,
+) -> Iterator[Tuple["np.ndarray", "np.ndarray", "np.ndarray"]]:
+    """Yield `(i, j, sim)` index arrays for pairs with cosine > `threshold`.
+
+    Only the upper triangle is computed (`i < j`). With `rows` given, only
+    pairs where at least one side is in `rows` are produced — the cheap
+    pending-vs-everything mode. Works tile by tile, so a memory-mapped
+    `matrix` is paged in one block at a time.
+    """
+    n = matrix.shape[0]
+    if rows is None:
+        row_blocks = [np.arange(s, min(s + block, n)) for s in range(0, n, block)]
+        for bi, ri in enumerate(row_blocks):
+            left = np.asarray(matrix[ri[0]:ri[-1] + 1])
+            for rj in row_blocks[bi:]:
+                right = np.asarray(matrix[rj[0]:rj[-1] + 1])
+                tile = left @ right.T
+                if rj[0] == ri[0]:
+                    tile = np.triu(tile, k=1)
+                ii, jj = np.nonzero(tile > threshold)
+                if ii.size:
+                    yield ri[ii], rj[jj], tile[ii, jj]
+        return
+
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    is_row = np.zeros(n, dtype=bool)
+    is_row[rows] = True
+    for s in range(0, rows.size, block):
+        ri = rows[s:s + block]
+        left = np.asarray(matrix[ri])
+        for c in range(0, n, block):
+            tile = left @ np.asarray(matrix[c:c + block]).T
+            ii, jj = np.nonzero(tile > threshold)
+            if not ii.size:
+                continue
+            gi, gj = ri[ii], jj + c
+            # Drop self-pairs, and report row-vs-row pairs once (i < j).
+            keep = (gi != gj) & ~(is_row[gj] & (gj < gi))
+            if keep.any():
+                sim = tile[ii, jj][keep]
+                lo, hi = np.minimum(gi[keep], gj[keep]), np.maximum(gi[keep], gj[keep])
+                yield lo, hi, sim
+
+
+def find_duplicates(
+    matrix: "np.ndarray",
+    keys: "np.ndarray",
+    threshold: float = DEFAULT_THRESHOLD,
+    scope: str = "pending",
+    block: int = DEFAULT_BLOCK,
+) -> Dict[str, Any]:
+    """Flag duplicate pending rows and cluster near-identical memories.
+
+    Returns `{"pending": [...], "clusters": [...], "pairs": N}`: each
+    pending hit carries its best match; each cluster is a list of
+    `(kind, id)` members (size ≥ 2), largest first. `scope="all"` also
+    clusters approved entries against each other.
+    """
+    n = matrix.shape[0]
+    pending_rows = np.nonzero(keys[:, 0] == KIND_PENDING)[0] if n else np.empty(0, dtype=np.int64)
+    rows = None if scope == "all" else pending_rows
+
+    best_sim = np.full(n, -1.0, dtype=np.float32)
+    best_idx = np.full(n, -1, dtype=np.int64)
+    dsu = _DisjointSet(n)
+    pairs = 0
+    if n and (rows is None or rows.size):
+        for ii, jj, sim in similar_pairs(matrix, threshold, block, rows):
+            pairs += int(ii.size)
+            for a, b, s in zip(ii.tolist(), jj.tolist(), sim.tolist()):
+                dsu.union(a, b)
+                if s > best_sim[a]:
+                    best_sim[a], best_idx[a] = s, b
+                if s > best_sim[b]:
+                    best_sim[b], best_idx[b] = s, a
+
+    pending = []
+    for r in pending_rows.tolist():
+        if best_idx[r] < 0:
+            continue
+        match = int(best_idx[r])
+        pending.append({
+            "id": int(keys[r, 1]),
+            "match_kind": _KIND_NAMES[int(keys[match, 0])],
+            "match_id": int(keys[match, 1]),
+            "similarity": round(float(best_sim[r]), 4),
+        })
+    pending.sort(key=lambda p: p["similarity"], reverse=True)
+
+    groups: Dict[int, List[int]] = {}
+    for r in np.nonzero(best_idx >= 0)[0].tolist():
+        groups.setdefault(dsu.find(r), []).append(r)
+    clusters = sorted(
+        (
+            [{"kind": _KIND_NAMES[int(keys[r, 0])], "id": int(keys[r, 1])} for r in sorted(members)]
+            for members in groups.values()
+            if len(members) > 1
+        ),
+        key=len,
+        reverse=True,
+    )
+    return {"pending": pending, "clusters": clusters, "pairs": pairs}
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def _snippets(conn: sqlite3.Connection, result: Dict[str, Any]) -> Dict[Tuple[str, int], str]:
+    """Fetch content only for rows that appear in the report."""
+    wanted: Dict[str, set] = {"entry": set(), "pending": set()}
+    for hit in result["pending"]:
+        wanted["pending"].add(hit["id"])
+        wanted[hit["match_kind"]].add(hit["match_id"])
+    for cluster in result["clusters"]:
+        for member in cluster:
+            wanted[member["kind"]].add(member["id"])
+
+    out: Dict[Tuple[str, int], str] = {}
+    for kind, table in (("entry", "entries"), ("pending", "pending")):
+        ids = sorted(wanted[kind])
+        for s in range(0, len(ids), 500):
+            chunk = ids[s:s + 500]
+            marks = ",".join("?" * len(chunk))
+            for row_id, content in conn.execute(
+                f"SELECT id, content FROM {table} WHERE id IN ({marks})", chunk
+            ):
+                text = " ".join((content or "").split())
+                if len(text) > SNIPPET_CHARS:
+                    text = text[: SNIPPET_CHARS - 1] + "…"
+                out[(kind, row_id)] = text
+    return out
+
+
+def render_report(result: Dict[str, Any], snippets: Dict[Tuple[str, int], str], fmt: str) -> str:
+    if fmt == "json":
+        doc = dict(result)
+        doc["snippets"] = {f"{k}:{i}": text for (k, i), text in snippets.items()}
+        return json.dumps(doc, indent=2) + "\n"
+
+    meta = result.get("meta", {})
+    lines = [
+        "# wf-brain duplicate review",
+        "",
+        f"- Rows compared: {meta.get('rows', 0)} "
+        f"({meta.get('entries', 0)} entries, {meta.get('pending_rows', 0)} pending)",
+        f"- Threshold: cosine > {meta.get('threshold', DEFAULT_THRESHOLD)} (scope: {meta.get('scope', 'pending')})",
+        f"- Similar pairs: {result['pairs']}, clusters: {len(result['clusters'])}",
+        f"- Elapsed: {meta.get('elapsed_s', 0.0):.2f}s",
+        "",
+        "## Pending entries that duplicate existing memories",
+        "",
+    ]
+    if result["pending"]:
+        lines.append("| Pending | Best match | Similarity | Pending content |")
+        lines.append("|---------|------------|------------|-----------------|")
+        for hit in result["pending"]:
+            text = snippets.get(("pending", hit["id"]), "").replace("|", "\\|")
+            lines.append(
+                f"| #{hit['id']} | {hit['match_kind']} #{hit['match_id']} "
+                f"| {hit['similarity']:.3f} | {text} |"
+            )
+        lines.append("")
+        lines.append("Reject these in `/wf-brain:review` unless they add something new.")
+    else:
+        lines.append("None.")
+    lines += ["", "## Clusters of near-identical memories", ""]
+    if not result["clusters"]:
+        lines.append("None.")
+    for n, cluster in enumerate(result["clusters"], 1):
+        lines.append(f"### Cluster {n} ({len(cluster)} rows)")
+        for member in cluster:
+            text = snippets.get((member["kind"], member["id"]), "")
+            lines.append(f"- {member['kind']} #{member['id']}: {text}")
+        lines.append("")
+    return "\n".join(lines).rstrip("\n") + "\n"
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def run(
+    db_path: Path,
+    threshold: float = DEFAULT_THRESHOLD,
+    scope: str = "pending",
+    fmt: str = "md",
+    block: int = DEFAULT_BLOCK,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+) -> str:
+    started = time.perf_counter()
+    matrix, keys = load_matrix(db_path, cache_dir)
+    result = find_duplicates(matrix, keys, threshold, scope, block)
+    pending_rows = int(np.count_nonzero(keys[:, 0] == KIND_PENDING)) if keys.size else 0
+    result["meta"] = {
+        "db": str(db_path),
+        "rows": int(matrix.shape[0]),
+        "entries": int(matrix.shape[0]) - pending_rows,
+        "pending_rows": pending_rows,
+        "threshold": threshold,
+        "scope": scope,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+    conn = _connect_ro(db_path)
+    try:
+        snippets = _snippets(conn, result)
+    finally:
+        conn.close()
+    return render_report(result, snippets, fmt)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Flag duplicate / near-identical wf-brain memories.")
+    parser.add_argument("--db", type=Path, help="brain.db path (default: walk up from cwd for .claude/brain.db)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--scope", choices=("pending", "all"), default="pending",
+                        help="pending: compare the review queue against everything; all: also cluster entries")
+    parser.add_argument("--format", dest="fmt", choices=("md", "json"), default="md")
+    parser.add_argument("--out", type=Path, help="write the report here instead of stdout")
+    parser.add_argument("--block", type=int, default=DEFAULT_BLOCK)
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("brain-dedupe: NumPy is required (pip install numpy)", file=sys.stderr)
+        return 2
+    db_path = args.db or _find_brain_db(Path.cwd())
+    if db_path is None or not db_path.is_file():
+        print("brain-dedupe: no .claude/brain.db found — run /wf-brain:init first", file=sys.stderr)
+        return 1
+
+    try:
+        report = run(
+            db_path, args.threshold, args.scope, args.fmt, max(args.block, 1),
+            None if args.no_cache else args.cache_dir,
+        )
+    except sqlite3.Error as e:
+        print(f"brain-dedupe: {e}", file=sys.stderr)
+        return 1
+    if args.out:
+        args.out.write_text(report)
+    else:
+        sys.stdout.write(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
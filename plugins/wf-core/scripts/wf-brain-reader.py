@@ -0,0 +1,154 @@
+"""
+WF Brain Reader - read-only keyword search over a project's wf-brain store
+==========================================================================
+Used by the orchestrator at session start to inject the few brain entries
+matching the current branch / WIP. Kept out of `wf-orchestrator.py` so the
+per-call hooks never load it; imported on demand (`_load_sibling`), and it
+reaches the orchestrator's constants through `sys.modules["wf_orchestrator"]`.
+"""
+
+import hashlib
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+wo = sys.modules["wf_orchestrator"]
+
+
+# Words that carry no signal in a WIP line / branch name.
+_BRAIN_STOPWORDS = frozenset("""
+    the and for with from into that this then than are was were will have has
+    not but all any can our your their its via per out off use using
+    feat feature fix bugfix hotfix chore refactor docs test tests wip main
+    master develop release issue task todo
+""".split())
+
+
+def _find_brain_db(cwd: str) -> Optional[Path]:
+    """Walk up from `cwd` for `.claude/brain.db` (mirrors `findBrainDb` in db.js)."""
+    current = Path(cwd)
+    for directory in (current, *current.parents):
+        candidate = directory / ".claude" / "brain.db"
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _fts_query(text: str, max_terms: int = 16) -> Optional[str]:
+    """Turn free text into an FTS5 OR-query of quoted terms (no syntax leaks)."""
+    terms: List[str] = []
+    for word in re.findall(r"[a-z0-9][a-z0-9_]{2,}", text.lower()):
+        if word not in _BRAIN_STOPWORDS and not word.isdigit() and word not in terms:
+            terms.append(word)
+    if not terms:
+        return None
+    return " OR ".join(f'"{t}"' for t in terms[:max_terms])
+
+
+class BrainIndex:
+    """Keyword search over a project's wf-brain `entries`, without Node.
+
+    The brain DB (owned by the wf-brain MCP server) is only ever opened
+    `mode=ro`. Matching runs against an FTS5 shadow index in our own state
+    dir, synced incrementally: a size/mtime signature of `brain.db` and its
+    WAL short-circuits the common case, otherwise rows with
+    `updated_at >=` the last sync are upserted and deletions are detected
+    by row count.
+    """
+
+    def __init__(self, db_path: Path, index_dir: Path):
+        self.db_path = db_path
+        digest = hashlib.sha1(str(db_path.resolve()).encode()).hexdigest()[:16]
+        self.index_path = index_dir / f"{digest}.fts.db"
+
+    def _source_sig(self) -> str:
+        # An empty WAL counts as absent: opening a WAL-mode DB read-only
+        # creates one, which must not look like a change on the next call.
+        parts = []
+        for suffix in ("", "-wal"):
+            try:
+                st = os.stat(f"{self.db_path}{suffix}")
+            except OSError:
+                st = None
+            parts.append(f"{st.st_size}:{st.st_mtime_ns}" if st and st.st_size else "-")
+        return "|".join(parts)
+
+    def _open_index(self):
+        import sqlite3
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        conn.executescript(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5("
+            "content, tags, category, tokenize='porter unicode61');"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        return conn
+
+    def sync(self, index) -> bool:
+        """Bring the shadow index up to date. Returns True if it changed."""
+        import sqlite3
+
+        sig = self._source_sig()
+        meta = dict(index.execute("SELECT key, value FROM meta"))
+        if meta.get("sig") == sig:
+            return False
+
+        source = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            rows = source.execute(
+                "SELECT id, content, tags, category, updated_at FROM entries "
+                "WHERE updated_at >= ? ORDER BY updated_at",
+                (meta.get("updated_at", ""),),
+            ).fetchall()
+            with index:
+                for row_id, content, tags, category, _ in rows:
+                    index.execute("DELETE FROM fts WHERE rowid = ?", (row_id,))
+                    index.execute(
+                        "INSERT INTO fts (rowid, content, tags, category) VALUES (?, ?, ?, ?)",
+                        (row_id, content or "", tags or "", category or ""),
+                    )
+                # Every live row was upserted at some point, so a surplus in
+                # the shadow index means rows were deleted upstream.
+                (live_count,) = source.execute("SELECT COUNT(*) FROM entries").fetchone()
+                (shadow_count,) = index.execute("SELECT COUNT(*) FROM fts").fetchone()
+                if shadow_count != live_count:
+                    live = {r[0] for r in source.execute("SELECT id FROM entries")}
+                    stale = [(r[0],) for r in index.execute("SELECT rowid FROM fts") if r[0] not in live]
+                    index.executemany("DELETE FROM fts WHERE rowid = ?", stale)
+                updates = {"sig": sig}
+                if rows:
+                    updates["updated_at"] = rows[-1][4]
+                index.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", updates.items()
+                )
+        finally:
+            source.close()
+        return True
+
+    def search(self, text: str, k: int = wo.BRAIN_TOP_K) -> List[Dict[str, Any]]:
+        """Top-`k` entries for `text` by BM25 (tags weighted double). [] on any error."""
+        import sqlite3
+
+        match = _fts_query(text)
+        if not match or k <= 0:
+            return []
+        try:
+            index = self._open_index()
+            try:
+                self.sync(index)
+                rows = index.execute(
+                    "SELECT rowid, content, category, tags FROM fts WHERE fts MATCH ? "
+                    "ORDER BY bm25(fts, 1.0, 2.0, 1.0) LIMIT ?",
+                    (match, k),
+                ).fetchall()
+            finally:
+                index.close()
+        except sqlite3.Error:
+            return []
+        return [
+            {"id": row_id, "content": content, "category": category, "tags": tags}
+            for row_id, content, category, tags in rows
+        ]
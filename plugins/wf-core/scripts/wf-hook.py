@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+WF Hook - per-call entry point for the wf-core hooks
+====================================================
+`hooks/hooks.json` runs this on every PreToolUse, PostToolUse and Stop
+event. The logic lives in `wf-orchestrator.py`; run as `__main__` that
+file would be recompiled on every call, so this stub imports it as a
+module instead and Python keeps its bytecode in `__pycache__` (or under
+`~/.wf-state/pycache` when the plugin directory is read-only).
+
+PreToolUse fires for every tool, but only Read, Bash and Grep are
+checked; for the rest the hook just drops the tool-timing start marker,
+which this stub writes itself without loading the orchestrator at all.
+
+Usage:
+  PostToolUse: python3 wf-hook.py
+  PreToolUse:  python3 wf-hook.py --mode=pre-tool-use
+  Stop:        python3 wf-hook.py --mode=stop
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+_STATE_DIR = os.path.expanduser("~/.wf-state")
+
+# Must match PRE_TOOL_GUARDED_TOOLS and `_tool_start_path` in
+# wf-orchestrator.py, which reads the markers back at PostToolUse.
+_GUARDED_TOOLS = ("Read", "Bash", "Grep")
+
+
+def _load_orchestrator():
+    """Import the sibling `wf-orchestrator.py` (hyphenated, so not importable by name)."""
+    import importlib.util
+
+    if not os.access(_SCRIPTS_DIR, os.W_OK):
+        sys.pycache_prefix = os.path.expanduser("~/.wf-state/pycache")
+    spec = importlib.util.spec_from_file_location(
+        "wf_orchestrator", os.path.join(_SCRIPTS_DIR, "wf-orchestrator.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["wf_orchestrator"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _mark_tool_start(hook_input):
+    """Write the PreToolUse start marker for an unguarded tool."""
+    key = hook_input.get("tool_use_id") or hook_input.get("tool_name") or "tool"
+    key = re.sub(r"[^A-Za-z0-9_-]", "", str(key))[:128]
+    path = os.path.join(_STATE_DIR, "tool_start", f"{hook_input.get('session_id', 'unknown')}.{key}")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(f"{time.time():.3f}")
+    except OSError:
+        pass
+
+
+def main():
+    started = time.perf_counter()
+    mode = "post_tool_use"
+    for arg in sys.argv[1:]:
+        if arg.startswith("--mode="):
+            mode = arg[len("--mode="):]
+
+    try:
+        hook_input = json.loads(sys.stdin.read())
+    except ValueError:
+        hook_input = {}
+
+    if mode == "pre-tool-use" and hook_input.get("tool_name") not in _GUARDED_TOOLS:
+        _mark_tool_start(hook_input)
+        sys.exit(0)
+    sys.exit(_load_orchestrator().run_hook(mode, hook_input, started))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ Handles:
 2. Context monitoring: warning at 75%, /wf-core:wf-end-session trigger at 90% (configurable)
 3. Stop hook with autonomy mode support (interactive checkpoint)
 4. Workflow routing (Jira vs GitHub)
+5. Subagent context monitoring (wf-delegate / wf-team-delegate sidechains)
+6. Session handoff digest (written on Stop / CRITICAL, injected at next start)
 
 Context monitoring reads token usage straight from the transcript JSONL —
 no subprocess `claude -p -r /context` extraction (recursive, brittle, format
@@ -14,18 +16,61 @@ drifts). The window size auto-calibrates from observed peak usage against
 standard Anthropic tiers (200K / 1M / 2M); override via the `WF_CONTEXT_LIMIT`
 env var or a `contextLimit` field in `workflow.json` for per-project pinning.
 
+Transcripts are scanned incrementally: the byte offset reached on the last
+call is kept in session state (`transcript_cursor`) and the next call only
+parses lines appended since. The same cursor lets offline tooling
+(`--mode=stats`) aggregate thousands of sessions without rescanning them.
+Rotated (`transcript.jsonl.1`, …) and gzip/zstd-archived segments are
+stream-decompressed and read as one logical transcript.
+
+Set `WF_METRICS_TEXTFILE=/path/to/wf.prom` to have the hook maintain a
+Prometheus textfile (node_exporter textfile collector) aggregated across all
+recently active sessions.
+
+Transcript scans are admission-controlled host-wide: at most
+`WF_MAX_CONCURRENT_SCANS` hook processes scan at once (flock'd slot files
+under STATE_DIR/slots); the rest answer from their session's cached reading
+rather than queue toward the hook timeout. Hooks of one session serialise
+their state updates on a per-session flock (STATE_DIR/locks), so parallel
+tool calls never drop each other's counters.
+
+Every tool call is timed (PreToolUse start marker → PostToolUse) into
+per-tool latency histograms kept in session state; `--mode=report` shows
+where the session's wall-clock time went.
+
+Claude Code runs the hooks through `wf-hook.py`, which imports this file as
+a module (bytecode cached) instead of compiling it on every call. Offline
+tooling lives in `wf-reports.py` and the wf-brain reader in
+`wf-brain-reader.py`; both are loaded only when needed.
+
 Usage:
-  PostToolUse: python3 wf-orchestrator.py
-  Stop:        python3 wf-orchestrator.py --mode=stop
+  PostToolUse: python3 wf-hook.py
+  PreToolUse:  python3 wf-hook.py --mode=pre-tool-use
+  Stop:        python3 wf-hook.py --mode=stop
+  Stats:       python3 wf-orchestrator.py --mode=stats [--format=json|csv] [--workers=N]
+  Top:         python3 wf-orchestrator.py --mode=top [--interval=SECONDS] [--once]
+  Timeline:    python3 wf-orchestrator.py --mode=timeline --session=ID [--format=csv|json]
+  Report:      python3 wf-orchestrator.py --mode=report [--session=ID] [--format=text|json]
 """
 
 import sys
+import contextlib
+import itertools
 import json
 import os
-import subprocess
+import re
+import struct
+import zlib
+import time
+from collections import Counter, deque
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, BinaryIO, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: admission control is skipped
+    fcntl = None
 
 # =============================================================================
 # CONFIGURATION
@@ -66,18 +111,1120 @@ else:
     # Fallback so the script is still runnable outside a plugin context (e.g., tests).
     PLUGIN_ROOT = Path(__file__).resolve().parent.parent
 
+# The last complete line before the cursor offset is fingerprinted (CRC32
+# of at most this many trailing bytes) so a rewritten — rather than
+# appended-to — transcript is detected and rescanned from the start.
+CURSOR_TAIL_BYTES = 64 * 1024
+# Read size for streaming transcript scans (plain and decompressed alike).
+TRANSCRIPT_READ_CHUNK = 1024 * 1024
+# Warning→critical intervals retained per session (oldest dropped first).
+WARN_TO_CRITICAL_KEEP = 20
+# Subagent (sidechain) transcripts spawned by wf-delegate / wf-team-delegate.
+# Scans run on a few daemon threads and stop being scheduled once the
+# budget is spent; each reads at most SUBAGENT_SCAN_MAX_BYTES past its
+# cursor, so a scan still running at the deadline is short and abandoned
+# rather than joined. Agents not reached (or not finished) keep their
+# previous reading and carry on from their cursor at the next tool call.
+SUBAGENT_SCAN_WORKERS = 8
+SUBAGENT_SCAN_BUDGET_S = 1.5
+SUBAGENT_SCAN_MAX_BYTES = 4 * 1024 * 1024
+SUBAGENT_MAX_TRACKED = 64   # most recently written agent transcripts kept in state
+# Prometheus textfile export (node_exporter textfile collector). Opt-in via
+# `WF_METRICS_TEXTFILE=/path/to/wf.prom`; the file is rebuilt (by
+# wf-reports.py) from all recently active session states at most every
+# METRICS_INTERVAL_S seconds.
+METRICS_INTERVAL_S = 15
+HOOK_LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Injected additionalContext accounting (workflow.json `contextBudget`).
+# Tokens are estimated at ~4 chars each — close enough for budgeting
+# without shipping a tokenizer.
+CHARS_PER_TOKEN = 4
+INJECTED_SEEN_KEEP = 64  # dedupe keys remembered per compaction cycle
+# wf-brain auto-inject at session start (workflow.json `brain.autoInject`,
+# `brain.topK`). The FTS5 shadow index lives under STATE_DIR/brain.
+BRAIN_TOP_K = 3
+BRAIN_ENTRY_CHARS = 240
+# Autonomy checkpoint (Stop hook). The hook itself is killed at 60s, so the
+# whole interactive exchange must finish well inside that.
+DEFAULT_CHECKPOINT_TIMEOUT = 30
+MAX_CHECKPOINT_TIMEOUT = 50
+PROGRESS_PREVIEW_LINES = 80
+# Per-session token timeline: STATE_DIR/timeline/{session_id}.tl, one
+# fixed-width little-endian record per observed turn (uint32 unix time,
+# uint32 context tokens). Trimmed to the newest half past the cap.
+TIMELINE_RECORD = struct.Struct("<II")
+TIMELINE_MAX_RECORDS = 4096
+TIMELINE_RATE_SAMPLES = 10   # turns in the rolling growth-rate window
+# PreToolUse guard (`contextMonitor.preToolGuard`: "advise" | "block" | "off").
+# Cost caps mirror Claude Code's own output limits: Read refuses files over
+# ~25K tokens, Bash output is truncated at 30K chars.
+READ_MAX_TOKENS = 25_000
+BASH_MAX_TOKENS = 30_000 // CHARS_PER_TOKEN
+READ_BYTES_PER_LINE = 120    # for Read calls with an explicit `limit`
+GUARD_MIN_TOKENS = 2_000     # calls cheaper than this are never flagged
+_BASH_BOUNDED = re.compile(r"\|\s*(head|tail|wc|grep\s+-[a-zA-Z]*[cl])\b|>\s*[^&|]+$|\s-n\s*\d+|--max-count")
+_BASH_VERBOSE = re.compile(
+    r"^\s*(cat|less|find|tree|ls\s+-[a-zA-Z]*R|grep\s+-[a-zA-Z]*r|rg|git\s+(log|diff|show)|"
+    r"npm\s+(test|run)|pytest|jest|cargo\s+(build|test)|make)\b"
+)
+# Per-tool wall-clock latency. PreToolUse drops a start marker at
+# STATE_DIR/tool_start/{session}.{tool_use_id}; the matching PostToolUse
+# reads and removes it and folds the duration into state["tool_latency"].
+# Markers left by calls that never finish (denied, failed) are ignored
+# past TOOL_START_MAX_AGE_S and swept with the other old state files.
+TOOL_LATENCY_BUCKETS: Tuple[float, ...] = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+TOOL_LATENCY_MAX_TOOLS = 32     # further tool labels fold into "other"
+TOOL_START_MAX_AGE_S = 2 * 3600
+# PreToolUse only loads the orchestrator for these; wf-hook.py writes the
+# start marker for every other tool itself and exits.
+PRE_TOOL_GUARDED_TOOLS = ("Read", "Bash", "Grep")
+_BASH_SEPARATORS = re.compile(r"&&|\|\||[;|]")
+_BASH_WRAPPERS = frozenset({"sudo", "time", "env", "nohup", "exec", "command"})
+# Redundant-read notices (`contextMonitor.redundantReads`, default on). A
+# per-session index of what Read/Grep already put in context, scoped per
+# subagent; least recently read entries drop past READ_INDEX_MAX.
+READ_INDEX_MAX = 256
+READ_INDEX_MAX_SPANS = 8            # distinct line ranges kept per file
+READ_DEFAULT_LIMIT = 2000           # lines a Read without `limit` returns
+READ_HASH_MAX_BYTES = 1024 * 1024   # larger files compare by size/mtime only
+# Context below this share of what it was at the earlier read means a
+# compaction happened in between and the earlier copy is gone.
+READ_COMPACTION_RATIO = 0.75
+_WRITE_TOOLS = frozenset({"Edit", "MultiEdit", "Write", "NotebookEdit", "Bash"})
+# Session handoff digest: STATE_DIR/handoff/{cwd hash}.json, rebuilt on Stop
+# and at CRITICAL from the transcript (incrementally, from the offset kept
+# in state["handoff"]) and injected at the next session start in the same
+# directory.
+HANDOFF_MAX_CHARS = 1200        # ~300 tokens, hard cap on the injected digest
+HANDOFF_TOP_FILES = 5
+HANDOFF_MAX_ERRORS = 3
+HANDOFF_MAX_AGE_S = 3 * 86400   # older digests are not injected
+HANDOFF_TRACKED_FILES = 256     # per-counter cap; least-touched files dropped
+HANDOFF_PENDING_KEEP = 64       # tool_use ids awaiting their result
+_EDIT_TOOLS = frozenset({"Edit", "MultiEdit", "Write", "NotebookEdit"})
+# Host-wide admission control for transcript scans: at most
+# `WF_MAX_CONCURRENT_SCANS` (default: CPU count, min 2; 0 = unlimited)
+# hook processes scan at once, each holding an flock on one of the
+# STATE_DIR/slots/scan-N.lock files. A process that can't get a slot within
+# SCAN_ADMIT_WAIT_S answers from the session's cached reading instead.
+SCAN_ADMIT_WAIT_S = 0.25
+SCAN_ADMIT_POLL_S = 0.01
+# Per-session state lock (STATE_DIR/locks/{session}.lock). Every hook
+# process rewrites the whole state file, and parallel tool calls run their
+# hooks concurrently. Each update re-reads the file, mutates and saves it
+# under the lock (`_state_update`), so it is held for milliseconds — never
+# across a transcript scan or a prompt. Counters are bumped on the fresh
+# copy; scan results (cursors, subagent readings) are last writer wins.
+# Reads that only decide take no lock: the file is replaced atomically.
+# An update that can't get the lock in SESSION_LOCK_WAIT_S is skipped (the
+# next one catches up); PreToolUse tries it once and never waits.
+SESSION_LOCK_WAIT_S = 3.0
+# Git WIP at session start reads `.git/index` directly: ctime s/ns,
+# mtime s/ns, dev, ino, mode, uid, gid, size, SHA-1, flags per entry.
+# Larger indexes aren't swept for modified files.
+_GIT_INDEX_ENTRY = struct.Struct(">10I20sH")
+GIT_INDEX_MAX_ENTRIES = 20_000
+
+
+# =============================================================================
+# TRANSCRIPT SCANNING
+# =============================================================================
+
+def _usage_total(entry: Dict[str, Any]) -> int:
+    """Context occupancy carried by one transcript entry (0 when absent).
+
+    input + cache_creation + cache_read — see `_get_context_usage`.
+    """
+    message = entry.get("message")
+    if not isinstance(message, dict):
+        return 0
+    usage = message.get("usage")
+    if not isinstance(usage, dict):
+        return 0
+    return (
+        int(usage.get("input_tokens", 0) or 0)
+        + int(usage.get("cache_creation_input_tokens", 0) or 0)
+        + int(usage.get("cache_read_input_tokens", 0) or 0)
+    )
+
+
+def _infer_tier(observed_max: int) -> Optional[int]:
+    """Smallest standard tier that fits `observed_max`, or None when the
+    observation is too small (≤ 200K) to tell the tiers apart."""
+    if observed_max <= 200_000:
+        return None
+    for tier in STANDARD_TIERS:
+        if tier >= observed_max:
+            return tier
+    return STANDARD_TIERS[-1]
+
+
+# Per-process transcript-scan outcomes ("noop" / "resume" / "full",
+# "segment_hit" / "segment_miss"); folded into session metrics by
+# `WFOrchestrator.record_hook_metrics` for the cache-hit ratio.
+_SCAN_STATS: Counter = Counter()
+
+
+def _new_cursor(path: str) -> Dict[str, Any]:
+    return {
+        "path": path, "offset": 0, "tail_len": 0, "tail_crc": 0,
+        "latest": 0, "observed_max": 0,
+    }
+
+
+def _open_transcript(path: str) -> Optional[BinaryIO]:
+    """Open a transcript segment for streaming binary reads.
+
+    `.gz` is decompressed on the fly via gzip; `.zst` via the optional
+    `zstandard` module (None when it isn't installed). Anything else is
+    opened as plain JSONL.
+    """
+    if path.endswith(".gz"):
+        import gzip
+
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            return None
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def _iter_lines(f: BinaryIO) -> Iterator[bytes]:
+    """Yield lines from a binary stream in TRANSCRIPT_READ_CHUNK reads.
+
+    Complete lines keep their trailing newline; a final unterminated
+    fragment is yielded without one. Memory is bounded by the chunk size
+    plus the longest single line, whatever the file size.
+    """
+    # read1 hands back whatever the decompressor has ready, so a truncated
+    # archive still yields the lines before the damage.
+    read = getattr(f, "read1", f.read)
+    pending = b""
+    while True:
+        block = read(TRANSCRIPT_READ_CHUNK)
+        if not block:
+            break
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+def _line_usage(raw: bytes) -> int:
+    """Usage total for one raw JSONL line; 0 for non-usage or malformed lines."""
+    # Cheap byte check first — most lines (tool results, user turns) carry no
+    # usage block and don't need a JSON parse at all.
+    if b'"usage"' not in raw:
+        return 0
+    try:
+        entry = json.loads(raw)
+    except ValueError:
+        # Malformed line — skip; partial-write tail is the
+        # common case here, not a hard failure.
+        return 0
+    if not isinstance(entry, dict):
+        return 0
+    return _usage_total(entry)
+
+
+def _scan_transcript(
+    path: str, cursor: Optional[Dict[str, Any]] = None, max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
+    """Advance a transcript cursor over lines appended since the last scan.
+
+    The cursor is a plain dict (JSON-serialisable, lives in session state):
+    `offset` is the byte position after the last complete line consumed,
+    `tail_len` / `tail_crc` fingerprint that line, and `latest` /
+    `observed_max` are the running readings. A cursor for another path, an
+    offset past EOF, or a fingerprint that no longer matches (file
+    rewritten) restarts the scan from byte 0.
+
+    A trailing line without its newline is still read for `latest` (the
+    common partial-write case is skipped as malformed JSON) but the offset
+    stays before it, so it is re-read once complete. With `max_bytes` the
+    scan stops at the first line boundary past that many bytes; the
+    cursor (and `latest`) stand there and the next call resumes. Returns
+    a new dict; the input cursor is not mutated.
+    """
+    cur = dict(cursor) if cursor and cursor.get("path") == path else _new_cursor(path)
+    latest = cur["latest"]
+    observed_max = cur["observed_max"]
+    last_line = b""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = int(cur.get("offset", 0) or 0)
+            if offset > size:
+                cur = _new_cursor(path)
+                latest = observed_max = offset = 0
+            elif offset > 0:
+                tail_len = int(cur.get("tail_len", 0) or 0)
+                f.seek(offset - tail_len)
+                if zlib.crc32(f.read(tail_len)) != cur.get("tail_crc"):
+                    cur = _new_cursor(path)
+                    latest = observed_max = offset = 0
+            if offset == size:
+                _SCAN_STATS["noop"] += 1
+                return cur
+            _SCAN_STATS["resume" if offset else "full"] += 1
+            f.seek(offset)
+            consumed = offset
+            for line in _iter_lines(f):
+                total = _line_usage(line)
+                if total > 0:
+                    latest = total
+                    if total > observed_max:
+                        observed_max = total
+                if line.endswith(b"\n"):
+                    consumed += len(line)
+                    last_line = line
+                    if max_bytes is not None and consumed - offset >= max_bytes:
+                        break
+    except OSError:
+        return cur
+
+    cur["latest"] = latest
+    cur["observed_max"] = observed_max
+    if last_line:
+        tail = last_line[-CURSOR_TAIL_BYTES:]
+        cur["offset"] = consumed
+        cur["tail_len"] = len(tail)
+        cur["tail_crc"] = zlib.crc32(tail)
+    return cur
+
+
+def _scan_segment(path: str) -> Optional[Dict[str, int]]:
+    """Full streaming scan of one (possibly compressed) segment.
+
+    Returns `{"latest", "observed_max"}`, or None when the segment can't be
+    opened (missing, or `.zst` without the `zstandard` module). A corrupt or
+    truncated archive keeps whatever was read before the error.
+    """
+    latest = observed_max = 0
+    try:
+        f = _open_transcript(path)
+        if f is None:
+            return None
+        with f:
+            for line in _iter_lines(f):
+                total = _line_usage(line)
+                if total > 0:
+                    latest = total
+                    observed_max = max(observed_max, total)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        pass  # damaged archive — partial reading is still useful
+    return {"latest": latest, "observed_max": observed_max}
+
+
+def _transcript_chain(path: str) -> List[str]:
+    """Oldest-first segments making up one logical transcript.
+
+    Rotation follows the logrotate convention: `<path>.1` is the most
+    recently rotated segment, higher numbers are older, and any segment
+    (including an archived base, `<path>.gz`) may carry a `.gz` / `.zst`
+    suffix. Numbering is assumed contiguous — probing stops at the first
+    gap, so an unrotated transcript costs three failed `stat`s.
+    """
+    rotated: List[str] = []
+    n = 1
+    while True:
+        base = f"{path}.{n}"
+        segment = next(
+            (c for c in (base, base + ".gz", base + ".zst") if os.path.exists(c)), None
+        )
+        if segment is None:
+            break
+        rotated.append(segment)
+        n += 1
+    rotated.reverse()
+    for candidate in (path, path + ".gz", path + ".zst"):
+        if os.path.exists(candidate):
+            rotated.append(candidate)
+            break
+    return rotated
+
+
+def _scan_transcript_chain(
+    path: str,
+    cursor: Optional[Dict[str, Any]] = None,
+    segments: Optional[Dict[str, Dict[str, int]]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, int]], int, int]:
+    """Scan a rotated / compressed transcript chain as one logical stream.
+
+    The live plain-text segment (the uncompressed base) advances the
+    incremental `cursor`; every other segment is immutable once rotated or
+    archived, so its reading is cached in `segments` keyed by
+    "size:mtime_ns" — a rename during rotation (`.1` → `.2`) keeps the key
+    and costs nothing. Only keys for the current chain are kept.
+
+    Returns `(cursor, segments, latest, observed_max)`.
+    """
+    segments = segments or {}
+    cursor = dict(cursor) if cursor else _new_cursor(path)
+    fresh: Dict[str, Dict[str, int]] = {}
+    latest = observed_max = 0
+
+    for segment in _transcript_chain(path):
+        if segment == path and not path.endswith((".gz", ".zst")):
+            cursor = _scan_transcript(segment, cursor)
+            reading: Optional[Dict[str, int]] = cursor
+        else:
+            try:
+                st = os.stat(segment)
+            except OSError:
+                continue
+            key = f"{st.st_size}:{st.st_mtime_ns}"
+            reading = segments.get(key)
+            _SCAN_STATS["segment_hit" if reading else "segment_miss"] += 1
+            if reading is None:
+                reading = _scan_segment(segment)
+            if reading is None:
+                continue
+            fresh[key] = {"latest": reading["latest"], "observed_max": reading["observed_max"]}
+        if reading["latest"] > 0:
+            latest = reading["latest"]
+        observed_max = max(observed_max, reading["observed_max"])
+
+    return cursor, fresh, latest, observed_max
+
+
+def iter_transcript_entries(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream every parsed entry of a transcript chain, oldest first.
+
+    Public helper for replay / offline tooling: handles rotated and
+    compressed segments without decompressing to disk, in bounded memory.
+    Malformed lines are skipped; a damaged archive ends its segment early.
+    """
+    for segment in _transcript_chain(path):
+        try:
+            f = _open_transcript(segment)
+        except OSError:
+            continue
+        if f is None:
+            continue
+        with f:
+            lines = _iter_lines(f)
+            while True:
+                try:
+                    line = next(lines)
+                except StopIteration:
+                    break
+                except Exception:
+                    break  # damaged archive — move on to the next segment
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+
+
+def _discover_subagent_transcripts(
+    transcript_path: str,
+    session_id: str,
+    since: float,
+    probe: Dict[str, Any],
+) -> Dict[str, str]:
+    """Map agent id → transcript path for the subagents of one session.
+
+    Two on-disk layouts are recognised:
+
+    - `<project dir>/<session_id>/subagents/agent-*.jsonl` — current
+      Claude Code; everything in the folder belongs to this session.
+    - `<project dir>/agent-*.jsonl` — older builds wrote sidechains next to
+      the main transcript, tagged with the parent `sessionId` on each line.
+      Only files written since `since` are probed (first line only), and
+      verdicts are memoised in `probe["names"]` (name → belongs-to-session)
+      so each file is opened at most once per session. The directory is
+      only re-listed when its mtime moves (i.e. a file was created).
+    """
+    found: Dict[str, str] = {}
+    project_dir = os.path.dirname(transcript_path)
+
+    nested = os.path.join(project_dir, session_id, "subagents")
+    try:
+        with os.scandir(nested) as it:
+            for entry in it:
+                if entry.name.startswith("agent-") and entry.name.endswith(".jsonl"):
+                    found[entry.name[len("agent-"):-len(".jsonl")]] = entry.path
+    except OSError:
+        pass
+
+    names: Dict[str, bool] = probe.setdefault("names", {})
+    try:
+        dir_mtime = os.stat(project_dir).st_mtime_ns
+    except OSError:
+        return found
+    if dir_mtime != probe.get("dir_mtime"):
+        try:
+            with os.scandir(project_dir) as it:
+                legacy = [
+                    e for e in it
+                    if e.name.startswith("agent-") and e.name.endswith(".jsonl")
+                    and e.name not in names
+                ]
+        except OSError:
+            legacy = []
+        for entry in legacy:
+            try:
+                if entry.stat().st_mtime < since:
+                    continue
+                with open(entry.path, "rb") as f:
+                    line = f.readline()
+                if not line.endswith(b"\n"):
+                    continue  # first line not written yet — probe again later
+                first = json.loads(line)
+            except (OSError, ValueError):
+                continue
+            names[entry.name] = isinstance(first, dict) and first.get("sessionId") == session_id
+        probe["dir_mtime"] = dir_mtime
+
+    for name, verdict in names.items():
+        if verdict:
+            found.setdefault(name[len("agent-"):-len(".jsonl")], os.path.join(project_dir, name))
+    return found
+
+
+def _timeline_path(session_id: str) -> Path:
+    return STATE_DIR / "timeline" / f"{session_id}.tl"
+
+
+def append_timeline(path: Path, tokens: int, ts: Optional[float] = None):
+    """Append one `(time, tokens)` record; trim to the newest half past the cap."""
+    record = TIMELINE_RECORD.pack(int(ts if ts is not None else time.time()), max(0, min(tokens, 0xFFFFFFFF)))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        f.write(record)
+        size = f.tell()
+    if size > TIMELINE_MAX_RECORDS * TIMELINE_RECORD.size:
+        keep = read_timeline(path, last=TIMELINE_MAX_RECORDS // 2)
+        _atomic_write_bytes(path, b"".join(TIMELINE_RECORD.pack(t, n) for t, n in keep))
+
+
+def read_timeline(path: Path, last: Optional[int] = None) -> List[Tuple[int, int]]:
+    """`(unix_time, tokens)` records, oldest first; only the tail when `last` is set.
+
+    Public for replay / stats tooling. A torn trailing record (crash
+    mid-append) is ignored.
+    """
+    size = TIMELINE_RECORD.size
+    try:
+        with open(path, "rb") as f:
+            if last is not None:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, (f.tell() // size - last) * size))
+            data = f.read()
+    except OSError:
+        return []
+    data = data[: len(data) - len(data) % size]
+    return list(TIMELINE_RECORD.iter_unpack(data))
+
+
+def _growth_forecast(
+    samples: List[Tuple[int, int]], critical_tokens: int
+) -> Tuple[Optional[float], Optional[int]]:
+    """`(tokens per turn, turns until critical)` from the rolling window.
+
+    Only the run since the last compaction counts (a drop resets it).
+    Returns `(None, None)` until there are two points, and no forecast
+    when usage isn't growing or is already past critical.
+    """
+    start = 0
+    for i in range(1, len(samples)):
+        if samples[i][1] < samples[i - 1][1]:
+            start = i
+    run = samples[start:][-TIMELINE_RATE_SAMPLES:]
+    if len(run) < 2:
+        return None, None
+    rate = (run[-1][1] - run[0][1]) / (len(run) - 1)
+    remaining = critical_tokens - run[-1][1]
+    if rate <= 0 or remaining <= 0:
+        return rate, None
+    return rate, -(-remaining // int(max(rate, 1)))
+
+
+def _tool_start_path(hook_input: Dict[str, Any]) -> Path:
+    """Start-marker path for a tool call, keyed by `tool_use_id` (tool name as fallback)."""
+    key = hook_input.get("tool_use_id") or hook_input.get("tool_name") or "tool"
+    key = re.sub(r"[^A-Za-z0-9_-]", "", str(key))[:128]
+    return STATE_DIR / "tool_start" / f"{hook_input.get('session_id', 'unknown')}.{key}"
+
+
+def mark_tool_start(hook_input: Dict[str, Any], now: Optional[float] = None):
+    """PreToolUse half of tool timing: write the start marker, no state load.
+
+    wf-hook.py writes the same marker for unguarded tools without importing
+    this module; keep the path scheme in `_tool_start_path` in step with it.
+    """
+    path = _tool_start_path(hook_input)
+    now = time.time() if now is None else now
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"{now:.3f}")
+    except OSError:
+        pass
+
+
+def take_tool_start(hook_input: Dict[str, Any]) -> Optional[float]:
+    """PostToolUse half: pop the matching start marker, if any."""
+    path = _tool_start_path(hook_input)
+    try:
+        started = float(path.read_text())
+        path.unlink()
+    except (OSError, ValueError):
+        return None
+    return started
+
+
+def _file_digest(path: str, size: int) -> Optional[str]:
+    """Short content hash, or None for files over READ_HASH_MAX_BYTES."""
+    if size > READ_HASH_MAX_BYTES:
+        return None
+    import hashlib
+
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+def _tool_failed(response: Any) -> bool:
+    """True when a PostToolUse `tool_response` reports an error."""
+    if isinstance(response, dict):
+        return bool(response.get("is_error") or response.get("error"))
+    if isinstance(response, str):
+        return response.lstrip().startswith(("Error", "<tool_use_error>"))
+    return False
+
+
+def _tool_label(tool_name: str, tool_input: Dict[str, Any]) -> str:
+    """Histogram key: the tool name, with Bash split by program (`Bash:pytest`, `Bash:gh`)."""
+    if tool_name != "Bash":
+        return tool_name or "unknown"
+    for segment in _BASH_SEPARATORS.split(str(tool_input.get("command") or "")):
+        words = segment.split()
+        while words and ("=" in words[0] or words[0] in _BASH_WRAPPERS):
+            words.pop(0)
+        if words and words[0] not in ("cd", "export", "source", "."):
+            return f"Bash:{os.path.basename(words[0])[:32]}"
+    return "Bash"
+
+
+def _timed_input(prompt: str, timeout: float) -> Optional[str]:
+    """Read one answer from the terminal; None if nobody answers in `timeout`.
+
+    The hook's stdin carries the event JSON, so the answer can only come
+    from `/dev/tty`. Without one (headless `claude -p`, CI, `setsid`)
+    there is nobody to ask and this returns None at once, so the caller
+    applies its timeout action. Reads raw bytes against the deadline, so a
+    half-typed answer still times out, and takes `\r` or `\n` as Enter (a
+    terminal left in raw mode sends `\r`). Raises EOFError if the terminal
+    closes before anything was typed.
+    """
+    import select
+
+    try:
+        stream = open("/dev/tty", "rb", buffering=0)
+    except OSError:
+        return None
+    deadline = time.monotonic() + timeout
+    answer = b""
+    with stream:
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        fd = stream.fileno()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                ready, _, _ = select.select([fd], [], [], remaining)
+            except (OSError, ValueError):
+                ready = [fd]  # not selectable — block
+            if not ready:
+                return None
+            chunk = os.read(fd, 256)
+            if not chunk:
+                if not answer:
+                    raise EOFError
+                break
+            answer += chunk
+            end = re.search(rb"[\r\n]", answer)
+            if end:
+                answer = answer[:end.start()]
+                break
+    return answer.decode(errors="replace").strip().lower()
+
+
+def _estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _estimate_tokens_from_bytes(size: int) -> int:
+    return -(-size // CHARS_PER_TOKEN)
+
+
+def _atomic_write(path: Path, text: str):
+    """Write `text` to `path` via a sibling temp file + rename."""
+    _atomic_write_bytes(path, text.encode())
+
+
+def _atomic_write_bytes(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _max_concurrent_scans() -> int:
+    value = os.environ.get("WF_MAX_CONCURRENT_SCANS", "")
+    if value.strip().isdigit():
+        return int(value)
+    return max(os.cpu_count() or 2, 2)
+
+
+def _acquire_scan_slot(slots: int, wait: float) -> Tuple[bool, Optional[int]]:
+    """`(admitted, fd)`. The slot is held for as long as `fd` stays open.
+
+    Starts probing at `pid % slots` so concurrent hooks spread across lock
+    files. If the lock files can't be created at all, admits without a slot
+    rather than blind the monitor.
+    """
+    slot_dir = STATE_DIR / "slots"
+    first = os.getpid() % slots
+    return _poll_flock([slot_dir / f"scan-{(first + i) % slots}.lock" for i in range(slots)], wait)
+
+
+def _try_flock(path: Path) -> Optional[int]:
+    """Open `path` and take a non-blocking exclusive flock; the fd holds it."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _poll_flock(paths: List[Path], wait: float) -> Tuple[bool, Optional[int]]:
+    """`(acquired, fd)` for the first of `paths` that can be flock'd within `wait`.
+
+    When the lock files can't be created at all, reports success without
+    an fd — callers carry on unlocked rather than stall the hook.
+    """
+    deadline = time.monotonic() + wait
+    try:
+        paths[0].parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            for path in paths:
+                fd = _try_flock(path)
+                if fd is not None:
+                    return True, fd
+            if time.monotonic() >= deadline:
+                return False, None
+            time.sleep(SCAN_ADMIT_POLL_S)
+    except OSError:
+        return True, None
+
+
+def _acquire_session_lock(session_id: str, wait: float) -> Tuple[bool, Optional[int]]:
+    """`(acquired, fd)` for the per-session state lock (see SESSION_LOCK_WAIT_S)."""
+    if fcntl is None:
+        return True, None
+    return _poll_flock([STATE_DIR / "locks" / f"{session_id}.lock"], wait)
+
+
+@contextlib.contextmanager
+def scan_slot(wait: Optional[float] = None) -> Iterator[bool]:
+    """Hold a host-wide transcript-scan slot; yields False when none came free in time."""
+    wait = SCAN_ADMIT_WAIT_S if wait is None else wait
+    slots = _max_concurrent_scans()
+    if fcntl is None or slots <= 0:
+        yield True
+        return
+    admitted, fd = _acquire_scan_slot(slots, wait)
+    try:
+        yield admitted
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def _find_git_dirs(cwd: str) -> Optional[Tuple[Path, Path, Path]]:
+    """Locate `(git_dir, common_dir, worktree)` for `cwd` without running `git`.
+
+    Walks up to the first `.git`; the directory holding it is the worktree.
+    A `.git` *file* (linked worktree or submodule) holds `gitdir: <path>`;
+    a worktree's git dir then names the shared repository through its
+    `commondir` file. Branch refs, packed-refs and the reflog live in the
+    common dir; HEAD and the index are per-worktree.
+    """
+    current = Path(cwd)
+    while True:
+        dotgit = current / ".git"
+        if dotgit.is_dir():
+            return dotgit, dotgit, current
+        if dotgit.is_file():
+            try:
+                text = dotgit.read_text().strip()
+            except OSError:
+                return None
+            if not text.startswith("gitdir:"):
+                return None
+            git_dir = (current / text[len("gitdir:"):].strip()).resolve()
+            common = git_dir
+            try:
+                common = (git_dir / (git_dir / "commondir").read_text().strip()).resolve()
+            except OSError:
+                pass
+            return git_dir, common, current
+        if current.parent == current:
+            return None
+        current = current.parent
+
+
+# Branch-type words that read like a Jira key (`fix-77`, `issue-9`) but
+# prefix a plain issue number.
+_BRANCH_WORDS = frozenset({
+    "bug", "bugfix", "chore", "feat", "feature", "fix", "gh", "hotfix",
+    "issue", "issues", "pr", "release", "task", "ticket",
+})
+_BRANCH_DATE = re.compile(r"(?<!\d)(?:19|20)\d\d([-_.]?)\d\d\1\d\d(?!\d)")
+
+
+def _issue_from_branch(branch: str) -> Optional[str]:
+    """Issue reference encoded in a branch name, if any.
+
+    `feat/PROJ-45-login` and `feat/proj-45-login` → "PROJ-45" (Jira key);
+    `feat/123-x`, `fix/#77`, `issue-9` → "#123" / "#77" / "#9". Dates
+    (`hotfix/2024-01-15`) and version-looking segments such as
+    `release/2.3` or `lodash-4.17.21` don't match.
+    """
+    for m in re.finditer(r"(?<![A-Za-z0-9])([A-Za-z][A-Za-z0-9]+)-(\d+)(?=[-_/]|$)", branch):
+        if m.group(1).lower() not in _BRANCH_WORDS:
+            return f"{m.group(1).upper()}-{m.group(2)}"
+    m = re.search(r"(?:^|[/_-])#?(\d+)(?=[-_/]|$)", _BRANCH_DATE.sub("/", branch))
+    if m:
+        return f"#{m.group(1)}"
+    return None
+
+
+def _git_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Git's offset varint (index v4 path prefixes): `(value, next_pos)`."""
+    c = data[pos]
+    pos += 1
+    value = c & 0x7F
+    while c & 0x80:
+        c = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (c & 0x7F)
+    return value, pos
+
+
+def _read_git_index(index: Path) -> Optional[Tuple[List[Tuple[bytes, int, int, int, bytes]], bool]]:
+    """Parse `.git/index` (v2–v4) into `([(path, mode, mtime_s, size, sha)], staged)`.
+
+    Entries git doesn't compare against the worktree (gitlinks,
+    assume-unchanged, skip-worktree) are left out. `staged` is True for
+    unmerged or intent-to-add entries, or when the cache-tree extension's
+    root is invalidated — git does that whenever the index stops matching
+    the tree it last wrote, i.e. on `add`/`rm` since the last commit or
+    checkout. None for a missing, unknown or oversized index.
+    """
+    try:
+        with open(index, "rb") as f:
+            data = f.read()
+        if data[:4] != b"DIRC":
+            return None
+        version, count = struct.unpack_from(">II", data, 4)
+        if version not in (2, 3, 4) or count > GIT_INDEX_MAX_ENTRIES:
+            return None
+
+        entries, staged = [], False
+        pos, prev = 12, b""
+        for _ in range(count):
+            start = pos
+            fields = _GIT_INDEX_ENTRY.unpack_from(data, pos)
+            mtime_s, mode, size, sha, flags = fields[2], fields[6], fields[9], fields[10], fields[11]
+            pos += _GIT_INDEX_ENTRY.size
+            extended = 0
+            if flags & 0x4000:
+                (extended,) = struct.unpack_from(">H", data, pos)
+                pos += 2
+            if version == 4:
+                strip, pos = _git_varint(data, pos)
+                end = data.index(b"\0", pos)
+                path = prev[:len(prev) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                end = data.index(b"\0", pos)
+                path = data[pos:end]
+                pos = start + ((end - start + 8) & ~7)  # NUL-padded to 8 bytes
+            prev = path
+            if flags & 0x3000 or extended & 0x2000:  # merge stage, intent-to-add
+                staged = True
+            elif not (flags & 0x8000 or extended & 0x4000 or mode == 0o160000):
+                entries.append((path, mode, mtime_s, size, sha))
+
+        while pos + 8 <= len(data) - 20:  # extensions, then the checksum
+            sig, ext_size = struct.unpack_from(">4sI", data, pos)
+            if sig == b"TREE":
+                root = data[pos + 8:pos + 8 + ext_size]
+                count_field = root[root.index(b"\0") + 1:].split(b" ", 1)[0]
+                staged = staged or int(count_field) < 0
+                break
+            pos += 8 + ext_size
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+    return entries, staged
+
+
+def _worktree_modified(entries: List[Tuple[bytes, int, int, int, bytes]], worktree: Path, index_mtime_s: int) -> bool:
+    """True when a tracked file differs from its index entry.
+
+    Compares size and mtime seconds the way `git status` does before
+    hashing. An entry whose file was touched in the same second the index
+    was written is "racily clean" and gets its blob hash checked instead.
+    """
+    import hashlib
+
+    for path, mode, mtime_s, size, sha in entries:
+        full = os.path.join(worktree, os.fsdecode(path))
+        try:
+            st = os.lstat(full)
+        except OSError:
+            return True  # deleted
+        if st.st_size != size or int(st.st_mtime) != mtime_s:
+            return True
+        if mtime_s >= index_mtime_s and mode & 0o170000 == 0o100000:
+            try:
+                with open(full, "rb") as f:
+                    blob = f.read()
+            except OSError:
+                return True
+            if hashlib.sha1(b"blob %d\0" % len(blob) + blob).digest() != sha:
+                return True
+    return False
+
+
+def _mtime_ns(path: Path) -> int:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    """`(inode, mtime_ns, size)`: changes with every atomic rewrite of `path`."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _find_workflow_config(cwd: str) -> Optional[Dict[str, Any]]:
+    """Find and parse the workflow.json governing `cwd`."""
+    # Try multiple locations
+    search_paths = [
+        Path(cwd) / ".claude" / "workflow.json",
+        Path(cwd) / "workflow.json",
+    ]
+
+    # Also check parent directories (up to 3 levels)
+    current = Path(cwd)
+    for _ in range(3):
+        parent = current.parent
+        if parent == current:
+            break
+        search_paths.append(parent / ".claude" / "workflow.json")
+        current = parent
+
+    for path in search_paths:
+        if path.exists():
+            try:
+                return json.loads(path.read_text())
+            except (json.JSONDecodeError, IOError):
+                pass
+    return None
+
+
+# =============================================================================
+# SESSION HANDOFF
+# =============================================================================
+
+def _handoff_path(cwd: str) -> Path:
+    import hashlib
+
+    return STATE_DIR / "handoff" / f"{hashlib.sha1(cwd.encode()).hexdigest()[:16]}.json"
+
+
+def _tool_target(name: str, tool_input: Dict[str, Any]) -> str:
+    """What a tool call acted on: a file path, a command, or a search pattern."""
+    for field in ("file_path", "notebook_path"):
+        if tool_input.get(field):
+            return str(tool_input[field])
+    if name == "Bash":
+        return str(tool_input.get("command") or "").strip().split("\n", 1)[0][:80]
+    return str(tool_input.get("pattern") or "")[:80]
+
+
+def _result_text(content: Any) -> str:
+    """First non-empty line of a tool_result's content (string or text blocks)."""
+    if isinstance(content, list):
+        content = " ".join(
+            str(block.get("text", "")) for block in content if isinstance(block, dict)
+        )
+    for line in str(content or "").splitlines():
+        if line.strip():
+            return line.strip()
+    return ""
+
+
+def _trim_counter(counts: Dict[str, int], keep: int):
+    if len(counts) > keep:
+        for name, _ in sorted(counts.items(), key=lambda kv: kv[1])[: len(counts) - keep // 2]:
+            del counts[name]
+
+
+def scan_handoff(path: str, acc: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fold transcript lines appended since `acc["offset"]` into handoff counters.
+
+    Counts successful edits and reads per file, and keeps the latest error
+    per tool target until a later call on the same target succeeds ("open"
+    errors). Only lines carrying `tool_use` / `tool_result` are parsed.
+    A shrunken transcript restarts from zero. Returns a new dict.
+    """
+    fresh = {"offset": 0, "edited": {}, "read": {}, "errors": {}, "pending": {}}
+    acc = json.loads(json.dumps(acc)) if acc else fresh
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if acc.get("offset", 0) > size:
+                acc = fresh
+            f.seek(acc.get("offset", 0))
+            consumed = acc.get("offset", 0)
+            for line in _iter_lines(f):
+                if not line.endswith(b"\n"):
+                    break  # partial write — re-read once complete
+                consumed += len(line)
+                if b'"tool_use"' not in line and b'"tool_result"' not in line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                content = (entry.get("message") or {}).get("content") if isinstance(entry, dict) else None
+                if isinstance(content, list):
+                    _fold_handoff_blocks(acc, content)
+    except OSError:
+        return acc
+    acc["offset"] = consumed
+    return acc
+
+
+def _fold_handoff_blocks(acc: Dict[str, Any], content: List[Any]):
+    pending = acc["pending"]
+    for block in content:
+        if not isinstance(block, dict):
+            continue
+        if block.get("type") == "tool_use":
+            name = str(block.get("name") or "")
+            pending[str(block.get("id"))] = [name, _tool_target(name, block.get("input") or {})]
+            while len(pending) > HANDOFF_PENDING_KEEP:
+                del pending[next(iter(pending))]
+        elif block.get("type") == "tool_result":
+            name, target = pending.pop(str(block.get("tool_use_id")), (None, ""))
+            if name is None:
+                continue
+            key = f"{name} {target}".strip()
+            if block.get("is_error"):
+                acc["errors"].pop(key, None)  # re-insert as most recent
+                acc["errors"][key] = _result_text(block.get("content"))[:160]
+                while len(acc["errors"]) > HANDOFF_MAX_ERRORS * 4:
+                    del acc["errors"][next(iter(acc["errors"]))]
+                continue
+            acc["errors"].pop(key, None)
+            counter = acc["edited"] if name in _EDIT_TOOLS else acc["read"] if name == "Read" else None
+            if counter is not None and target:
+                counter[target] = counter.get(target, 0) + 1
+                _trim_counter(counter, HANDOFF_TRACKED_FILES)
+
+
+def render_handoff(
+    acc: Dict[str, Any],
+    cwd: str,
+    *,
+    wip: Optional[str] = None,
+    tokens: int = 0,
+    peak: int = 0,
+    window: int = 0,
+    tool_calls: int = 0,
+    ended: Optional[float] = None,
+) -> str:
+    """Deterministic plain-text digest, capped at HANDOFF_MAX_CHARS."""
+    def rel(path: str) -> str:
+        try:
+            relative = os.path.relpath(path, cwd)
+        except ValueError:
+            return path
+        return path if relative.startswith("..") else relative
+
+    def top(counts: Dict[str, int]) -> str:
+        ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:HANDOFF_TOP_FILES]
+        return ", ".join(f"{rel(name)} ×{n}" for name, n in ranked)
+
+    when = datetime.fromtimestamp(time.time() if ended is None else ended).strftime("%Y-%m-%d %H:%M")
+    lines = [f"HANDOFF from the previous session here (last active {when}):"]
+    if wip:
+        lines.append(f"WIP: {wip}")
+    if acc.get("edited"):
+        lines.append(f"Edited: {top(acc['edited'])}")
+    if acc.get("read"):
+        lines.append(f"Read most: {top(acc['read'])}")
+    errors = list(acc.get("errors", {}).items())[-HANDOFF_MAX_ERRORS:]
+    if errors:
+        lines.append("Unresolved tool errors:")
+        lines.extend(f"- {key[:80]}: {text}" for key, text in reversed(errors))
+    if window:
+        lines.append(
+            f"Tokens: {tokens:,} at end, peak {peak:,} of {window:,}"
+            + (f", {tool_calls} tool calls" if tool_calls else "")
+        )
+    digest = "\n".join(lines)
+    if len(digest) > HANDOFF_MAX_CHARS:
+        digest = digest[: HANDOFF_MAX_CHARS - 1].rsplit("\n", 1)[0] + "\n…"
+    return digest
+
+
+_UNSET = object()
+
 
 class WFOrchestrator:
     """Main orchestrator class for workflow hooks."""
 
-    def __init__(self, hook_input: Dict[str, Any]):
+    def __init__(self, hook_input: Dict[str, Any], cleanup: bool = True,
+                 lock_wait: float = SESSION_LOCK_WAIT_S):
+        """`lock_wait` bounds how long each state update waits for the session lock."""
         self.hook_input = hook_input
         self.session_id = hook_input.get("session_id", "unknown")
         self.transcript_path = hook_input.get("transcript_path")
         self.cwd = hook_input.get("cwd", os.getcwd())
         self.stop_hook_active = hook_input.get("stop_hook_active", False)
+        self._workflow_config: Any = _UNSET
+        self.lock_wait = lock_wait
+        self._updating: Optional[bool] = None
+        self._state_stamp: Optional[Tuple[int, int, int]] = None
         self.state = self._load_state()
-        self._cleanup_old_states()
+        if cleanup:
+            self._cleanup_old_states()
 
     # -------------------------------------------------------------------------
     # State Management
@@ -87,6 +1234,7 @@ class WFOrchestrator:
         """Load session state from disk."""
         STATE_DIR.mkdir(parents=True, exist_ok=True)
         state_file = STATE_DIR / f"{self.session_id}.json"
+        self._state_stamp = _file_stamp(state_file)   # before reading: a newer file reloads
         if state_file.exists():
             try:
                 return json.loads(state_file.read_text())
@@ -101,17 +1249,60 @@ class WFOrchestrator:
         }
 
     def _save_state(self):
-        """Save session state to disk."""
+        """Save session state to disk.
+
+        Written to a temp file and renamed into place so `--mode=top`,
+        `--mode=stats` and the metrics exporter never read a torn file.
+        """
         state_file = STATE_DIR / f"{self.session_id}.json"
-        state_file.write_text(json.dumps(self.state, indent=2))
+        _atomic_write(state_file, json.dumps(self.state, indent=2))
+        self._state_stamp = _file_stamp(state_file)
+
+    @contextlib.contextmanager
+    def _state_update(self) -> Iterator[bool]:
+        """Load → mutate → save `self.state` under the per-session lock.
+
+        The state is re-read on entry if another hook of this session saved
+        it meanwhile (one `stat` decides), so the block mutates the current
+        copy, and written back on a clean exit. Keep slow work (scans,
+        prompts) outside the block. Yields False, without reloading or
+        saving, when the lock didn't come free within `lock_wait`: the
+        block's changes then stay in this process. Nested blocks run inside
+        the outer one's update.
+        """
+        if self._updating is not None:
+            yield self._updating
+            return
+        acquired, fd = _acquire_session_lock(self.session_id, self.lock_wait)
+        self._updating = acquired
+        try:
+            if acquired and _file_stamp(STATE_DIR / f"{self.session_id}.json") != self._state_stamp:
+                self.state = self._load_state()
+            yield acquired
+            if acquired:
+                self._save_state()
+        finally:
+            self._updating = None
+            if fd is not None:
+                os.close(fd)
 
     def _cleanup_old_states(self):
         """Remove state files older than STATE_MAX_AGE_DAYS."""
         try:
             cutoff = datetime.now() - timedelta(days=STATE_MAX_AGE_DAYS)
-            for state_file in STATE_DIR.glob("*.json"):
+            for state_file in itertools.chain(
+                STATE_DIR.glob("*.json"), STATE_DIR.glob("timeline/*.tl"),
+                STATE_DIR.glob("tool_start/*"), STATE_DIR.glob("handoff/*.json"),
+            ):
                 if state_file.stat().st_mtime < cutoff.timestamp():
                     state_file.unlink()
+            # Lock files are never rewritten; they go once their session's state has.
+            for lock_file in STATE_DIR.glob("locks/*.lock"):
+                if (
+                    lock_file.stat().st_mtime < cutoff.timestamp()
+                    and not (STATE_DIR / f"{lock_file.stem}.json").exists()
+                ):
+                    lock_file.unlink()
         except Exception:
             pass  # Ignore cleanup errors
 
@@ -120,31 +1311,17 @@ class WFOrchestrator:
     # -------------------------------------------------------------------------
 
     def _get_workflow_config(self) -> Optional[Dict[str, Any]]:
-        """Find and parse workflow.json in current project."""
-        # Try multiple locations
-        search_paths = [
-            Path(self.cwd) / ".claude" / "workflow.json",
-            Path(self.cwd) / "workflow.json",
-        ]
+        """Find and parse workflow.json in current project.
 
-        # Also check parent directories (up to 3 levels)
-        current = Path(self.cwd)
-        for _ in range(3):
-            parent = current.parent
-            if parent == current:
-                break
-            search_paths.append(parent / ".claude" / "workflow.json")
-            current = parent
-
-        for path in search_paths:
-            if path.exists():
-                try:
-                    return json.loads(path.read_text())
-                except (json.JSONDecodeError, IOError):
-                    pass
-        return None
+        Parsed once per orchestrator, i.e. once per hook process: the
+        disable flag, guard mode, window pin and budget all read this copy.
+        """
+        if self._workflow_config is _UNSET:
+            self._workflow_config = _find_workflow_config(self.cwd)
+        return self._workflow_config
 
-    def _detect_workflow_type(self, config: Dict[str, Any]) -> str:
+    @staticmethod
+    def _detect_workflow_type(config: Dict[str, Any]) -> str:
         """Detect if Jira or GitHub workflow."""
         # Jira: has breakdown.jiraProject
         if config.get("breakdown", {}).get("jiraProject"):
@@ -180,6 +1357,10 @@ class WFOrchestrator:
         anywhere reliable, and a model-name dict would need updating on
         every release. Self-calibration handles new models for free.
         """
+        return self._pinned_context_window() or _infer_tier(observed_max) or DEFAULT_CONTEXT_LIMIT
+
+    def _pinned_context_window(self) -> Optional[int]:
+        """Steps 1–2 of `_resolve_context_window`: the env / workflow.json pin, if any."""
         env = os.environ.get("WF_CONTEXT_LIMIT")
         if env:
             try:
@@ -194,14 +1375,31 @@ class WFOrchestrator:
             cl = config.get("contextLimit")
             if isinstance(cl, int) and cl > 0:
                 return cl
+        return None
 
-        if observed_max > 200_000:
-            for tier in STANDARD_TIERS:
-                if tier >= observed_max:
-                    return tier
-            return STANDARD_TIERS[-1]
+    @contextlib.contextmanager
+    def _scan_admission(self) -> Iterator[bool]:
+        """`scan_slot()` plus bookkeeping in `state["admission"]` for tuning.
 
-        return DEFAULT_CONTEXT_LIMIT
+        Counts admitted / rejected scans and keeps a wait-time histogram
+        (HOOK_LATENCY_BUCKETS).
+        """
+        started = time.monotonic()
+        with scan_slot() as admitted:
+            with self._state_update():
+                admission = self.state.setdefault("admission", {"admitted": 0, "rejected": 0})
+                admission["admitted" if admitted else "rejected"] += 1
+                _observe(admission.setdefault("wait", _new_histogram()), time.monotonic() - started)
+            yield admitted
+
+    def _cached_context_usage(self) -> Tuple[int, float, int]:
+        """Last reading stored in state — the answer when no scan slot is free."""
+        cursor = self.state.get("transcript_cursor") or {}
+        latest = int(cursor.get("latest", 0) or 0)
+        window = self.state.get("context_window") or self._resolve_context_window(
+            observed_max=int(cursor.get("observed_max", 0) or 0)
+        )
+        return latest, (latest / window) * 100 if window > 0 else 0.0, window
 
     def _get_context_usage(self) -> Tuple[int, float, int]:
         """Read token usage from the transcript JSONL.
@@ -221,44 +1419,53 @@ class WFOrchestrator:
         window resolver can self-calibrate even mid-conversation when
         the latest turn happens to be small.
 
+        Only lines appended since the previous call are parsed — the scan
+        position persists in `state["transcript_cursor"]` (see
+        `_scan_transcript`). Rotated (`.1`, `.2`, …) and `.gz` / `.zst`
+        segments are read as part of the same logical transcript, each
+        scanned once and cached in `state["transcript_segments"]`.
+
+        The scan itself waits for a host-wide slot (`scan_slot`); when
+        none frees up in time the cached reading is returned unchanged.
+
         Returns `(latest, percent, resolved_window)`. Empty/missing
         transcript → `(0, 0.0, default_window)`.
         """
-        if not self.transcript_path or not os.path.exists(self.transcript_path):
+        if not self.transcript_path:
             window = self._resolve_context_window(observed_max=0)
             return 0, 0.0, window
 
-        latest_context = 0
-        observed_max = 0
-        try:
-            with open(self.transcript_path, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        entry = json.loads(line)
-                    except json.JSONDecodeError:
-                        # Malformed line — skip; partial-write tail is the
-                        # common case here, not a hard failure.
-                        continue
-                    usage = entry.get("message", {}).get("usage")
-                    if not isinstance(usage, dict):
-                        continue
-                    total = (
-                        int(usage.get("input_tokens", 0) or 0)
-                        + int(usage.get("cache_creation_input_tokens", 0) or 0)
-                        + int(usage.get("cache_read_input_tokens", 0) or 0)
-                    )
-                    if total <= 0:
-                        continue
-                    latest_context = total
-                    if total > observed_max:
-                        observed_max = total
-        except (IOError, FileNotFoundError):
-            pass
-
+        previous = self.state.get("transcript_cursor")
+        previous_segments = self.state.get("transcript_segments", {})
+        with self._scan_admission() as admitted:
+            if not admitted:
+                return self._cached_context_usage()
+            cursor, segments, latest_context, observed_max = _scan_transcript_chain(
+                self.transcript_path, previous, previous_segments
+            )
         window = self._resolve_context_window(observed_max=observed_max)
+        # One timeline record per newly observed turn total (see
+        # `read_timeline`); feeds the growth forecast in warnings.
+        new_turn = bool(latest_context) and latest_context != self.state.get("timeline_last")
+        if new_turn:
+            try:
+                append_timeline(_timeline_path(self.session_id), latest_context)
+            except OSError:
+                new_turn = False
+        if (
+            new_turn
+            or cursor != previous
+            or segments != previous_segments
+            or window != self.state.get("context_window")
+        ):
+            with self._state_update():
+                self.state["transcript_cursor"] = cursor
+                self.state["transcript_segments"] = segments
+                self.state["transcript_path"] = self.transcript_path
+                self.state["context_window"] = window
+                if new_turn:
+                    self.state["timeline_last"] = latest_context
+
         pct = (latest_context / window) * 100 if window > 0 else 0.0
         return latest_context, pct, window
 
@@ -317,7 +1524,6 @@ class WFOrchestrator:
                             return line[2:]  # Return first WIP item
 
             # Also check for issue references like "Working on #123"
-            import re
             match = re.search(r'Working on [#\w-]+\d+', content)
             if match:
                 return match.group(0)
@@ -326,16 +1532,286 @@ class WFOrchestrator:
             pass
         return None
 
+    def _get_git_wip(self) -> Optional[Dict[str, Any]]:
+        """Derive WIP from the repository itself — no `git` subprocess.
+
+        Reads `.git/HEAD` for the branch (None when detached) and parses an
+        issue reference from the branch name. `dirty` comes from the index:
+        staged changes (see `_read_git_index`) or a tracked file whose
+        size/mtime no longer match its entry — True, False, or None when
+        the index can't be read or is too large to sweep.
+
+        Cached in `state["git_wip"]` keyed by the mtimes of HEAD, the
+        branch ref, packed-refs, the index and the reflog. Editing a file
+        doesn't touch any of them, so a cached clean result is re-swept;
+        a dirty one stands until the index moves. Returns None outside a
+        repository.
+        """
+        dirs = _find_git_dirs(self.cwd)
+        if dirs is None:
+            return None
+        git_dir, common_dir, worktree = dirs
+
+        try:
+            head = (git_dir / "HEAD").read_text().strip()
+        except OSError:
+            return None
+        branch = head[len("ref: refs/heads/"):] if head.startswith("ref: refs/heads/") else None
+
+        key = [
+            str(git_dir),
+            _mtime_ns(git_dir / "HEAD"),
+            _mtime_ns(common_dir / "refs" / "heads" / branch) if branch else 0,
+            _mtime_ns(common_dir / "packed-refs"),
+            _mtime_ns(git_dir / "index"),
+            _mtime_ns(git_dir / "logs" / "HEAD"),
+        ]
+        cached = self.state.get("git_wip")
+        hit = isinstance(cached, dict) and cached.get("key") == key
+        if hit:
+            result = cached["result"]
+            if result["dirty"] is not False:
+                return result
+        else:
+            result = {
+                "branch": branch,
+                "detached": None if branch else head[:12],
+                "issue": _issue_from_branch(branch) if branch else None,
+                "dirty": None,
+            }
+
+        index = _read_git_index(git_dir / "index")
+        dirty = None
+        if index is not None:
+            entries, staged = index
+            dirty = staged or _worktree_modified(entries, worktree, key[4] // 1_000_000_000)
+        if hit and dirty is False:
+            return result
+        result = {**result, "dirty": dirty}
+        with self._state_update():
+            self.state["git_wip"] = {"key": key, "result": result}
+        return result
+
+    @staticmethod
+    def _format_git_wip(git: Optional[Dict[str, Any]]) -> str:
+        """One-line branch summary for session-start context ('' when not a repo)."""
+        if not git:
+            return ""
+        where = git["branch"] or f"detached at {git['detached']}"
+        notes = []
+        if git["issue"]:
+            notes.append(f"issue {git['issue']}")
+        if git["dirty"]:
+            notes.append("uncommitted changes")
+        return f"Branch: {where}" + (f" ({', '.join(notes)})" if notes else "")
+
     # -------------------------------------------------------------------------
-    # Brain Integration (removed — Python hook can't talk MCP)
+    # Brain Integration
     # -------------------------------------------------------------------------
     #
-    # The old `_brain_search` method shelled out to the wf-brain JS server's
-    # legacy CLI surface, which v2 wf-brain (MCP-only) no longer exposes —
-    # the call returned nothing on every install. Auto-inject of brain
-    # context at session-start is now the slash-command layer's job: see the
-    # `brain_search` MCP-tool prose in wf-start-session / wf-delegate /
-    # wf-team-delegate.
+    # The hook can't talk MCP, so it reads wf-brain's SQLite store directly
+    # (read-only) through `BrainIndex` (wf-brain-reader.py, loaded only at
+    # session start). Semantic search stays with the
+    # `brain_search` MCP tool used by wf-start-session / wf-delegate; this
+    # is the cheap keyword pass that needs no Node or embedding model.
+
+    def _brain_entries(self, workflow: Dict, *terms: Optional[str]) -> List[Dict[str, Any]]:
+        """Top-k brain entries matching the session's WIP / branch terms."""
+        brain = workflow.get("brain")
+        brain = brain if isinstance(brain, dict) else {}
+        if brain.get("autoInject") is False:
+            return []
+        text = " ".join(t for t in terms if t)
+        if not text:
+            return []
+        reader = _load_sibling("wf_brain_reader", "wf-brain-reader.py")
+        db_path = reader._find_brain_db(self.cwd)
+        if db_path is None:
+            return []
+        top_k = brain.get("topK", BRAIN_TOP_K)
+        if not isinstance(top_k, int) or isinstance(top_k, bool):
+            top_k = BRAIN_TOP_K
+        return reader.BrainIndex(db_path, STATE_DIR / "brain").search(text, top_k)
+
+    @staticmethod
+    def _format_brain(entries: List[Dict[str, Any]], width: int = BRAIN_ENTRY_CHARS) -> str:
+        """Render brain entries as a context block ("" when there are none)."""
+        if not entries:
+            return ""
+        rows = []
+        for entry in entries:
+            content = " ".join(entry["content"].split())
+            if len(content) > width:
+                content = content[: width - 1] + "…"
+            rows.append(f"- [{entry['category'] or 'note'}] {content}")
+        return "\n\nRelevant brain entries (wf-brain):\n" + "\n".join(rows)
+
+    # -------------------------------------------------------------------------
+    # Context Injection Budget
+    # -------------------------------------------------------------------------
+
+    def _context_budget(self) -> Dict[str, Any]:
+        """Resolve `contextBudget` from workflow.json.
+
+        `maxTokens` caps the additionalContext injected over the whole
+        session (unset = unlimited); `compact: true` always prefers the
+        short message variants.
+        """
+        config = self._get_workflow_config() or {}
+        raw = config.get("contextBudget")
+        raw = raw if isinstance(raw, dict) else {}
+        max_tokens = raw.get("maxTokens")
+        if not isinstance(max_tokens, int) or isinstance(max_tokens, bool) or max_tokens < 0:
+            max_tokens = None
+        return {"max_tokens": max_tokens, "compact": raw.get("compact") is True}
+
+    def _emit(
+        self,
+        kind: str,
+        msg: str,
+        full_context: str,
+        compact_context: Optional[str] = None,
+        *,
+        key: Optional[str] = None,
+        essential: bool = False,
+        event: str = "PostToolUse",
+        decision: Optional[str] = None,
+    ) -> Dict:
+        """Build hook output, spending injected context from the session budget.
+
+        Every handler routes through here so each injection is accounted
+        for in `state["injected"]`. `event` is the hook's
+        `hookEventName`; a PreToolUse `decision` ("deny") carries the
+        context as its `permissionDecisionReason` and is always sent, so
+        pass it as `essential` too.
+
+        - A notice already injected in the current compaction cycle
+          (same `kind` + `key`, default: the full text) is not re-sent;
+          only the user-facing systemMessage goes out.
+        - Once a kind has been injected in full, later repeats (e.g. the
+          CRITICAL block after an auto-reset) use the compact variant.
+        - When the next injection would exceed `contextBudget.maxTokens`,
+          fall back to the compact variant, then to no additionalContext.
+          `essential` notices (CRITICAL) are never dropped or deduped.
+
+        `requested_tokens` vs `tokens` is the saving.
+        """
+        budget = self._context_budget()
+        dedupe_key = f"{kind}:{key if key is not None else zlib.crc32(full_context.encode())}"
+        full_cost = _estimate_tokens(full_context)
+        with self._state_update():
+            injected = self.state.setdefault("injected", {})
+            seen = injected.setdefault("seen", [])
+            by_kind = injected.setdefault("by_kind", {})
+            kind_stats = by_kind.setdefault(kind, {"count": 0, "tokens": 0})
+            injected["requested_tokens"] = injected.get("requested_tokens", 0) + full_cost
+
+            context: Optional[str] = full_context
+            outcome = "full"
+            if dedupe_key in seen and not essential:
+                context, outcome = None, "deduped"
+            elif compact_context and (budget["compact"] or kind_stats["count"]):
+                context, outcome = compact_context, "compact"
+
+            limit = budget["max_tokens"]
+            spent = injected.get("tokens", 0)
+            if context is not None and limit is not None and spent + _estimate_tokens(context) > limit:
+                if compact_context and context is not compact_context:
+                    context, outcome = compact_context, "compact"
+                if spent + _estimate_tokens(context) > limit and not essential:
+                    context, outcome = None, "dropped"
+
+            injected[outcome] = injected.get(outcome, 0) + 1
+            if context is not None:
+                cost = _estimate_tokens(context)
+                injected["tokens"] = spent + cost
+                injected["count"] = injected.get("count", 0) + 1
+                kind_stats["count"] += 1
+                kind_stats["tokens"] += cost
+                if dedupe_key not in seen:
+                    seen.append(dedupe_key)
+                    del seen[:-INJECTED_SEEN_KEEP]
+
+        output: Dict[str, Any] = {"systemMessage": msg}
+        if decision is not None:
+            output["hookSpecificOutput"] = {
+                "hookEventName": event,
+                "permissionDecision": decision,
+                "permissionDecisionReason": context or ""
+            }
+        elif context is not None:
+            output["hookSpecificOutput"] = {
+                "hookEventName": event,
+                "additionalContext": context
+            }
+        return output
+
+    def _start_injection_cycle(self):
+        """Forget dedupe keys after a compaction — the model no longer has them."""
+        with self._state_update():
+            injected = self.state.get("injected")
+            if injected and injected.get("seen"):
+                injected["seen"] = []
+                injected["cycles"] = injected.get("cycles", 0) + 1
+
+    # -------------------------------------------------------------------------
+    # Session Handoff
+    # -------------------------------------------------------------------------
+
+    def write_handoff(self):
+        """Refresh this directory's handoff digest from the transcript.
+
+        Called on Stop and when CRITICAL fires. The transcript is only read
+        past the offset kept in `state["handoff"]`, and token figures come
+        from the cached cursor, so repeated Stops cost little. No LLM call.
+        """
+        if not self.transcript_path:
+            return
+        with self._scan_admission() as admitted:
+            if not admitted:
+                return  # host busy — the next Stop refreshes it
+            acc = scan_handoff(self.transcript_path, self.state.get("handoff"))
+        with self._state_update():
+            self.state["handoff"] = acc
+
+        config = self._get_workflow_config()
+        wip = self._check_progress_wip(config) if config else None
+        if not wip:
+            git = self._get_git_wip()
+            if git and git["issue"]:
+                wip = f"{git['issue']} (branch {git['branch']})"
+        cursor = self.state.get("transcript_cursor") or {}
+        digest = render_handoff(
+            acc, self.cwd, wip=wip,
+            tokens=int(cursor.get("latest", 0) or 0),
+            peak=int(cursor.get("observed_max", 0) or 0),
+            window=int(self.state.get("context_window", 0) or 0),
+            tool_calls=self.state.get("tool_calls", 0),
+        )
+        path = _handoff_path(self.cwd)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write(path, json.dumps({
+                "session": self.session_id, "cwd": self.cwd,
+                "created": time.time(), "digest": digest,
+            }))
+        except OSError:
+            pass
+
+    def _handoff_block(self) -> str:
+        """The previous session's digest for this directory, ready to append."""
+        try:
+            data = json.loads(_handoff_path(self.cwd).read_text())
+        except (OSError, ValueError):
+            return ""
+        if (
+            not isinstance(data, dict)
+            or data.get("session") == self.session_id
+            or data.get("cwd") != self.cwd
+            or time.time() - float(data.get("created", 0)) > HANDOFF_MAX_AGE_S
+        ):
+            return ""
+        return "\n\n" + str(data.get("digest", ""))[:HANDOFF_MAX_CHARS]
 
     # -------------------------------------------------------------------------
     # Session Start Handling
@@ -346,34 +1822,37 @@ class WFOrchestrator:
         if self.state["first_run_handled"]:
             return None
 
-        # Skip session prompts in external loop mode (Ralph provides instructions)
-        if os.environ.get("WF_EXTERNAL_LOOP", "false") == "true":
+        external_loop = os.environ.get("WF_EXTERNAL_LOOP", "false") == "true"
+        with self._state_update():
+            if self.state["first_run_handled"]:
+                return None  # a parallel hook of this session got here first
             self.state["first_run_handled"] = True
-            self._save_state()
+            if not external_loop:
+                self.state["cwd"] = self.cwd
+
+        # Skip session prompts in external loop mode (Ralph provides instructions)
+        if external_loop:
             return None
 
-        self.state["first_run_handled"] = True
         workflow = self._get_workflow_config()
 
         if workflow is None:
             # No workflow.json - prompt to initialize
-            self._save_state()
             msg = (
                 "SESSION START: No workflow configuration detected.\n"
                 "Run `/wf-core:wf-init` to set up progress tracking, standards, and agents."
             )
-            return {
-                "systemMessage": msg,
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": msg
-                }
-            }
+            handoff = self._handoff_block()
+            return self._emit(
+                "session_start", msg, msg + handoff,
+                "SESSION START: no workflow.json — run `/wf-core:wf-init`." + handoff,
+            )
 
         # Workflow exists - detect type and route
         wf_type = self._detect_workflow_type(workflow)
-        self.state["workflow_detected"] = wf_type
-        self._save_state()
+        with self._state_update():
+            self.state["workflow_detected"] = wf_type
+            self.state["project"] = workflow.get("project", workflow.get("projectName"))
 
         if wf_type == "jira":
             return self._handle_jira_session_start(workflow)
@@ -387,6 +1866,9 @@ class WFOrchestrator:
         jira_project = workflow.get("breakdown", {}).get("jiraProject", "PROJECT")
         project_name = workflow.get("project", workflow.get("projectName", "Unknown"))
         progress_lines = self._check_progress_size(workflow)
+        git = self._get_git_wip()
+        branch_line = self._format_git_wip(git)
+        branch_block = f"{branch_line}\n" if branch_line else ""
 
         # Build progress warning if needed
         progress_warning = ""
@@ -396,32 +1878,55 @@ class WFOrchestrator:
                 f"Run `/wf-core:wf-end-session` to archive old sessions."
             )
 
+        brain = self._brain_entries(workflow, git and git["issue"], git and git["branch"])
+        handoff = self._handoff_block()
+
         msg = f"[WF] Jira: {project_name} ({jira_project}) - Run /wf-core:wf-start-session or provide ticket"
+        if git and git["issue"] and not git["issue"].startswith("#"):
+            msg = f"[WF] Jira: {project_name} - on {git['issue']} ({git['branch']})"
         full_context = (
             f"SESSION START - Jira Workflow Detected\n"
             f"Project: {project_name}\n"
-            f"Jira Project: {jira_project}\n\n"
+            f"Jira Project: {jira_project}\n"
+            f"{branch_block}\n"
             f"Would you like to work on a Jira ticket?\n"
             f"- Provide a ticket number (e.g., `{jira_project}-123`) to break it down with `/wf-core:wf-breakdown`\n"
             f"- Or describe what you'd like to work on\n"
             f"- Or run `/wf-core:wf-start-session` for full context load{progress_warning}"
+            f"{self._format_brain(brain)}{handoff}"
         )
-        return {
-            "systemMessage": msg,
-            "hookSpecificOutput": {
-                "hookEventName": "PostToolUse",
-                "additionalContext": full_context
-            }
-        }
+        compact_context = (
+            f"SESSION START (Jira {project_name}/{jira_project}). {branch_line + '. ' if branch_line else ''}"
+            f"Ticket → `/wf-core:wf-breakdown`; full context → `/wf-core:wf-start-session`."
+            f"{self._compact_progress_note(progress_lines)}{self._format_brain(brain, 100)}{handoff}"
+        )
+        return self._emit("session_start", msg, full_context, compact_context)
+
+    @staticmethod
+    def _compact_progress_note(progress_lines: Optional[int]) -> str:
+        if not progress_lines:
+            return ""
+        return f" progress.md is {progress_lines} lines — archive via `/wf-core:wf-end-session`."
 
     def _handle_github_session_start(self, workflow: Dict) -> Dict:
         """GitHub workflow session start with WIP detection."""
         wip = self._check_progress_wip(workflow)
+        git = self._get_git_wip()
+        if not wip and git and git["issue"]:
+            # progress.md markers missing or drifted — the branch still
+            # tells us what's in flight.
+            wip = f"{git['issue']} (from branch {git['branch']})"
+        branch_line = self._format_git_wip(git)
+        branch_block = f"{branch_line}\n" if branch_line else ""
         progress_lines = self._check_progress_size(workflow)
         github = workflow.get("github", {})
         owner = github.get("owner", "")
         repo = github.get("repo", "")
         repo_display = f"{owner}/{repo}" if owner and repo else "Unknown"
+        brain = self._brain_entries(workflow, wip, git and git["branch"])
+        handoff = self._handoff_block()
+        brain_block = self._format_brain(brain) + handoff
+        brain_compact = self._format_brain(brain, 100) + handoff
 
         # Build progress warning if needed
         progress_warning = ""
@@ -435,40 +1940,39 @@ class WFOrchestrator:
             msg = f"[WF] {repo_display} - WIP: {wip[:50]}{'...' if len(wip) > 50 else ''}"
             full_context = (
                 f"SESSION START - Work In Progress Detected\n"
-                f"Repository: {repo_display}\n\n"
+                f"Repository: {repo_display}\n"
+                f"{branch_block}\n"
                 f"WIP: {wip}\n\n"
                 f"Recommended: Run `/wf-core:wf-delegate` to continue with the assigned sub-task, "
-                f"or `/wf-core:wf-start-session` for full context.{progress_warning}"
+                f"or `/wf-core:wf-start-session` for full context.{progress_warning}{brain_block}"
             )
-            return {
-                "systemMessage": msg,
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": full_context
-                }
-            }
+            compact_context = (
+                f"SESSION START ({repo_display}) WIP: {wip}. "
+                f"Continue → `/wf-core:wf-delegate`.{self._compact_progress_note(progress_lines)}{brain_compact}"
+            )
+            return self._emit("session_start", msg, full_context, compact_context)
         else:
             msg = f"[WF] {repo_display} - No WIP. Run /wf-core:wf-start-session or /wf-core:wf-pick-issue"
             full_context = (
                 f"SESSION START - GitHub Workflow\n"
-                f"Repository: {repo_display}\n\n"
+                f"Repository: {repo_display}\n"
+                f"{branch_block}\n"
                 f"No work in progress detected.\n"
                 f"Recommended: Run `/wf-core:wf-pick-issue` to select the next task, "
-                f"or `/wf-core:wf-start-session` for full context.{progress_warning}"
+                f"or `/wf-core:wf-start-session` for full context.{progress_warning}{brain_block}"
             )
-            return {
-                "systemMessage": msg,
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": full_context
-                }
-            }
+            compact_context = (
+                f"SESSION START ({repo_display}) no WIP. "
+                f"Next task → `/wf-core:wf-pick-issue`.{self._compact_progress_note(progress_lines)}{brain_compact}"
+            )
+            return self._emit("session_start", msg, full_context, compact_context)
 
     # -------------------------------------------------------------------------
     # Context Check
     # -------------------------------------------------------------------------
 
-    def _resolve_threshold(self, env_var: str, default: int) -> int:
+    @staticmethod
+    def _resolve_threshold(env_var: str, default: int) -> int:
         """Read an int threshold from env var, falling back to default if unset/invalid."""
         raw = os.environ.get(env_var)
         if raw is None:
@@ -505,8 +2009,10 @@ class WFOrchestrator:
         # Disable flag (env or workflow.json) — full opt-out.
         if self._context_monitor_disabled():
             return None
-        # Skip context warnings in external loop mode (Ralph handles restarts)
+        # Skip context warnings in external loop mode (Ralph handles restarts).
+        # Usage is still recorded so wf-supervisor can recycle its workers.
         if os.environ.get("WF_EXTERNAL_LOOP", "false") == "true":
+            self._get_context_usage()
             return None
 
         warning_threshold = self._resolve_threshold(
@@ -524,42 +2030,68 @@ class WFOrchestrator:
         # expansion gets a fresh warning. The 0.9 buffer prevents
         # oscillation when usage hovers near the threshold.
         reset_floor = warning_threshold * 0.9
-        if pct < reset_floor and (
+        rearm = pct < reset_floor and (
             self.state.get("warning_shown", False)
             or self.state.get("pre_compact_ran", False)
-        ):
-            self.state["warning_shown"] = False
-            self.state["pre_compact_ran"] = False
-            self._save_state()
-
-        # Warning takes priority on the FIRST crossing — even if the
-        # session resumes already past critical, the user gets the
-        # 75% heads-up before the 90% lockdown. Earlier ordering
-        # (`critical` first) caused inflated readings to skip the
-        # warning entirely, which was Pietro's reported symptom.
-        if pct >= warning_threshold and not self.state.get("warning_shown", False):
-            self.state["warning_shown"] = True
-            self._save_state()
-
-            msg = f"[WF] Context at {pct:.0f}% — consider wrapping up this task soon."
+        )
+        warn = pct >= warning_threshold and not self.state.get("warning_shown", False)
+        critical = pct >= critical_threshold and not self.state["pre_compact_ran"]
+        if rearm or warn or critical:
+            # Decided on the state as loaded; re-checked on the fresh copy
+            # so parallel hooks of this session fire each notice once.
+            with self._state_update():
+                if pct < reset_floor and (
+                    self.state.get("warning_shown", False)
+                    or self.state.get("pre_compact_ran", False)
+                ):
+                    self.state["warning_shown"] = False
+                    self.state["pre_compact_ran"] = False
+                    self.state.pop("warning_at", None)
+                    self._start_injection_cycle()
+
+                # Warning takes priority on the FIRST crossing — even if the
+                # session resumes already past critical, the user gets the
+                # 75% heads-up before the 90% lockdown. Earlier ordering
+                # (`critical` first) caused inflated readings to skip the
+                # warning entirely, which was Pietro's reported symptom.
+                warn = pct >= warning_threshold and not self.state.get("warning_shown", False)
+                critical = not warn and pct >= critical_threshold and not self.state["pre_compact_ran"]
+                if warn:
+                    self.state["warning_shown"] = True
+                    self.state["warning_count"] = self.state.get("warning_count", 0) + 1
+                    self.state["warning_at"] = datetime.now().isoformat()
+                elif critical:
+                    self.state["pre_compact_ran"] = True
+                    self._record_critical()
+
+        if warn:
+            rate, turns_left = _growth_forecast(
+                read_timeline(_timeline_path(self.session_id), last=4 * TIMELINE_RATE_SAMPLES),
+                int(limit * critical_threshold / 100),
+            )
+            forecast = f" (~{turns_left} tool calls to critical)" if turns_left else ""
+            growth_line = (
+                f"Growth: ~{rate:,.0f} tokens/turn → ~{turns_left} tool calls until {critical_threshold}%\n"
+                if turns_left else ""
+            )
+
+            msg = f"[WF] Context at {pct:.0f}%{forecast} — consider wrapping up this task soon."
             full_context = (
                 f"⚠️ Context usage: {pct:.0f}%\n"
-                f"Tokens: {tokens:,}/{limit:,}\n\n"
+                f"Tokens: {tokens:,}/{limit:,}\n"
+                f"{growth_line}\n"
                 f"You're past the comfortable working zone. Consider:\n"
                 f"- Finishing the current task before starting a new one\n"
                 f"- Running /wf-core:wf-end-session when you reach a natural stopping point\n\n"
                 f"Critical threshold is {critical_threshold}% — I'll remind you again then."
             )
-            return {
-                "systemMessage": msg,
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": full_context
-                }
-            }
-        elif pct >= critical_threshold and not self.state["pre_compact_ran"]:
-            self.state["pre_compact_ran"] = True
-            self._save_state()
+            compact_context = (
+                f"⚠️ Context {pct:.0f}% ({tokens:,}/{limit:,}){forecast}. Finish the current task; "
+                f"/wf-core:wf-end-session at a stopping point. Critical at {critical_threshold}%."
+            )
+            return self._emit("context_warning", msg, full_context, compact_context, key="")
+        elif critical:
+            self.write_handoff()
 
             msg = f"[WF] ⛔ CRITICAL: Context at {pct:.0f}% - MUST CALL SKILL /wf-core:wf-end-session NOW"
             full_context = (
@@ -573,15 +2105,560 @@ class WFOrchestrator:
                 f"3. Archive session state\n\n"
                 f"After /wf-core:wf-end-session completes, run /compact to summarize."
             )
-            return {
-                "systemMessage": msg,
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": full_context
+            compact_context = (
+                f"⛔ Context {pct:.0f}% ({tokens:,}/{limit:,}). Invoke Skill wf-end-session NOW "
+                f"(it saves progress and commits), then /compact."
+            )
+            return self._emit(
+                "context_critical", msg, full_context, compact_context, key="", essential=True
+            )
+
+        return None
+
+    def _record_critical(self):
+        """Count a CRITICAL firing and how long it took to follow the warning.
+
+        Feeds `--mode=stats`. Only the last WARN_TO_CRITICAL_KEEP intervals
+        are kept so state size stays flat across many compaction cycles.
+        """
+        self.state["critical_count"] = self.state.get("critical_count", 0) + 1
+        warning_at = self.state.get("warning_at")
+        if not warning_at:
+            return
+        try:
+            elapsed = (datetime.now() - datetime.fromisoformat(warning_at)).total_seconds()
+        except (TypeError, ValueError):
+            return
+        intervals = self.state.get("warn_to_critical_s", [])
+        intervals.append(round(max(elapsed, 0.0), 1))
+        self.state["warn_to_critical_s"] = intervals[-WARN_TO_CRITICAL_KEEP:]
+
+    # -------------------------------------------------------------------------
+    # Pre-Tool Guard
+    # -------------------------------------------------------------------------
+
+    def _pre_tool_guard_mode(self) -> str:
+        config = self._get_workflow_config() or {}
+        cm = config.get("contextMonitor")
+        mode = cm.get("preToolGuard", "advise") if isinstance(cm, dict) else "advise"
+        return mode if mode in ("advise", "block", "off") else "advise"
+
+    def _estimate_tool_cost(self, tool_name: str, tool_input: Dict[str, Any]) -> Tuple[int, str]:
+        """`(estimated tokens, suggestion)` for a tool call — stat only, no reads."""
+        if tool_name == "Read":
+            file_path = tool_input.get("file_path") or ""
+            try:
+                size = os.stat(os.path.join(self.cwd, file_path)).st_size
+            except (OSError, TypeError, ValueError):
+                return 0, ""
+            limit = tool_input.get("limit")
+            if isinstance(limit, int) and limit > 0:
+                size = min(size, limit * READ_BYTES_PER_LINE)
+            cost = min(_estimate_tokens_from_bytes(size), READ_MAX_TOKENS)
+            return cost, (
+                f"Read a range instead (e.g. offset/limit=200), or Grep {os.path.basename(file_path)} "
+                f"for the part you need."
+            )
+        if tool_name == "Bash":
+            command = str(tool_input.get("command") or "")
+            if _BASH_BOUNDED.search(command):
+                return 0, ""
+            cat = re.match(r"^\s*cat\s+([^|;&<>]+)$", command)
+            if cat:
+                total = 0
+                for name in cat.group(1).split():
+                    try:
+                        total += os.stat(os.path.join(self.cwd, name)).st_size
+                    except OSError:
+                        continue
+                cost = min(_estimate_tokens_from_bytes(total), BASH_MAX_TOKENS)
+            elif _BASH_VERBOSE.match(command):
+                cost = BASH_MAX_TOKENS
+            else:
+                return 0, ""
+            return cost, "Bound the output: pipe through `| head -n 100` / `| tail -n 50`, or redirect to a file and grep it."
+        return 0, ""
+
+    def handle_pre_tool_use(self) -> Optional[Dict]:
+        """Advise or block a tool call whose output would push context past critical.
+
+        Runs before every matching tool call, so it must stay in single-digit
+        milliseconds: usage comes from the cursor cached in session state by
+        the last PostToolUse (no transcript scan), and cost from `os.stat`
+        of Read targets / `cat` arguments or known-verbose Bash commands.
+        """
+        if self._context_monitor_disabled():
+            return None
+        if os.environ.get("WF_EXTERNAL_LOOP", "false") == "true":
+            return None
+        notice = self._redundant_read_notice()
+        if notice:
+            return notice
+        mode = self._pre_tool_guard_mode()
+        if mode == "off":
+            return None
+
+        cursor = self.state.get("transcript_cursor") or {}
+        latest = int(cursor.get("latest", 0) or 0)
+        window = self.state.get("context_window") or self._resolve_context_window(
+            observed_max=int(cursor.get("observed_max", 0) or 0)
+        )
+        if not latest or not window:
+            return None
+
+        tool_name = self.hook_input.get("tool_name", "")
+        tool_input = self.hook_input.get("tool_input") or {}
+        cost, suggestion = self._estimate_tool_cost(tool_name, tool_input)
+        if cost < GUARD_MIN_TOKENS:
+            return None
+        critical_threshold = self._resolve_threshold(
+            "WF_CONTEXT_CRITICAL_THRESHOLD", DEFAULT_CRITICAL_THRESHOLD
+        )
+        critical_tokens = window * critical_threshold // 100
+        projected = latest + cost
+        if projected < critical_tokens:
+            return None
+
+        now_pct = latest / window * 100
+        after_pct = projected / window * 100
+        reason = (
+            f"Context guard: this {tool_name} would add ~{cost:,} tokens "
+            f"({now_pct:.0f}% → ~{after_pct:.0f}%, critical at {critical_threshold}%). {suggestion}"
+        )
+        msg = f"[WF] {tool_name} may push context to ~{after_pct:.0f}% — {'blocked' if mode == 'block' else 'consider a smaller read'}"
+        block = mode == "block"
+        with self._state_update():
+            self.state["pre_tool_guard"] = self.state.get("pre_tool_guard", 0) + 1
+            return self._emit(
+                "pre_tool_guard", msg, reason, essential=block,
+                event="PreToolUse", decision="deny" if block else None,
+            )
+
+    # -------------------------------------------------------------------------
+    # Redundant Reads
+    # -------------------------------------------------------------------------
+
+    def _redundant_reads_enabled(self) -> bool:
+        config = self._get_workflow_config() or {}
+        cm = config.get("contextMonitor")
+        return not (isinstance(cm, dict) and cm.get("redundantReads") is False)
+
+    def _read_key(self) -> Optional[Tuple[str, Optional[List[Any]], Optional[str]]]:
+        """`(index key, span, file path)` for a Read or Grep call, else None.
+
+        Keys are scoped by `agent_id` so a subagent's reads never count as
+        being in the parent's context. A Read's span is the line range it
+        asks for, `[first, end)`: Read returns READ_DEFAULT_LIMIT lines when
+        no `limit` is given, not the whole file. Grep is keyed by its full
+        input and has no span or file path.
+        """
+        tool_name = self.hook_input.get("tool_name", "")
+        tool_input = self.hook_input.get("tool_input") or {}
+        scope = self.hook_input.get("agent_id") or "main"
+        if tool_name == "Read":
+            file_path = tool_input.get("file_path")
+            if not file_path:
+                return None
+            path = os.path.normpath(os.path.join(self.cwd, str(file_path)))
+            try:
+                first = max(int(tool_input.get("offset") or 1), 1)
+                limit = int(tool_input.get("limit") or READ_DEFAULT_LIMIT)
+            except (TypeError, ValueError):
+                return None
+            return f"{scope}:{path}", [first, first + limit], path
+        if tool_name == "Grep":
+            query = json.dumps(tool_input, sort_keys=True).encode()
+            return f"{scope}:grep:{zlib.crc32(query):08x}", None, None
+        return None
+
+    def _returned_span(self, requested: List[Any]) -> List[Any]:
+        """Line range a finished Read actually returned, from `tool_response`.
+
+        Falls back to the requested range. `[first, None]` when the result
+        ran to the end of the file, so any later range from `first` on is
+        covered.
+        """
+        response = self.hook_input.get("tool_response")
+        result = response.get("file") if isinstance(response, dict) else None
+        if not isinstance(result, dict):
+            return requested
+        first, lines, total = result.get("startLine"), result.get("numLines"), result.get("totalLines")
+        if not all(isinstance(n, int) and not isinstance(n, bool) for n in (first, lines)):
+            return requested
+        end = first + lines
+        return [first, None if isinstance(total, int) and end > total else end]
+
+    @staticmethod
+    def _span_covered(spans: List[Any], span: Optional[List[Any]]) -> bool:
+        """True when one of the indexed `spans` contains `span` (Grep: always)."""
+        if span is None:
+            return True
+        first, end = span
+        for known in spans:
+            if not isinstance(known, list) or len(known) != 2:
+                continue  # pre-range index entry
+            if known[0] <= first and (known[1] is None or (end is not None and end <= known[1])):
+                return True
+        return False
+
+    def _read_unchanged(self, entry: Dict[str, Any], index: Dict[str, Any],
+                        path: Optional[str], stat: Optional[os.stat_result]) -> bool:
+        """True when `entry`'s earlier result is still in context and still current."""
+        latest = int((self.state.get("transcript_cursor") or {}).get("latest", 0) or 0)
+        if latest < entry.get("ctx", 0) * READ_COMPACTION_RATIO:
+            return False
+        if path is None:
+            return entry.get("writes") == index.get("writes", 0)
+        if stat is None or stat.st_size != entry.get("size"):
+            return False
+        if stat.st_mtime_ns == entry.get("mtime"):
+            return True
+        # Touched but possibly identical (checkout, formatter no-op).
+        return bool(entry.get("sha")) and _file_digest(path, stat.st_size) == entry["sha"]
+
+    def count_tool_call(self):
+        """PostToolUse: bump the session's tool-call counter (`state["tool_calls"]`).
+
+        Read-index entries are stamped with it, so a notice can say which
+        call put the content in context.
+        """
+        with self._state_update():
+            self.state["tool_calls"] = self.state.get("tool_calls", 0) + 1
+
+    def _redundant_read_notice(self) -> Optional[Dict]:
+        """PreToolUse: point out a Read/Grep whose result is already in context.
+
+        Advisory only — the call still runs. One `stat` (plus a hash of the
+        file when only its mtime moved) against `state["read_index"]`.
+        """
+        key = self._read_key()
+        if not key:
+            return None
+        index_key, span, path = key
+        index = self.state.get("read_index") or {}
+        entry = index.get("entries", {}).get(index_key)
+        if not entry or not self._span_covered(entry["spans"], span):
+            return None
+        if not self._redundant_reads_enabled():
+            return None
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            return None
+        if not self._read_unchanged(entry, index, path, stat):
+            return None
+
+        when = f"at tool call {entry['call']}" if entry.get("call") else "earlier this session"
+        if path:
+            name = os.path.basename(path)
+            msg = f"[WF] {name} is already in context (read {when}, unchanged)"
+            context = (
+                f"Redundant read: {path} is unchanged since you read it {when}, "
+                f"and that copy is still in context. Use it instead of reading the file again."
+            )
+        else:
+            msg = f"[WF] Same Grep already ran {when}"
+            context = (
+                f"Redundant search: this exact Grep ran {when} and no file has been "
+                f"edited since, so its results are still in context."
+            )
+        with self._state_update():
+            index = self.state.setdefault("read_index", index)
+            index["redundant"] = index.get("redundant", 0) + 1
+            if stat is not None:
+                index["redundant_tokens"] = index.get("redundant_tokens", 0) + min(
+                    _estimate_tokens_from_bytes(stat.st_size), READ_MAX_TOKENS
+                )
+            return self._emit("redundant_read", msg, context, event="PreToolUse")
+
+    def record_read(self):
+        """PostToolUse: index this Read/Grep result; count edits for Grep staleness.
+
+        Entries keep the tool call and context size of the earliest read
+        still in context, so a later notice names the copy the model can
+        scroll back to. Runs after the usage update so `ctx` is current;
+        before the first reading it takes one itself, otherwise a read
+        stamped with 0 would never look compacted away. A Read indexes the
+        line range it returned; failed calls are not indexed. Bounded at
+        READ_INDEX_MAX entries (least recent dropped).
+        """
+        tool_name = self.hook_input.get("tool_name", "")
+        if tool_name in _WRITE_TOOLS:
+            if self.state.get("read_index"):
+                with self._state_update():
+                    index = self.state.get("read_index")
+                    if index:
+                        index["writes"] = index.get("writes", 0) + 1
+            return
+        if _tool_failed(self.hook_input.get("tool_response")):
+            return  # nothing reached the context
+        key = self._read_key()
+        if not key:
+            return
+        index_key, span, path = key
+        if span is not None:
+            span = self._returned_span(span)
+        stat = None
+        if path:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+        if not (self.state.get("transcript_cursor") or {}).get("latest"):
+            self._get_context_usage()  # outside the update: it may scan
+
+        with self._state_update():
+            index = self.state.setdefault("read_index", {"entries": {}, "writes": 0})
+            entries = index.setdefault("entries", {})
+            entry = entries.pop(index_key, None)
+            if entry and self._read_unchanged(entry, index, path, stat):
+                if span is not None and not self._span_covered(entry["spans"], span):
+                    entry["spans"] = (entry["spans"] + [span])[-READ_INDEX_MAX_SPANS:]
+            else:
+                entry = {
+                    "call": self.state.get("tool_calls", 0),
+                    "ctx": int((self.state.get("transcript_cursor") or {}).get("latest", 0) or 0),
+                    "spans": [span] if span is not None else [],
                 }
+                if stat is not None:
+                    entry.update(
+                        size=stat.st_size, mtime=stat.st_mtime_ns,
+                        sha=_file_digest(path, stat.st_size),
+                    )
+                else:
+                    entry["writes"] = index.get("writes", 0)
+            entries[index_key] = entry
+            while len(entries) > READ_INDEX_MAX:
+                del entries[next(iter(entries))]
+
+    # -------------------------------------------------------------------------
+    # Subagent Monitoring
+    # -------------------------------------------------------------------------
+
+    def _scan_subagents(self) -> Dict[str, Dict[str, Any]]:
+        """Discover and incrementally scan this session's subagent transcripts.
+
+        Per-agent cursors live in `state["subagents"]`; an agent whose file
+        size/mtime hasn't moved is not reopened. Returns the updated map
+        (agent id → record with cursor, window and pct).
+        """
+        agents: Dict[str, Dict[str, Any]] = self.state.get("subagents", {})
+        if not self.transcript_path:
+            return agents
+
+        try:
+            since = datetime.fromisoformat(self.state["session_start"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            since = 0.0
+        probe = self.state.setdefault("subagent_probe", {})
+        probe_before = json.dumps(probe, sort_keys=True)
+        discovered = _discover_subagent_transcripts(
+            self.transcript_path, self.session_id, since, probe
+        )
+
+        todo: List[Tuple[str, str, Tuple[int, int]]] = []
+        for agent_id, path in discovered.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            record = agents.get(agent_id)
+            if record and record.get("path") == path and tuple(record.get("sig", ())) == sig:
+                continue
+            todo.append((agent_id, path, sig))
+
+        if todo:
+            with self._scan_admission() as admitted:
+                if admitted:
+                    self._scan_subagent_batch(agents, todo)
+                else:
+                    todo = []  # no scan slot free — keep previous readings
+
+        if len(agents) > SUBAGENT_MAX_TRACKED:
+            keep = sorted(agents, key=lambda a: agents[a].get("mtime", 0), reverse=True)
+            agents = {a: agents[a] for a in keep[:SUBAGENT_MAX_TRACKED]}
+        if (
+            todo
+            or len(agents) != len(self.state.get("subagents", {}))
+            or json.dumps(probe, sort_keys=True) != probe_before
+        ):
+            with self._state_update():
+                self.state["subagents"] = agents
+                self.state["subagent_probe"] = probe
+        return agents
+
+    def _scan_subagent_batch(self, agents: Dict[str, Dict[str, Any]], todo: List[Tuple[str, str, Tuple[int, int]]]):
+        """Scan changed agent transcripts on daemon threads, within SUBAGENT_SCAN_BUDGET_S.
+
+        No scan starts after the deadline and each reads at most
+        SUBAGENT_SCAN_MAX_BYTES, so every finished scan moves its agent's
+        cursor forward and a long backlog is worked off over successive
+        tool calls. Scans still running at the deadline are abandoned —
+        daemon threads are not joined at interpreter exit, so the budget
+        bounds the hook's wall time, not just this method's.
+        """
+        import threading
+
+        deadline = time.monotonic() + SUBAGENT_SCAN_BUDGET_S
+        jobs = deque(
+            (agent_id, path, sig, (agents.get(agent_id) or {}).get("cursor"))
+            for agent_id, path, sig in todo
+        )
+        done: List[Tuple[str, str, Tuple[int, int], Optional[Dict[str, Any]], Dict[str, Any]]] = []
+
+        def work():
+            while time.monotonic() < deadline:
+                try:
+                    agent_id, path, sig, previous = jobs.popleft()
+                except IndexError:
+                    return
+                cursor = _scan_transcript(path, previous, max_bytes=SUBAGENT_SCAN_MAX_BYTES)
+                done.append((agent_id, path, sig, previous, cursor))
+
+        threads = [
+            threading.Thread(target=work, daemon=True)
+            for _ in range(min(SUBAGENT_SCAN_WORKERS, len(todo)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+        pinned = self._pinned_context_window() if done else None
+        for agent_id, path, sig, previous, cursor in list(done):
+            window = pinned or _infer_tier(cursor["observed_max"]) or DEFAULT_CONTEXT_LIMIT
+            # A capped scan hasn't reached `sig`'s size yet: leave the
+            # signature unset so the next call picks up from the cursor.
+            start = int((previous or {}).get("offset", 0) or 0) if (previous or {}).get("path") == path else 0
+            capped = cursor["offset"] - start >= SUBAGENT_SCAN_MAX_BYTES
+            record = agents.get(agent_id, {})
+            agents[agent_id] = {
+                "path": path,
+                "sig": [] if capped else list(sig),
+                "cursor": cursor,
+                "window": window,
+                "pct": round(cursor["latest"] / window * 100, 1) if window else 0.0,
+                "warned": record.get("warned", False),
+                "mtime": sig[1] / 1e9,
             }
 
-        return None
+    def handle_subagent_check(self) -> Optional[Dict]:
+        """Warn once per subagent when its own context crosses the warning threshold."""
+        if self._context_monitor_disabled():
+            return None
+        if os.environ.get("WF_EXTERNAL_LOOP", "false") == "true":
+            return None
+
+        agents = self._scan_subagents()
+        if not agents:
+            return None
+
+        warning_threshold = self._resolve_threshold(
+            "WF_CONTEXT_WARNING_THRESHOLD", DEFAULT_WARNING_THRESHOLD
+        )
+        reset_floor = warning_threshold * 0.9
+        hot = []
+        rearmed = False
+        for agent_id, record in agents.items():
+            if record["pct"] < reset_floor and record.get("warned"):
+                record["warned"] = False
+                rearmed = True
+            elif record["pct"] >= warning_threshold and not record.get("warned"):
+                record["warned"] = True
+                hot.append(agent_id)
+        if hot or rearmed:
+            with self._state_update():
+                self.state["subagents"] = agents
+        if not hot:
+            return None
+
+        ranked = sorted(agents.items(), key=lambda kv: kv[1]["pct"], reverse=True)
+        rows = "\n".join(
+            f"- agent-{agent_id}: {rec['pct']:.0f}% "
+            f"({rec['cursor']['latest']:,}/{rec['window']:,})"
+            f"{' ⚠️' if agent_id in hot else ''}"
+            for agent_id, rec in ranked[:10]
+        )
+        names = ", ".join(f"agent-{a}" for a in hot)
+        msg = f"[WF] Subagent context high: {names}"
+        full_context = (
+            f"⚠️ Subagent context usage ({len(agents)} tracked)\n"
+            f"{rows}\n\n"
+            f"A subagent near its window loses earlier instructions and starts\n"
+            f"re-reading files. Consider having it wrap up and hand back, or\n"
+            f"re-delegate the remainder to a fresh agent."
+        )
+        compact_context = (
+            "⚠️ Subagent context high: "
+            + ", ".join(f"agent-{a} {agents[a]['pct']:.0f}%" for a in hot)
+            + ". Have it hand back or re-delegate."
+        )
+        return self._emit(
+            "subagent_warning", msg, full_context, compact_context, key=",".join(sorted(hot))
+        )
+
+    # -------------------------------------------------------------------------
+    # Tool Latency
+    # -------------------------------------------------------------------------
+
+    def record_tool_latency(self, now: Optional[float] = None):
+        """Pair this PostToolUse with its PreToolUse start marker.
+
+        The duration lands in a fixed-bucket histogram per tool label in
+        `state["tool_latency"]` — a few hundred bytes however long the
+        session runs. Feeds `--mode=report`, the metrics exporter and the
+        /wf-end-session summary.
+        """
+        started = take_tool_start(self.hook_input)
+        if started is None:
+            return
+        elapsed = (time.time() if now is None else now) - started
+        if not 0 <= elapsed <= TOOL_START_MAX_AGE_S:
+            return
+        label = _tool_label(self.hook_input.get("tool_name", ""), self.hook_input.get("tool_input") or {})
+        with self._state_update():
+            tools = self.state.setdefault("tool_latency", {})
+            if label not in tools and len(tools) >= TOOL_LATENCY_MAX_TOOLS:
+                label = "other"
+            hist = tools.setdefault(label, _new_histogram(TOOL_LATENCY_BUCKETS))
+            _observe(hist, elapsed, TOOL_LATENCY_BUCKETS)
+            hist["max"] = max(float(hist.get("max", 0.0)), elapsed)
+
+    # -------------------------------------------------------------------------
+    # Metrics Export
+    # -------------------------------------------------------------------------
+
+    def record_hook_metrics(self, mode: str, elapsed: float):
+        """Fold this hook run into the session's metrics and maybe re-export.
+
+        No-op unless `WF_METRICS_TEXTFILE` is set, so the default hot path
+        pays nothing. Keeps a fixed-bucket latency histogram per hook mode
+        and running transcript-scan outcome counts in `state["metrics"]`;
+        the `.prom` file itself is rebuilt at most every
+        METRICS_INTERVAL_S seconds (one `stat` decides).
+        """
+        textfile = os.environ.get("WF_METRICS_TEXTFILE")
+        if not textfile:
+            return
+        with self._state_update():
+            metrics = self.state.setdefault("metrics", {})
+            hist = metrics.setdefault("hook_latency", {}).setdefault(mode, _new_histogram())
+            _observe(hist, elapsed)
+            scans = metrics.setdefault("scans", {})
+            for outcome, n in _SCAN_STATS.items():
+                scans[outcome] = scans.get(outcome, 0) + n
+        _SCAN_STATS.clear()
+
+        try:
+            age = time.time() - os.stat(textfile).st_mtime
+        except OSError:
+            age = METRICS_INTERVAL_S
+        if age >= METRICS_INTERVAL_S:
+            try:
+                _load_sibling("wf_reports", "wf-reports.py").export_metrics(Path(textfile), STATE_DIR)
+            except OSError:
+                pass  # metrics are best-effort; never fail the hook
 
     # -------------------------------------------------------------------------
     # Stop Hook (Autonomy Mode)
@@ -593,13 +2670,17 @@ class WFOrchestrator:
         Exit 0 = allow stop
         Exit 2 = block stop (continue working)
         """
+        self.write_handoff()
+
         # Prevent infinite loops
         if self.stop_hook_active:
             return 0
 
-        # Unattended mode (Ralph) - always continue without prompting
+        # Unattended mode (Ralph) - continue without prompting, up to maxTasks
         if os.environ.get("WF_UNATTENDED", "false") == "true":
-            return 2
+            autonomy = (self._get_workflow_config() or {}).get("autonomy") or {}
+            _tasks_done, _max_tasks, cap_reached = self._count_autonomy_task(autonomy)
+            return self._end_autonomy_batch() if cap_reached else 2
 
         workflow = self._get_workflow_config()
 
@@ -610,11 +2691,21 @@ class WFOrchestrator:
         if not autonomy.get("enabled", False):
             return 0  # Autonomy disabled - allow stop
 
-        # Autonomy enabled - interactive checkpoint
+        # Autonomy enabled - timed checkpoint
         tokens, pct, _limit = self._get_context_usage()
+        timeout, timeout_action = self._checkpoint_policy(autonomy)
+
+        # At `maxTasks` the unattended default flips to stop, so a run left
+        # alone never exceeds the cap; a human answering "continue" starts
+        # a new batch.
+        tasks_done, max_tasks, cap_reached = self._count_autonomy_task(autonomy)
+        if cap_reached:
+            timeout_action = "stop"
 
         # Play notification sound (macOS only; silent on Linux/Windows)
         if sys.platform == "darwin":
+            import subprocess
+
             try:
                 subprocess.Popen(
                     ["afplay", "/System/Library/Sounds/Glass.aiff"],
@@ -631,49 +2722,109 @@ class WFOrchestrator:
         if pct > 40:
             level = "CRITICAL" if pct >= 80 else "WARNING" if pct >= 60 else "INFO"
             print(f"\n[{level}] Context: {pct:.0f}% used ({tokens:,} tokens)")
+        if max_tasks:
+            note = " — limit reached" if cap_reached else ""
+            print(f"\nTasks this run: {tasks_done}/{max_tasks}{note}")
 
         print("\nOptions:")
         print("  [Enter] or 'c' = Continue to next task")
         print("  's' or 'stop'  = Stop here")
         print("  'r' or 'review'= Show progress")
+        print(f"  (no answer in {timeout}s = {timeout_action})")
         print()
 
+        deadline = time.monotonic() + timeout
         try:
-            response = input("> ").strip().lower()
+            response = _timed_input("> ", timeout)
         except (EOFError, KeyboardInterrupt):
-            return 0
+            return self._end_autonomy_batch()
 
+        if response is None:
+            return self._checkpoint_timed_out(timeout_action)
         if response in ("", "c", "continue", "go", "y", "yes"):
             # Block stop - continue working
+            self._reset_autonomy_tasks()
             print("User approved. Continue with next sub-task in the queue.", file=sys.stderr)
             return 2
         elif response in ("r", "review", "status"):
-            # Show progress then ask again
+            # Show progress then ask again, within what's left of the budget
             progress_path = self._get_progress_file_path(workflow)
             if progress_path and progress_path.exists():
                 print("\n--- Progress ---")
-                content = progress_path.read_text()
-                # Show first ~80 lines
-                lines = content.split("\n")[:80]
-                print("\n".join(lines))
-                if len(content.split("\n")) > 80:
-                    print("\n... (truncated)")
+                self._print_progress_preview(progress_path)
                 print("---\n")
 
+            remaining = max(deadline - time.monotonic(), 1.0)
             try:
-                response2 = input("Continue? [Enter=yes, s=stop] > ").strip().lower()
+                response2 = _timed_input(
+                    f"Continue? [Enter=yes, s=stop] ({remaining:.0f}s) > ", remaining
+                )
             except (EOFError, KeyboardInterrupt):
-                return 0
+                return self._end_autonomy_batch()
 
+            if response2 is None:
+                return self._checkpoint_timed_out(timeout_action)
             if response2 in ("s", "stop", "n", "no"):
-                return 0
+                return self._end_autonomy_batch()
             else:
+                self._reset_autonomy_tasks()
                 print("Continuing with next task.", file=sys.stderr)
                 return 2
         else:
             # Unknown - stop to be safe
             print("Stopping.")
-            return 0
+            return self._end_autonomy_batch()
+
+    def _count_autonomy_task(self, autonomy: Dict[str, Any]) -> Tuple[int, Optional[int], bool]:
+        """Count one completed task in this batch: `(done, maxTasks or None, cap reached)`."""
+        with self._state_update():
+            tasks_done = self.state.get("autonomy_tasks", 0) + 1
+            self.state["autonomy_tasks"] = tasks_done
+        max_tasks = autonomy.get("maxTasks")
+        if not isinstance(max_tasks, int) or isinstance(max_tasks, bool) or max_tasks <= 0:
+            return tasks_done, None, False
+        return tasks_done, max_tasks, tasks_done >= max_tasks
+
+    @staticmethod
+    def _checkpoint_policy(autonomy: Dict[str, Any]) -> Tuple[int, str]:
+        """`(timeout seconds, "continue" | "stop")` from the autonomy config."""
+        timeout = autonomy.get("checkpointTimeout", DEFAULT_CHECKPOINT_TIMEOUT)
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            timeout = DEFAULT_CHECKPOINT_TIMEOUT
+        timeout = int(min(timeout, MAX_CHECKPOINT_TIMEOUT))
+        action = autonomy.get("timeoutAction", "continue")
+        if action not in ("continue", "stop"):
+            action = "continue"
+        return timeout, action
+
+    def _checkpoint_timed_out(self, action: str) -> int:
+        if action == "continue":
+            print("\nNo answer — continuing (autonomy.timeoutAction=continue).")
+            print("Checkpoint timed out. Continue with next sub-task in the queue.", file=sys.stderr)
+            return 2
+        print("\nNo answer — stopping.")
+        return self._end_autonomy_batch()
+
+    def _end_autonomy_batch(self) -> int:
+        """Allow the stop and reset the task counter for the next run."""
+        self._reset_autonomy_tasks()
+        return 0
+
+    def _reset_autonomy_tasks(self):
+        with self._state_update():
+            self.state["autonomy_tasks"] = 0
+
+    @staticmethod
+    def _print_progress_preview(progress_path: Path, limit: int = PROGRESS_PREVIEW_LINES):
+        """Print the first `limit` lines, reading no further than one line past them."""
+        try:
+            with open(progress_path, encoding="utf-8", errors="replace") as f:
+                head = list(itertools.islice(f, limit + 1))
+        except OSError:
+            return
+        print("".join(head[:limit]).rstrip("\n"))
+        if len(head) > limit:
+            print("\n... (truncated)")
 
     # -------------------------------------------------------------------------
     # Main Entry Points
@@ -691,15 +2842,114 @@ class WFOrchestrator:
         if context_output:
             return context_output
 
+        # Subagent (sidechain) monitoring for delegate / team workflows
+        subagent_output = self.handle_subagent_check()
+        if subagent_output:
+            return subagent_output
+
         return None
 
 
+# =============================================================================
+# SIBLING MODULES
+# =============================================================================
+
+def _load_sibling(name: str, filename: str):
+    """Import a hyphen-named script next to this one as module `name`.
+
+    Imported rather than run, so its bytecode is cached in `__pycache__`.
+    Siblings reach back here through `sys.modules["wf_orchestrator"]`,
+    registered first in case this file is itself running as `__main__`.
+    """
+    sys.modules.setdefault("wf_orchestrator", sys.modules[__name__])
+    module = sys.modules.get(name)
+    if module is None:
+        import importlib.util
+
+        spec = importlib.util.spec_from_file_location(name, Path(__file__).resolve().with_name(filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# LATENCY HISTOGRAMS
+# =============================================================================
+
+def _new_histogram(bounds: Tuple[float, ...] = HOOK_LATENCY_BUCKETS) -> Dict[str, Any]:
+    return {"buckets": [0] * (len(bounds) + 1), "sum": 0.0, "count": 0}
+
+
+def _observe(hist: Dict[str, Any], value: float, bounds: Tuple[float, ...] = HOOK_LATENCY_BUCKETS):
+    """Add one observation to a fixed-bucket histogram (last bucket = +Inf)."""
+    index = len(bounds)
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            index = i
+            break
+    hist["buckets"][index] += 1
+    hist["sum"] += value
+    hist["count"] += 1
+
+
+def _parse_args(argv: List[str]) -> Dict[str, str]:
+    """Collect `--key=value` flags; bare `--flag` maps to "true"."""
+    opts: Dict[str, str] = {}
+    for arg in argv:
+        if not arg.startswith("--"):
+            continue
+        key, _, value = arg[2:].partition("=")
+        opts[key] = value if value else "true"
+    return opts
+
+
+def run_hook(mode: str, hook_input: Dict[str, Any], started: float) -> int:
+    """Handle one hook event: print any hook output, return the exit code.
+
+    `started` is `time.perf_counter()` at process entry, for the hook
+    latency histogram. Called by wf-hook.py (and by `main` for callers
+    still pointing at this file).
+    """
+    if mode == "pre-tool-use":
+        # Hot path: every tool call is timed; only the guarded tools go on
+        # to the redundant-read and cost checks, which skip state-dir
+        # cleanup and read cached usage only. (wf-hook.py never gets here
+        # for the others.)
+        mark_tool_start(hook_input)
+        if hook_input.get("tool_name") not in PRE_TOOL_GUARDED_TOOLS:
+            return 0
+        # Decides from the state as last saved, never waiting on the session
+        # lock; counter bumps try it once and are skipped while it's taken.
+        output = WFOrchestrator(hook_input, cleanup=False, lock_wait=0.0).handle_pre_tool_use()
+        if output:
+            print(json.dumps(output))
+        return 0
+
+    if mode == "stop":
+        return WFOrchestrator(hook_input).handle_stop()
+
+    orchestrator = WFOrchestrator(hook_input)
+    orchestrator.count_tool_call()
+    orchestrator.record_tool_latency()
+    output = orchestrator.run_post_tool_use()
+    orchestrator.record_read()
+    if output:
+        print(json.dumps(output))
+    orchestrator.record_hook_metrics("post_tool_use", time.perf_counter() - started)
+    return 0
+
+
 def main():
     # Parse arguments
-    mode = "post_tool_use"
-    for arg in sys.argv[1:]:
-        if arg == "--mode=stop":
-            mode = "stop"
+    opts = _parse_args(sys.argv[1:])
+    mode = opts.get("mode", "post_tool_use")
+
+    # Offline tooling — no hook payload on stdin.
+    if mode in ("stats", "timeline", "report", "top"):
+        sys.exit(_load_sibling("wf_reports", "wf-reports.py").run_cli(mode, opts))
+
+    started = time.perf_counter()
 
     # Read hook input from stdin
     try:
@@ -707,16 +2957,7 @@ def main():
     except (json.JSONDecodeError, ValueError):
         hook_input = {}
 
-    orchestrator = WFOrchestrator(hook_input)
-
-    if mode == "stop":
-        exit_code = orchestrator.handle_stop()
-        sys.exit(exit_code)
-    else:
-        output = orchestrator.run_post_tool_use()
-        if output:
-            print(json.dumps(output))
-        sys.exit(0)
+    sys.exit(run_hook(mode, hook_input, started))
 
 
 if __name__ == "__main__":
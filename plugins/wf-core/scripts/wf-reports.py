@@ -0,0 +1,761 @@
+"""
+WF Reports - offline views over wf-orchestrator session state
+=============================================================
+Everything that reads `~/.wf-state` to present it rather than to answer a
+hook: fleet statistics (`--mode=stats`), the live session view
+(`--mode=top`), timeline dumps, the per-tool latency report and the
+Prometheus textfile. Kept out of `wf-orchestrator.py` so the per-call
+hooks never load it; the orchestrator's CLI and its metrics export import
+it on demand (`_load_sibling`), and it reaches the orchestrator's scanners
+and constants through `sys.modules["wf_orchestrator"]`.
+"""
+
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+wo = sys.modules["wf_orchestrator"]
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Below this many state files `--mode=stats` stays single-process; pool
+# start-up costs more than it saves.
+STATS_POOL_MIN_FILES = 64
+# `--mode=top` lists sessions whose state file changed this recently.
+TOP_ACTIVE_SECONDS = 30 * 60
+TOP_RATE_SAMPLES = 32       # (time, tokens) points kept per session for growth rate
+# Prometheus textfile label caps (see `render_metrics`).
+METRICS_STALE_S = 15 * 60       # sessions idle longer than this drop out
+METRICS_MAX_SESSIONS = 50       # per-session series cap (most recent first)
+METRICS_MAX_PROJECTS = 20       # remaining projects fold into project="other"
+METRICS_MAX_SUBAGENTS = 10      # fullest subagents per session that get a series
+TOP_MAX_SUBAGENTS = 5           # subagent rows shown under each session
+
+
+# =============================================================================
+# PROMETHEUS TEXTFILE EXPORT
+# =============================================================================
+
+def _merge_histogram(into: Dict[str, Any], other: Dict[str, Any]):
+    buckets = other.get("buckets", [])
+    if len(buckets) != len(into["buckets"]):
+        return  # bucket layout changed between versions — skip stale data
+    into["buckets"] = [a + b for a, b in zip(into["buckets"], buckets)]
+    into["sum"] += float(other.get("sum", 0.0))
+    into["count"] += int(other.get("count", 0))
+    if "max" in other:
+        into["max"] = max(float(into.get("max", 0.0)), float(other["max"]))
+
+
+def _prom_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _active_states(state_dir: Path, now: float, max_age: float) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """`(session_id, mtime, state)` for sessions written within `max_age`, newest first."""
+    found = []
+    try:
+        with os.scandir(state_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json") or entry.name.startswith("."):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if now - mtime <= max_age:
+                    found.append((entry.name[:-len(".json")], mtime, entry.path))
+    except OSError:
+        return []
+    found.sort(key=lambda item: item[1], reverse=True)
+
+    result = []
+    for sid, mtime, path in found:
+        try:
+            state = json.loads(Path(path).read_text())
+        except (OSError, ValueError):
+            continue
+        if isinstance(state, dict):
+            result.append((sid, mtime, state))
+    return result
+
+
+def _fullest_subagents(state: Dict[str, Any], limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Up to `limit` of the session's tracked subagents, highest occupancy first."""
+    agents = state.get("subagents")
+    if not isinstance(agents, dict):
+        return []
+    ranked = sorted(agents.items(), key=lambda kv: kv[1].get("pct", 0.0) or 0.0, reverse=True)
+    return ranked[:limit]
+
+
+def render_metrics(state_dir: Path, now: Optional[float] = None) -> str:
+    """Render the Prometheus exposition text for every active session.
+
+    Label cardinality is bounded: only the METRICS_MAX_SESSIONS most
+    recently active sessions get per-session series, only the
+    METRICS_MAX_PROJECTS busiest projects keep their own `project` label
+    (the rest fold into "other"), and sessions idle for METRICS_STALE_S
+    disappear from the file entirely.
+    """
+    now = time.time() if now is None else now
+    sessions = _active_states(state_dir, now, METRICS_STALE_S)
+
+    project_counts = Counter(str(st.get("project") or "unknown") for _, _, st in sessions)
+    kept = {p for p, _ in project_counts.most_common(METRICS_MAX_PROJECTS)}
+
+    def project_of(state: Dict[str, Any]) -> str:
+        project = str(state.get("project") or "unknown")
+        return project if project in kept else "other"
+
+    per_project: Dict[str, Counter] = {}
+    latency: Dict[str, Dict[str, Any]] = {}
+    tool_latency: Dict[str, Dict[str, Any]] = {}
+    admission_wait = wo._new_histogram()
+    admissions: Counter = Counter()
+    scans: Counter = Counter()
+    session_rows = []
+    subagent_rows = []
+    for index, (sid, _, state) in enumerate(sessions):
+        project = project_of(state)
+        agg = per_project.setdefault(project, Counter())
+        agg["sessions"] += 1
+        agg["warnings"] += int(state.get("warning_count", 0) or 0)
+        agg["criticals"] += int(state.get("critical_count", 0) or 0)
+
+        metrics = state.get("metrics", {})
+        for mode, hist in metrics.get("hook_latency", {}).items():
+            _merge_histogram(latency.setdefault(mode, wo._new_histogram()), hist)
+        admission = state.get("admission") or {}
+        admissions.update({k: int(admission.get(k, 0) or 0) for k in ("admitted", "rejected")})
+        if admission.get("wait"):
+            _merge_histogram(admission_wait, admission["wait"])
+        for tool, hist in state.get("tool_latency", {}).items():
+            _merge_histogram(tool_latency.setdefault(tool, wo._new_histogram(wo.TOOL_LATENCY_BUCKETS)), hist)
+        scans.update({k: int(v) for k, v in metrics.get("scans", {}).items()})
+
+        if index < METRICS_MAX_SESSIONS:
+            cursor = state.get("transcript_cursor") or {}
+            tokens = int(cursor.get("latest", 0) or 0)
+            window = int(
+                state.get("context_window")
+                or wo._infer_tier(int(cursor.get("observed_max", 0) or 0))
+                or wo.DEFAULT_CONTEXT_LIMIT
+            )
+            session_rows.append((sid, project, tokens, window))
+            for agent_id, rec in _fullest_subagents(state, METRICS_MAX_SUBAGENTS):
+                subagent_rows.append((sid, agent_id, float(rec.get("pct", 0.0) or 0.0)))
+
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family("wf_context_tokens", "gauge", "Context tokens occupied at the latest turn.")
+    for sid, project, tokens, _ in session_rows:
+        lines.append(f'wf_context_tokens{{session="{_prom_label(sid)}",project="{_prom_label(project)}"}} {tokens}')
+    family("wf_context_pct", "gauge", "Context window occupancy in percent.")
+    for sid, project, tokens, window in session_rows:
+        pct = tokens / window * 100 if window else 0.0
+        lines.append(f'wf_context_pct{{session="{_prom_label(sid)}",project="{_prom_label(project)}"}} {pct:.2f}')
+    family("wf_context_window_tokens", "gauge", "Resolved context window (tier) in tokens.")
+    for sid, project, _, window in session_rows:
+        lines.append(f'wf_context_window_tokens{{session="{_prom_label(sid)}",project="{_prom_label(project)}"}} {window}')
+    family("wf_subagent_context_pct", "gauge", "Subagent context window occupancy in percent (fullest agents per session).")
+    for sid, agent_id, pct in subagent_rows:
+        lines.append(f'wf_subagent_context_pct{{session="{_prom_label(sid)}",agent="{_prom_label(agent_id)}"}} {pct:.2f}')
+
+    for name, key, help_text in (
+        ("wf_active_sessions", "sessions", "Sessions active within the staleness window."),
+        ("wf_context_warnings", "warnings", "Context warnings fired by active sessions."),
+        ("wf_context_criticals", "criticals", "Context CRITICAL alerts fired by active sessions."),
+    ):
+        family(name, "gauge", help_text)
+        for project in sorted(per_project):
+            lines.append(f'{name}{{project="{_prom_label(project)}"}} {per_project[project][key]}')
+
+    def histogram(name: str, label: str, value: str, hist: Dict[str, Any], bounds: Tuple[float, ...]):
+        running = 0
+        for bound, n in zip(bounds + (float("inf"),), hist["buckets"]):
+            running += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{label}="{_prom_label(value)}",le="{le}"}} {running}')
+        lines.append(f'{name}_sum{{{label}="{_prom_label(value)}"}} {hist["sum"]:.6f}')
+        lines.append(f'{name}_count{{{label}="{_prom_label(value)}"}} {hist["count"]}')
+
+    family("wf_hook_latency_seconds", "histogram", "Orchestrator hook wall-clock latency.")
+    for mode in sorted(latency):
+        histogram("wf_hook_latency_seconds", "mode", mode, latency[mode], wo.HOOK_LATENCY_BUCKETS)
+
+    # Busiest tools keep their own label; the long tail folds into "other".
+    busiest = sorted(tool_latency, key=lambda t: tool_latency[t]["count"], reverse=True)
+    for tool in busiest[wo.TOOL_LATENCY_MAX_TOOLS:]:
+        if tool == "other":
+            continue
+        _merge_histogram(
+            tool_latency.setdefault("other", wo._new_histogram(wo.TOOL_LATENCY_BUCKETS)),
+            tool_latency.pop(tool),
+        )
+    family("wf_tool_latency_seconds", "histogram", "Agent tool-call wall-clock latency (PreToolUse to PostToolUse).")
+    for tool in sorted(tool_latency):
+        histogram("wf_tool_latency_seconds", "tool", tool, tool_latency[tool], wo.TOOL_LATENCY_BUCKETS)
+
+    family("wf_transcript_scans", "gauge", "Transcript scans by outcome (noop/resume/full, segment_hit/segment_miss).")
+    for outcome in sorted(scans):
+        lines.append(f'wf_transcript_scans{{outcome="{_prom_label(outcome)}"}} {scans[outcome]}')
+    family("wf_transcript_cache_hit_ratio", "gauge", "Share of transcript scans served from a cursor or segment cache.")
+    hits = scans["noop"] + scans["resume"] + scans["segment_hit"]
+    total = hits + scans["full"] + scans["segment_miss"]
+    lines.append(f"wf_transcript_cache_hit_ratio {hits / total if total else 0.0:.4f}")
+
+    family("wf_scan_admissions", "gauge", "Transcript scans admitted / turned away by host-wide admission control.")
+    for outcome in ("admitted", "rejected"):
+        lines.append(f'wf_scan_admissions{{outcome="{outcome}"}} {admissions[outcome]}')
+    family("wf_scan_admission_wait_seconds", "histogram", "Time spent waiting for a transcript-scan slot.")
+    running = 0
+    for bound, n in zip(wo.HOOK_LATENCY_BUCKETS + (float("inf"),), admission_wait["buckets"]):
+        running += n
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'wf_scan_admission_wait_seconds_bucket{{le="{le}"}} {running}')
+    lines.append(f'wf_scan_admission_wait_seconds_sum {admission_wait["sum"]:.6f}')
+    lines.append(f'wf_scan_admission_wait_seconds_count {admission_wait["count"]}')
+
+    family("wf_metrics_generated_timestamp_seconds", "gauge", "When this file was written.")
+    lines.append(f"wf_metrics_generated_timestamp_seconds {now:.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(textfile: Path, state_dir: Path, now: Optional[float] = None):
+    """Atomically (re)write the `.prom` textfile from current session states."""
+    wo._atomic_write(textfile, render_metrics(state_dir, now))
+
+
+# =============================================================================
+# FLEET STATISTICS (--mode=stats)
+# =============================================================================
+
+_STATS_CSV_FIELDS = (
+    "project", "workflow", "sessions", "peak_tokens", "mean_peak_tokens",
+    "warnings", "criticals", "warn_to_critical_n", "warn_to_critical_mean_s",
+    "warn_to_critical_max_s", "injected_tokens", "injected_saved_tokens",
+    "redundant_reads", "redundant_read_tokens", "scans_admitted", "scans_rejected",
+    "scan_wait_mean_ms", "turns", "mean_growth_per_turn", "tiers",
+)
+
+# cwd → (project, workflow type). Per-process: each pool worker resolves a
+# given project directory's workflow.json once.
+_PROJECT_CACHE: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+
+def _iter_state_files(state_dir: Path) -> Iterator[str]:
+    """Yield session state files lazily — no full directory listing in memory."""
+    try:
+        with os.scandir(state_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and entry.is_file():
+                    yield entry.path
+    except OSError:
+        return
+
+
+def _project_for_cwd(cwd: str) -> Tuple[Optional[str], Optional[str]]:
+    if cwd not in _PROJECT_CACHE:
+        config = wo._find_workflow_config(cwd)
+        if config:
+            _PROJECT_CACHE[cwd] = (
+                config.get("project", config.get("projectName")),
+                wo.WFOrchestrator._detect_workflow_type(config),
+            )
+        else:
+            _PROJECT_CACHE[cwd] = (None, None)
+    return _PROJECT_CACHE[cwd]
+
+
+def _session_stats(state_path: str) -> Optional[Dict[str, Any]]:
+    """Reduce one session state file (plus its transcript) to a stats record.
+
+    Runs in pool workers. The transcript is only read past the cursor
+    offset stored in state, and the advanced cursor is NOT written back —
+    the live hook owns that file.
+    """
+    try:
+        state = json.loads(Path(state_path).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict):
+        return None
+
+    cursor = state.get("transcript_cursor") or None
+    transcript = state.get("transcript_path") or (cursor or {}).get("path")
+    peak = int((cursor or {}).get("observed_max", 0) or 0)
+    if transcript:
+        _, _, _, observed_max = wo._scan_transcript_chain(
+            transcript, cursor, state.get("transcript_segments")
+        )
+        peak = max(peak, observed_max)
+
+    project = state.get("project")
+    wf_type = state.get("workflow_detected")
+    if (not project or not wf_type) and state.get("cwd"):
+        cfg_project, cfg_type = _project_for_cwd(state["cwd"])
+        project = project or cfg_project
+        wf_type = wf_type or cfg_type
+
+    injected = state.get("injected") or {}
+    injected_tokens = int(injected.get("tokens", 0) or 0)
+    read_index = state.get("read_index") or {}
+    admission = state.get("admission") or {}
+    wait = admission.get("wait") or {}
+
+    # Growth between consecutive timeline turns; drops (compactions) skipped.
+    sid = Path(state_path).name[: -len(".json")]
+    timeline = wo.read_timeline(Path(state_path).parent / "timeline" / f"{sid}.tl")
+    growth = [b[1] - a[1] for a, b in zip(timeline, timeline[1:]) if b[1] >= a[1]]
+    return {
+        "project": project or "unknown",
+        "workflow": wf_type or "unknown",
+        "peak": peak,
+        "injected": injected_tokens,
+        "injected_saved": max(int(injected.get("requested_tokens", 0) or 0) - injected_tokens, 0),
+        "redundant_reads": int(read_index.get("redundant", 0) or 0),
+        "redundant_read_tokens": int(read_index.get("redundant_tokens", 0) or 0),
+        "scans_admitted": int(admission.get("admitted", 0) or 0),
+        "scans_rejected": int(admission.get("rejected", 0) or 0),
+        "scan_wait_sum": float(wait.get("sum", 0.0) or 0.0),
+        "scan_wait_n": int(wait.get("count", 0) or 0),
+        "turns": len(timeline),
+        "growth_sum": sum(growth),
+        "growth_n": len(growth),
+        "window": state.get("context_window") or wo._infer_tier(peak) or wo.DEFAULT_CONTEXT_LIMIT,
+        "warnings": int(state.get("warning_count", 0) or 0),
+        "criticals": int(state.get("critical_count", 0) or 0),
+        "warn_to_critical_s": [
+            float(x) for x in state.get("warn_to_critical_s", [])
+            if isinstance(x, (int, float))
+        ],
+    }
+
+
+def _new_stats_group(project: str, workflow: str) -> Dict[str, Any]:
+    return {
+        "project": project, "workflow": workflow, "sessions": 0,
+        "peak_tokens": 0, "peak_sum": 0, "warnings": 0, "criticals": 0,
+        "w2c_n": 0, "w2c_sum": 0.0, "w2c_max": 0.0, "injected": 0, "injected_saved": 0,
+        "redundant_reads": 0, "redundant_read_tokens": 0,
+        "scans_admitted": 0, "scans_rejected": 0, "scan_wait_sum": 0.0, "scan_wait_n": 0,
+        "turns": 0, "growth_sum": 0, "growth_n": 0, "tiers": Counter(),
+    }
+
+
+def _fold_stats(groups: Dict[Tuple[str, str], Dict[str, Any]], rec: Dict[str, Any]):
+    """Fold one session record into its (project, workflow) group.
+
+    Groups hold only running sums/maxima, so memory is bounded by the
+    number of distinct projects, not sessions.
+    """
+    key = (rec["project"], rec["workflow"])
+    g = groups.get(key)
+    if g is None:
+        g = groups[key] = _new_stats_group(*key)
+    g["sessions"] += 1
+    g["peak_sum"] += rec["peak"]
+    g["peak_tokens"] = max(g["peak_tokens"], rec["peak"])
+    g["warnings"] += rec["warnings"]
+    g["criticals"] += rec["criticals"]
+    g["injected"] += rec["injected"]
+    g["injected_saved"] += rec["injected_saved"]
+    g["redundant_reads"] += rec["redundant_reads"]
+    g["redundant_read_tokens"] += rec["redundant_read_tokens"]
+    for key in ("scans_admitted", "scans_rejected", "scan_wait_sum", "scan_wait_n"):
+        g[key] += rec[key]
+    g["turns"] += rec["turns"]
+    g["growth_sum"] += rec["growth_sum"]
+    g["growth_n"] += rec["growth_n"]
+    g["tiers"][rec["window"]] += 1
+    for secs in rec["warn_to_critical_s"]:
+        g["w2c_n"] += 1
+        g["w2c_sum"] += secs
+        g["w2c_max"] = max(g["w2c_max"], secs)
+
+
+def collect_stats(state_dir: Path, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Aggregate every session under `state_dir`, grouped by project + workflow.
+
+    Small fleets are reduced in-process; from STATS_POOL_MIN_FILES state
+    files up, records are computed in a process pool and streamed back
+    unordered so nothing but the running groups is held in memory.
+    """
+    import multiprocessing
+
+    files = _iter_state_files(state_dir)
+    head = list(itertools.islice(files, STATS_POOL_MIN_FILES))
+    groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    # Forked workers inherit this module; spawned ones couldn't import it
+    # by name (it is loaded from a hyphenated file), so no fork, no pool.
+    pooled = (
+        len(head) >= STATS_POOL_MIN_FILES and workers > 1
+        and "fork" in multiprocessing.get_all_start_methods()
+    )
+
+    if not pooled:
+        records: Iterator[Optional[Dict[str, Any]]] = map(
+            _session_stats, itertools.chain(head, files)
+        )
+        for rec in records:
+            if rec:
+                _fold_stats(groups, rec)
+    else:
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            for rec in pool.imap_unordered(
+                _session_stats, itertools.chain(head, files), chunksize=64
+            ):
+                if rec:
+                    _fold_stats(groups, rec)
+
+    result = []
+    for key in sorted(groups):
+        g = groups[key]
+        result.append({
+            "project": g["project"],
+            "workflow": g["workflow"],
+            "sessions": g["sessions"],
+            "peak_tokens": g["peak_tokens"],
+            "mean_peak_tokens": g["peak_sum"] // g["sessions"],
+            "warnings": g["warnings"],
+            "criticals": g["criticals"],
+            "warn_to_critical_n": g["w2c_n"],
+            "warn_to_critical_mean_s": round(g["w2c_sum"] / g["w2c_n"], 1) if g["w2c_n"] else None,
+            "warn_to_critical_max_s": g["w2c_max"] if g["w2c_n"] else None,
+            "injected_tokens": g["injected"],
+            "injected_saved_tokens": g["injected_saved"],
+            "redundant_reads": g["redundant_reads"],
+            "redundant_read_tokens": g["redundant_read_tokens"],
+            "scans_admitted": g["scans_admitted"],
+            "scans_rejected": g["scans_rejected"],
+            "scan_wait_mean_ms": round(g["scan_wait_sum"] / g["scan_wait_n"] * 1000, 2) if g["scan_wait_n"] else None,
+            "turns": g["turns"],
+            "mean_growth_per_turn": g["growth_sum"] // g["growth_n"] if g["growth_n"] else None,
+            "tiers": {str(tier): n for tier, n in sorted(g["tiers"].items())},
+        })
+    return result
+
+
+def run_stats(fmt: str = "json", workers: Optional[int] = None, out=None) -> int:
+    """`--mode=stats` entry point. Writes JSON (default) or CSV to `out`."""
+    out = out or sys.stdout
+    groups = collect_stats(wo.STATE_DIR, workers=workers)
+    if fmt == "csv":
+        import csv
+
+        writer = csv.DictWriter(out, fieldnames=_STATS_CSV_FIELDS)
+        writer.writeheader()
+        for g in groups:
+            row = dict(g)
+            row["tiers"] = ";".join(f"{t}:{n}" for t, n in g["tiers"].items())
+            writer.writerow(row)
+    else:
+        out.write(json.dumps({
+            "generated_at": datetime.now().isoformat(),
+            "sessions": sum(g["sessions"] for g in groups),
+            "groups": groups,
+        }, indent=2) + "\n")
+    return 0
+
+
+# =============================================================================
+# LIVE SESSION VIEW (--mode=top)
+# =============================================================================
+
+class SessionTop:
+    """Incremental poller behind `--mode=top`.
+
+    Keeps one transcript cursor per session in memory (seeded from the
+    cursor the hook persisted in state) and, on each poll, only re-reads a
+    session's state file when its mtime moved and only tails its
+    transcript when size/mtime moved. An idle session costs two `stat`s
+    per refresh.
+    """
+
+    def __init__(self, state_dir: Path, active_seconds: int = TOP_ACTIVE_SECONDS):
+        self.state_dir = state_dir
+        self.active_seconds = active_seconds
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def poll(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Refresh every active session; return display rows, fullest first."""
+        now = time.time() if now is None else now
+        seen = set()
+        try:
+            with os.scandir(self.state_dir) as it:
+                entries = [e for e in it if e.name.endswith(".json")]
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if now - mtime > self.active_seconds:
+                continue
+            sid = entry.name[:-len(".json")]
+            seen.add(sid)
+            self._refresh(sid, entry.path, mtime, now)
+
+        for sid in list(self._sessions):
+            if sid not in seen:
+                del self._sessions[sid]
+
+        rows = [self._row(sid, s, now) for sid, s in self._sessions.items()]
+        rows.sort(key=lambda r: r["pct"], reverse=True)
+        return rows
+
+    def _refresh(self, sid: str, state_path: str, mtime: float, now: float):
+        sess = self._sessions.get(sid)
+        if sess is None:
+            sess = self._sessions[sid] = {
+                "state_mtime": None, "state": {}, "cursor": None,
+                "transcript_sig": None, "samples": deque(maxlen=TOP_RATE_SAMPLES),
+            }
+        if sess["state_mtime"] != mtime:
+            try:
+                state = json.loads(Path(state_path).read_text())
+            except (OSError, ValueError):
+                state = None
+            if isinstance(state, dict):
+                sess["state"] = state
+                sess["state_mtime"] = mtime
+                if sess["cursor"] is None:
+                    sess["cursor"] = state.get("transcript_cursor") or None
+
+        state = sess["state"]
+        transcript = state.get("transcript_path") or (sess["cursor"] or {}).get("path")
+        if transcript:
+            try:
+                st = os.stat(transcript)
+                sig: Optional[Tuple[int, int]] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                sig = None
+            if sig is not None and sig != sess["transcript_sig"]:
+                sess["cursor"] = wo._scan_transcript(transcript, sess["cursor"])
+                sess["transcript_sig"] = sig
+
+        tokens = int((sess["cursor"] or {}).get("latest", 0) or 0)
+        samples = sess["samples"]
+        if samples and tokens < samples[-1][1]:
+            samples.clear()  # compaction — growth restarts from here
+        if not samples or samples[-1][1] != tokens:
+            samples.append((now, tokens))
+
+    @staticmethod
+    def _row(sid: str, sess: Dict[str, Any], now: float) -> Dict[str, Any]:
+        state = sess["state"]
+        cursor = sess["cursor"] or {}
+        tokens = int(cursor.get("latest", 0) or 0)
+        observed_max = int(cursor.get("observed_max", 0) or 0)
+        window = (
+            state.get("context_window") or wo._infer_tier(observed_max) or wo.DEFAULT_CONTEXT_LIMIT
+        )
+        pct = tokens / window * 100 if window else 0.0
+
+        rate = 0.0
+        samples = sess["samples"]
+        if samples:
+            t0, tok0 = samples[0]
+            if now > t0:
+                rate = (tokens - tok0) / (now - t0) * 60
+
+        critical = wo.WFOrchestrator._resolve_threshold(
+            "WF_CONTEXT_CRITICAL_THRESHOLD", wo.DEFAULT_CRITICAL_THRESHOLD
+        )
+        flags = ""
+        if state.get("warning_shown"):
+            flags += "W"
+        if state.get("pre_compact_ran"):
+            flags += "C"
+        if pct >= critical:
+            flags += "!"
+        return {
+            "session": sid,
+            "project": state.get("project") or "-",
+            "tokens": tokens,
+            "pct": pct,
+            "window": window,
+            "rate_per_min": rate,
+            "flags": flags or "-",
+            "subagents": [
+                {
+                    "agent": agent_id,
+                    "tokens": int((rec.get("cursor") or {}).get("latest", 0) or 0),
+                    "pct": float(rec.get("pct", 0.0) or 0.0),
+                    "window": int(rec.get("window", 0) or 0),
+                }
+                for agent_id, rec in _fullest_subagents(state, TOP_MAX_SUBAGENTS)
+            ],
+        }
+
+
+def _format_top(rows: List[Dict[str, Any]]) -> str:
+    def k(n: float) -> str:
+        return f"{n / 1000:.0f}K" if abs(n) < 1_000_000 else f"{n / 1_000_000:.1f}M"
+
+    lines = [
+        f"wf-orchestrator top — {len(rows)} active session(s)   {datetime.now():%H:%M:%S}",
+        "",
+        f"{'SESSION':<14}{'PROJECT':<18}{'TOKENS':>9}{'PCT':>7}{'WINDOW':>8}{'RATE/min':>10}  FLAGS",
+    ]
+    for r in rows:
+        lines.append(
+            f"{r['session'][:13]:<14}{str(r['project'])[:17]:<18}{k(r['tokens']):>9}"
+            f"{r['pct']:>6.1f}%{k(r['window']):>8}{k(r['rate_per_min']):>10}  {r['flags']}"
+        )
+        for a in r.get("subagents", []):
+            lines.append(
+                f"{'  └ agent-' + a['agent']:<32.31}{k(a['tokens']):>9}{a['pct']:>6.1f}%{k(a['window']):>8}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def run_top(interval: float = 1.0, once: bool = False, out=None) -> int:
+    """`--mode=top` entry point. Redraws every `interval` seconds until ^C."""
+    out = out or sys.stdout
+    top = SessionTop(wo.STATE_DIR)
+    clear = "\x1b[H\x1b[2J" if out.isatty() and not once else ""
+    try:
+        while True:
+            out.write(clear + _format_top(top.poll()))
+            out.flush()
+            if once:
+                return 0
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+def run_timeline(session_id: str, fmt: str = "csv", out=None) -> int:
+    """Dump one session's token timeline (for replay / plotting)."""
+    out = out or sys.stdout
+    if not session_id:
+        print("usage: --mode=timeline --session=ID [--format=csv|json]", file=sys.stderr)
+        return 1
+    records = wo.read_timeline(wo._timeline_path(session_id))
+    if fmt == "json":
+        out.write(json.dumps([{"ts": ts, "tokens": n} for ts, n in records]) + "\n")
+    else:
+        out.write("ts,tokens\n")
+        out.writelines(f"{ts},{n}\n" for ts, n in records)
+    return 0
+
+
+def _histogram_quantile(hist: Dict[str, Any], q: float, bounds: Tuple[float, ...]) -> float:
+    """Estimate a quantile by linear interpolation inside its bucket (capped at `max`)."""
+    count = int(hist.get("count", 0))
+    if not count:
+        return 0.0
+    ceiling = float(hist.get("max", bounds[-1]))
+    rank = q * count
+    seen = 0
+    lower = 0.0
+    for bound, n in zip(bounds + (ceiling,), hist["buckets"]):
+        if n and seen + n >= rank:
+            upper = max(min(bound, ceiling), lower)
+            return lower + (upper - lower) * (rank - seen) / n
+        seen += n
+        lower = bound
+    return ceiling
+
+
+def tool_latency_rows(tool_latency: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-tool summary rows (slowest total first) from `state["tool_latency"]`."""
+    rows = []
+    for tool, hist in tool_latency.items():
+        count = int(hist.get("count", 0))
+        if not count or len(hist.get("buckets", [])) != len(wo.TOOL_LATENCY_BUCKETS) + 1:
+            continue
+        total = float(hist.get("sum", 0.0))
+        rows.append({
+            "tool": tool,
+            "calls": count,
+            "total_s": round(total, 3),
+            "mean_s": round(total / count, 3),
+            "p50_s": round(_histogram_quantile(hist, 0.5, wo.TOOL_LATENCY_BUCKETS), 3),
+            "p95_s": round(_histogram_quantile(hist, 0.95, wo.TOOL_LATENCY_BUCKETS), 3),
+            "max_s": round(float(hist.get("max", 0.0)), 3),
+        })
+    rows.sort(key=lambda r: r["total_s"], reverse=True)
+    return rows
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
+    return f"{int(seconds // 3600)}h{int(seconds % 3600 // 60):02d}m"
+
+
+def run_report(session_id: str = "", cwd: str = "", fmt: str = "text", out=None) -> int:
+    """Per-tool latency report for one session.
+
+    Defaults to the most recently active session started in `cwd` (the
+    current directory), so /wf-end-session can call it without knowing
+    its own session id.
+    """
+    out = out or sys.stdout
+    cwd = cwd or os.getcwd()
+    found = None
+    for sid, _, state in _active_states(wo.STATE_DIR, time.time(), wo.STATE_MAX_AGE_DAYS * 86400):
+        if (sid == session_id) if session_id else (state.get("cwd") == cwd):
+            found = (sid, state)
+            break
+    if not found:
+        print(f"no session state for {session_id or cwd}", file=sys.stderr)
+        return 1
+    sid, state = found
+    rows = tool_latency_rows(state.get("tool_latency", {}))
+    if fmt == "json":
+        out.write(json.dumps({"session": sid, "tools": rows}) + "\n")
+        return 0
+
+    calls = sum(r["calls"] for r in rows)
+    total = sum(r["total_s"] for r in rows)
+    out.write(f"Tool latency — session {sid} ({calls} calls, {_format_duration(total)} in tools)\n")
+    if not rows:
+        return 0
+    out.write(f"{'tool':<28} {'calls':>6} {'total':>8} {'share':>6} {'mean':>7} {'p50':>7} {'p95':>7} {'max':>7}\n")
+    for r in rows:
+        share = r["total_s"] / total * 100 if total else 0.0
+        out.write(
+            f"{r['tool'][:28]:<28} {r['calls']:>6} {_format_duration(r['total_s']):>8} {share:>5.0f}% "
+            f"{_format_duration(r['mean_s']):>7} {_format_duration(r['p50_s']):>7} "
+            f"{_format_duration(r['p95_s']):>7} {_format_duration(r['max_s']):>7}\n"
+        )
+    return 0
+
+
+def run_cli(mode: str, opts: Dict[str, str]) -> int:
+    """`wf-orchestrator.py --mode=stats|timeline|report|top` (parsed `--key=value` flags)."""
+    if mode == "stats":
+        workers = None
+        if opts.get("workers", "").isdigit():
+            workers = int(opts["workers"])
+        return run_stats(fmt=opts.get("format", "json"), workers=workers)
+    if mode == "timeline":
+        return run_timeline(opts.get("session", ""), fmt=opts.get("format", "csv"))
+    if mode == "report":
+        return run_report(opts.get("session", ""), cwd=opts.get("cwd", ""), fmt=opts.get("format", "text"))
+    try:
+        interval = max(float(opts.get("interval", "1")), 0.1)
+    except ValueError:
+        interval = 1.0
+    return run_top(interval=interval, once=opts.get("once") == "true")
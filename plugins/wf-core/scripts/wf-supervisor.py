@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+WF Supervisor - parallel external loop (Ralph) for wf-system
+============================================================
+`docs/ralph-integration.md` describes a bash loop that feeds Claude Code one
+task at a time. This runs N such loops in parallel:
+
+1. Each worker gets its own git worktree (`<worktrees>/worker-N` on branch
+   `wf-worker-N`, next to the repo by default), so concurrent sessions
+   never share a checkout.
+2. Tasks come from a local queue file, one per line (blank lines and `#`
+   comments skipped, `- ` / `- [ ] ` list markers stripped). Every pop
+   rewrites the file under an exclusive `fcntl` lock, so several
+   supervisors — or a human appending tasks — can share one queue.
+3. A worker keeps resuming the same Claude session across tasks (warm
+   prompt cache) and recycles to a fresh session when the orchestrator's
+   per-session state (`~/.wf-state/{session}.json`, kept up to date even
+   under `WF_EXTERNAL_LOOP`) shows context at `--recycle-at`, or when the
+   worker's average per-task growth would carry the next task past the
+   critical threshold.
+4. Every task appends one JSON line to `<queue>.results.jsonl`; run-level
+   throughput (tasks/hour, tokens/task, recycles) is rewritten atomically
+   to `~/.wf-state/supervisor/{run}.json` after each task and printed at
+   the end.
+
+Workers run `claude --print --output-format json` with `WF_EXTERNAL_LOOP`
+and `WF_UNATTENDED` set. `WF_CLAUDE_BIN` swaps in another executable (a
+stand-in script for tests, a wrapper that adds sandboxing, ...); extra
+CLI flags go through `--claude-args`.
+
+Usage:
+  python3 wf-supervisor.py --queue=.claude/tasks.md [--workers=3]
+                           [--prompt="/wf-core:wf-implement {task}"]
+                           [--recycle-at=80] [--task-timeout=3600]
+                           [--worktrees=DIR] [--claude-args="..."]
+"""
+
+import argparse
+import fcntl
+import importlib.util
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def _load_orchestrator():
+    """Import the sibling `wf-orchestrator.py` (hyphenated, so not importable by name)."""
+    if "wf_orchestrator" in sys.modules:
+        return sys.modules["wf_orchestrator"]
+    spec = importlib.util.spec_from_file_location(
+        "wf_orchestrator", Path(__file__).resolve().with_name("wf-orchestrator.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["wf_orchestrator"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+wo = _load_orchestrator()
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_WORKERS = 3
+# Recycle below the orchestrator's 90% critical so a resumed session never
+# starts a task already in the zone where it would be told to wrap up.
+DEFAULT_RECYCLE_PCT = 80
+DEFAULT_TASK_TIMEOUT_S = 60 * 60
+DEFAULT_PROMPT = "{task}"
+_LIST_MARKERS = ("- [ ] ", "- ", "* ")
+
+
+# =============================================================================
+# TASK QUEUE
+# =============================================================================
+
+class TaskQueue:
+    """Line-per-task queue file shared through an exclusive `fcntl` lock."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.results_path = path.with_name(path.name + ".results.jsonl")
+
+    @staticmethod
+    def _task_of(line: str) -> Optional[str]:
+        text = line.strip()
+        if not text or text.startswith("#"):
+            return None
+        for marker in _LIST_MARKERS:
+            if text.startswith(marker):
+                return text[len(marker):].strip() or None
+        return text
+
+    def pop(self) -> Optional[str]:
+        """Remove and return the first task, or None when the queue is empty."""
+        try:
+            f = open(self.path, "r+")
+        except FileNotFoundError:
+            return None
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            lines = f.readlines()
+            for i, line in enumerate(lines):
+                task = self._task_of(line)
+                if task is None:
+                    continue
+                f.seek(0)
+                f.writelines(lines[:i] + lines[i + 1:])
+                f.truncate()
+                return task
+        return None
+
+    def record(self, result: Dict[str, Any]):
+        """Append one task result as a JSON line (same lock discipline)."""
+        with open(self.results_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(json.dumps(result) + "\n")
+
+
+# =============================================================================
+# WORKERS
+# =============================================================================
+
+def _git(root: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", "-C", str(root), *args], capture_output=True, text=True)
+
+
+def ensure_worktree(root: Path, path: Path, branch: str) -> Path:
+    """Create (or reuse) a linked worktree for one worker."""
+    if (path / ".git").exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if _git(root, "rev-parse", "--verify", "--quiet", f"refs/heads/{branch}").returncode == 0:
+        proc = _git(root, "worktree", "add", str(path), branch)
+    else:
+        proc = _git(root, "worktree", "add", "-b", branch, str(path))
+    if proc.returncode != 0:
+        raise RuntimeError(f"git worktree add {path} failed: {proc.stderr.strip()}")
+    return path
+
+
+def _result_tokens(payload: Dict[str, Any]) -> int:
+    """Tokens processed by one `--output-format json` run (input side + output)."""
+    usage = payload.get("usage") or {}
+    return sum(
+        int(usage.get(key, 0) or 0)
+        for key in ("input_tokens", "cache_creation_input_tokens",
+                    "cache_read_input_tokens", "output_tokens")
+    )
+
+
+class Worker:
+    """One worktree + one (recyclable) Claude session, run on its own thread."""
+
+    def __init__(self, index: int, worktree: Path, supervisor: "Supervisor"):
+        self.index = index
+        self.worktree = worktree
+        self.supervisor = supervisor
+        self.session_id = str(uuid.uuid4())
+        self.session_tasks = 0
+        self.growth: List[int] = []   # context growth per task this session
+        self.proc: Optional[subprocess.Popen] = None
+
+    def _command(self, prompt: str) -> List[str]:
+        sup = self.supervisor
+        session_flag = "--resume" if self.session_tasks else "--session-id"
+        return [
+            *sup.claude_bin, "--print", "--output-format", "json",
+            session_flag, self.session_id, *sup.claude_args, prompt,
+        ]
+
+    def _context(self) -> Dict[str, int]:
+        """Latest context tokens and window from the orchestrator's session state."""
+        try:
+            state = json.loads((wo.STATE_DIR / f"{self.session_id}.json").read_text())
+        except (OSError, ValueError):
+            return {"tokens": 0, "window": 0}
+        cursor = state.get("transcript_cursor") or {}
+        tokens = int(cursor.get("latest", 0) or 0)
+        window = int(
+            state.get("context_window")
+            or wo._infer_tier(int(cursor.get("observed_max", 0) or 0))
+            or wo.DEFAULT_CONTEXT_LIMIT
+        )
+        return {"tokens": tokens, "window": window}
+
+    def _should_recycle(self, ctx: Dict[str, int]) -> bool:
+        if not ctx["window"]:
+            return False
+        sup = self.supervisor
+        if ctx["tokens"] / ctx["window"] * 100 >= sup.recycle_at:
+            return True
+        if self.growth:
+            projected = ctx["tokens"] + sum(self.growth) / len(self.growth)
+            return projected >= ctx["window"] * sup.critical_pct / 100
+        return False
+
+    def _recycle(self):
+        self.session_id = str(uuid.uuid4())
+        self.session_tasks = 0
+        self.growth = []
+
+    def run_task(self, task: str) -> Dict[str, Any]:
+        sup = self.supervisor
+        before = self._context()["tokens"] if self.session_tasks else 0
+        env = dict(
+            os.environ, WF_EXTERNAL_LOOP="true", WF_UNATTENDED="true",
+            WF_WORKER_ID=str(self.index),
+        )
+        started = time.monotonic()
+        exit_code, payload, error = None, {}, ""
+        try:
+            self.proc = subprocess.Popen(
+                self._command(sup.prompt.replace("{task}", task)),
+                cwd=self.worktree, env=env, text=True,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+            out, err = self.proc.communicate(timeout=sup.task_timeout)
+            exit_code = self.proc.returncode
+            error = err.strip()[-500:]
+            try:
+                payload = json.loads(out) if out.strip() else {}
+            except ValueError:
+                payload = {}
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.communicate()
+            error = f"timed out after {sup.task_timeout}s"
+        except OSError as e:
+            error = str(e)
+        finally:
+            self.proc = None
+        elapsed = time.monotonic() - started
+
+        ok = exit_code == 0 and not payload.get("is_error", False)
+        session = self.session_id
+        self.session_tasks += 1
+        ctx = self._context()
+        if ctx["tokens"] >= before:
+            self.growth.append(ctx["tokens"] - before)
+        # A failed run may have left the session half-way through something.
+        recycled = not ok or self._should_recycle(ctx)
+        if recycled:
+            self._recycle()
+        return {
+            "task": task,
+            "worker": self.index,
+            "session": session,
+            "ok": ok,
+            "exit": exit_code,
+            "seconds": round(elapsed, 3),
+            "tokens": _result_tokens(payload),
+            "turns": payload.get("num_turns"),
+            "cost_usd": payload.get("total_cost_usd"),
+            "context_tokens": ctx["tokens"],
+            "context_pct": round(ctx["tokens"] / ctx["window"] * 100, 1) if ctx["window"] else None,
+            "recycled": recycled,
+            "error": error if not ok else "",
+        }
+
+    def loop(self):
+        sup = self.supervisor
+        while not sup.stopping.is_set():
+            task = sup.queue.pop()
+            if task is None:
+                return
+            result = self.run_task(task)
+            sup.queue.record(result)
+            sup.observe(result)
+
+
+# =============================================================================
+# SUPERVISOR
+# =============================================================================
+
+class Supervisor:
+    """Runs `workers` Worker threads against one queue and tracks throughput."""
+
+    def __init__(
+        self,
+        queue: Path,
+        root: Path,
+        workers: int = DEFAULT_WORKERS,
+        prompt: str = DEFAULT_PROMPT,
+        recycle_at: float = DEFAULT_RECYCLE_PCT,
+        task_timeout: float = DEFAULT_TASK_TIMEOUT_S,
+        worktrees: Optional[Path] = None,
+        claude_args: Optional[List[str]] = None,
+    ):
+        self.queue = TaskQueue(queue)
+        self.root = root
+        self.prompt = prompt
+        self.recycle_at = recycle_at
+        self.task_timeout = task_timeout
+        self.claude_bin = shlex.split(os.environ.get("WF_CLAUDE_BIN") or "claude")
+        self.claude_args = claude_args or []
+        self.critical_pct = wo.WFOrchestrator._resolve_threshold(
+            "WF_CONTEXT_CRITICAL_THRESHOLD", wo.DEFAULT_CRITICAL_THRESHOLD
+        )
+        self.stopping = threading.Event()
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self.stats: Dict[str, Any] = {
+            "run": self.run_id, "queue": str(queue), "workers": workers,
+            "done": 0, "failed": 0, "tokens": 0, "task_seconds": 0.0, "recycles": 0,
+        }
+        base = worktrees or root.parent / f"{root.name}-wf-worktrees"
+        self.workers = [
+            Worker(i, ensure_worktree(root, base / f"worker-{i}", f"wf-worker-{i}"), self)
+            for i in range(1, workers + 1)
+        ]
+
+    def observe(self, result: Dict[str, Any]):
+        with self._lock:
+            stats = self.stats
+            stats["done" if result["ok"] else "failed"] += 1
+            stats["tokens"] += result["tokens"]
+            stats["task_seconds"] += result["seconds"]
+            stats["recycles"] += int(result["recycled"])
+            self._write_stats()
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        elapsed = max((time.time() if now is None else now) - self._started, 1e-9)
+        tasks = stats["done"] + stats["failed"]
+        stats.update(
+            elapsed_s=round(elapsed, 1),
+            tasks_per_hour=round(stats["done"] / elapsed * 3600, 2),
+            tokens_per_task=stats["tokens"] // tasks if tasks else None,
+            mean_task_s=round(stats["task_seconds"] / tasks, 1) if tasks else None,
+        )
+        return stats
+
+    def _write_stats(self):
+        path = wo.STATE_DIR / "supervisor" / f"{self.run_id}.json"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            wo._atomic_write(path, json.dumps(self.summary(), indent=2))
+        except OSError:
+            pass
+
+    def run(self) -> Dict[str, Any]:
+        threads = [threading.Thread(target=w.loop, name=f"wf-worker-{w.index}") for w in self.workers]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            # Finish nothing new; stop in-flight sessions and wait for them.
+            self.stopping.set()
+            for w in self.workers:
+                if w.proc is not None:
+                    w.proc.terminate()
+            for t in threads:
+                t.join()
+        with self._lock:
+            self._write_stats()
+            return self.summary()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run N unattended wf-system workers over a task queue.")
+    parser.add_argument("--queue", type=Path, required=True, help="task file, one task per line")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT, help='prompt template; "{task}" is replaced')
+    parser.add_argument("--recycle-at", type=float, default=DEFAULT_RECYCLE_PCT,
+                        help="start a fresh session once context reaches this percent")
+    parser.add_argument("--task-timeout", type=float, default=DEFAULT_TASK_TIMEOUT_S)
+    parser.add_argument("--worktrees", type=Path, help="worktree parent dir (default: ../<repo>-wf-worktrees)")
+    parser.add_argument("--claude-args", default="", help="extra flags passed to every claude run")
+    args = parser.parse_args(argv)
+
+    proc = subprocess.run(["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True)
+    if proc.returncode != 0:
+        print("wf-supervisor: run from inside a git repository", file=sys.stderr)
+        return 1
+    if not args.queue.is_file():
+        print(f"wf-supervisor: no task queue at {args.queue}", file=sys.stderr)
+        return 1
+
+    try:
+        supervisor = Supervisor(
+            args.queue.resolve(), Path(proc.stdout.strip()), max(args.workers, 1), args.prompt,
+            args.recycle_at, args.task_timeout, args.worktrees, shlex.split(args.claude_args),
+        )
+    except RuntimeError as e:
+        print(f"wf-supervisor: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(supervisor.run(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+#!/usr/bin/env bash
+# Entry point: runs the wf-brain maintenance script tests.
+# Usage: tests/brain/run-tests.sh
+
+set -eu
+
+REPO_ROOT="$(cd "$(dirname "$0")/../.." && pwd)"
+cd "$REPO_ROOT"
+
+exec python3 -m unittest discover tests/brain -v
@@ -0,0 +1,219 @@
+"""Tests for `brain-dedupe.py` (batch duplicate detection for wf-brain).
+
+Covers:
+  - Matrix build: normalization, skipped bad/zero blobs, pending status filter
+  - Blocked similarity matches a dense reference for any block size
+  - Pending-only vs all scope, best-match selection, union-find clusters
+  - `.npy` cache keyed on brain.db signature, memory-mapped on reuse
+  - Report rendering and read-only DB access
+
+The script has a hyphen in its filename; loaded via `importlib.util` like
+the orchestrator tests do. Skipped entirely when NumPy isn't installed.
+"""
+
+import importlib.util
+import json
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+_SCRIPT_PATH = _REPO_ROOT / "plugins/wf-brain/scripts/brain-dedupe.py"
+
+_spec = importlib.util.spec_from_file_location("brain_dedupe", _SCRIPT_PATH)
+assert _spec is not None and _spec.loader is not None, f"failed to load {_SCRIPT_PATH}"
+bd = importlib.util.module_from_spec(_spec)
+sys.modules["brain_dedupe"] = bd
+_spec.loader.exec_module(bd)
+
+
+_DDL = """
+CREATE TABLE entries (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT NOT NULL,
+  category TEXT NOT NULL DEFAULT '', tags TEXT NOT NULL DEFAULT '',
+  source TEXT NOT NULL DEFAULT '', embedding BLOB,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE pending (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT NOT NULL,
+  category TEXT NOT NULL DEFAULT '', tags TEXT NOT NULL DEFAULT '',
+  source TEXT NOT NULL DEFAULT '', proposed_by TEXT NOT NULL DEFAULT '',
+  embedding BLOB, created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  status TEXT NOT NULL DEFAULT 'pending'
+);
+"""
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class BrainDedupeTestBase(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmpdir.name)
+        self.db_path = self.tmp / ".claude" / "brain.db"
+        self.db_path.parent.mkdir()
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(_DDL)
+        conn.close()
+        self.rng = np.random.default_rng(7)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _vec(self, base=None, noise: float = 0.0):
+        v = self.rng.standard_normal(bd.EMBEDDING_DIM).astype(np.float32)
+        if base is not None:
+            v = base + noise * v
+        return v.astype(np.float32)
+
+    def _insert(self, table: str, content: str, vec, status: str = "pending") -> int:
+        conn = sqlite3.connect(self.db_path)
+        blob = None if vec is None else np.asarray(vec, dtype=np.float32).tobytes()
+        with conn:
+            if table == "pending":
+                cur = conn.execute(
+                    "INSERT INTO pending (content, embedding, status) VALUES (?, ?, ?)",
+                    (content, blob, status),
+                )
+            else:
+                cur = conn.execute("INSERT INTO entries (content, embedding) VALUES (?, ?)", (content, blob))
+        conn.close()
+        return cur.lastrowid
+
+    def _load(self):
+        conn = bd._connect_ro(self.db_path)
+        try:
+            return bd.build_matrix(conn)
+        finally:
+            conn.close()
+
+
+class TestBuildMatrix(BrainDedupeTestBase):
+
+    def test_rows_normalized_and_filtered(self):
+        self._insert("entries", "a", self._vec() * 5)
+        self._insert("entries", "no embedding", None)
+        self._insert("entries", "zero", np.zeros(bd.EMBEDDING_DIM))
+        self._insert("entries", "short blob", np.ones(10))
+        self._insert("pending", "p", self._vec())
+        self._insert("pending", "rejected", self._vec(), status="rejected")
+        matrix, keys = self._load()
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags["C_CONTIGUOUS"])
+        self.assertEqual(keys.tolist(), [[bd.KIND_ENTRY, 1], [bd.KIND_PENDING, 1]])
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+
+
+class TestSimilarity(BrainDedupeTestBase):
+
+    def _reference(self, matrix, threshold):
+        sims = matrix @ matrix.T
+        i, j = np.nonzero(np.triu(sims, k=1) > threshold)
+        return set(zip(i.tolist(), j.tolist()))
+
+    def test_blocked_matches_dense_for_all_block_sizes(self):
+        base = self._vec()
+        rows = [self._vec(base, 0.05) for _ in range(6)] + [self._vec() for _ in range(20)]
+        matrix = np.stack(rows)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        expected = self._reference(matrix, 0.9)
+        self.assertEqual(len(expected), 15)  # 6 choose 2
+        for block in (1, 3, 7, 64):
+            with self.subTest(block=block):
+                got = set()
+                for i, j, _ in bd.similar_pairs(matrix, 0.9, block):
+                    got |= set(zip(i.tolist(), j.tolist()))
+                self.assertEqual(got, expected)
+
+    def test_rows_mode_only_touches_selected_rows(self):
+        base = self._vec()
+        matrix = np.stack([self._vec(base, 0.01) for _ in range(4)])
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        got = set()
+        for i, j, _ in bd.similar_pairs(matrix, 0.9, 2, rows=np.array([0, 3])):
+            got |= set(zip(i.tolist(), j.tolist()))
+        self.assertEqual(got, {(0, 1), (0, 2), (0, 3), (1, 3), (2, 3)})
+
+
+class TestFindDuplicates(BrainDedupeTestBase):
+
+    def test_pending_duplicates_and_clusters(self):
+        login = self._vec()
+        self._insert("entries", "Login form validates email", login)
+        self._insert("entries", "Deploy via staging", self._vec())
+        dup = self._insert("pending", "Login form checks email", self._vec(login, 0.02))
+        fresh = self._insert("pending", "Something new", self._vec())
+
+        result = bd.find_duplicates(*self._load())
+        self.assertEqual([p["id"] for p in result["pending"]], [dup])
+        hit = result["pending"][0]
+        self.assertEqual((hit["match_kind"], hit["match_id"]), ("entry", 1))
+        self.assertGreater(hit["similarity"], bd.DEFAULT_THRESHOLD)
+        self.assertNotIn(fresh, [p["id"] for p in result["pending"]])
+        self.assertEqual(result["clusters"], [[{"kind": "entry", "id": 1}, {"kind": "pending", "id": dup}]])
+
+    def test_scope_all_clusters_entries(self):
+        base = self._vec()
+        for n in range(3):
+            self._insert("entries", f"copy {n}", self._vec(base, 0.02))
+        matrix, keys = self._load()
+        self.assertEqual(bd.find_duplicates(matrix, keys)["clusters"], [])
+        (cluster,) = bd.find_duplicates(matrix, keys, scope="all")["clusters"]
+        self.assertEqual([m["id"] for m in cluster], [1, 2, 3])
+
+    def test_empty_brain(self):
+        result = bd.find_duplicates(*self._load(), scope="all")
+        self.assertEqual(result, {"pending": [], "clusters": [], "pairs": 0})
+
+
+class TestCacheAndReport(BrainDedupeTestBase):
+
+    def test_cache_reused_until_db_changes(self):
+        self._insert("entries", "a", self._vec())
+        cache = self.tmp / "cache"
+        matrix, _ = bd.load_matrix(self.db_path, cache)
+        self.assertNotIsInstance(matrix, np.memmap)
+        again, _ = bd.load_matrix(self.db_path, cache)
+        self.assertIsInstance(again, np.memmap)
+        np.testing.assert_array_equal(matrix, again)
+
+        self._insert("entries", "b", self._vec())
+        grown, keys = bd.load_matrix(self.db_path, cache)
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(len(list(cache.glob("*.matrix.npy"))), 1)
+
+    def test_markdown_and_json_reports(self):
+        login = self._vec()
+        self._insert("entries", "Login form validates email", login)
+        self._insert("pending", "Login form | checks email", self._vec(login, 0.02))
+        md = bd.run(self.db_path, cache_dir=None)
+        self.assertIn("| #1 | entry #1 |", md)
+        self.assertIn("Login form \\| checks email", md)
+        self.assertIn("### Cluster 1 (2 rows)", md)
+
+        doc = json.loads(bd.run(self.db_path, fmt="json", cache_dir=None))
+        self.assertEqual(doc["meta"]["rows"], 2)
+        self.assertEqual(doc["snippets"]["entry:1"], "Login form validates email")
+
+    def test_main_writes_report(self):
+        self._insert("entries", "a", self._vec())
+        out = self.tmp / "report.md"
+        code = bd.main([f"--db={self.db_path}", f"--out={out}", "--no-cache"])
+        self.assertEqual(code, 0)
+        self.assertIn("# wf-brain duplicate review", out.read_text())
+
+    def test_missing_db(self):
+        self.assertEqual(bd.main([f"--db={self.tmp / 'nope.db'}"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+"""Tests for the timed autonomy checkpoint in the Stop hook.
+
+Covers:
+  - Timeout falls back to `autonomy.timeoutAction` (continue / stop)
+  - `autonomy.maxTasks` counter persisted in session state; at the cap an
+    unanswered checkpoint stops, an explicit "continue" starts a new batch
+  - `WF_UNATTENDED` runs count tasks and stop at `maxTasks` too
+  - No terminal (headless / CI) applies the timeout action at once
+  - Terminal reads honour the deadline mid-answer and accept `\r` or `\n`
+  - Review preview streams only the lines it prints
+  - `checkpointTimeout` validation and clamping
+"""
+
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, wo
+
+
+class CheckpointTestBase(ContextMonitorTestBase):
+
+    def _workflow(self, **autonomy):
+        wf = {"project": "p", "autonomy": {"enabled": True, **autonomy}}
+        (self.tmp / "workflow.json").write_text(json.dumps(wf))
+
+    def _stop(self, *answers):
+        """Run handle_stop with scripted `_timed_input` answers (None = timeout)."""
+        orch = self._make_orch(cwd=str(self.tmp))
+        out = io.StringIO()
+        with mock.patch.object(wo, "_timed_input", side_effect=list(answers)) as prompt, \
+                contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            code = orch.handle_stop()
+        return code, orch, out.getvalue(), prompt
+
+
+class TestTimedCheckpoint(CheckpointTestBase):
+
+    def test_timeout_continues_by_default(self):
+        self._workflow()
+        code, _, text, prompt = self._stop(None)
+        self.assertEqual(code, 2)
+        self.assertIn("no answer in 30s = continue", text)
+        self.assertEqual(prompt.call_args[0][1], 30)
+
+    def test_timeout_action_stop(self):
+        self._workflow(timeoutAction="stop", checkpointTimeout=5)
+        code, _, _, prompt = self._stop(None)
+        self.assertEqual(code, 0)
+        self.assertEqual(prompt.call_args[0][1], 5)
+
+    def test_explicit_answers(self):
+        self._workflow()
+        self.assertEqual(self._stop("")[0], 2)
+        self.assertEqual(self._stop("s")[0], 0)
+
+    def test_terminal_closed_stops(self):
+        self._workflow()
+        self.assertEqual(self._stop(EOFError())[0], 0)
+
+    def test_no_terminal_applies_timeout_action(self):
+        self._workflow()
+        orch = self._make_orch(cwd=str(self.tmp))
+        started = wo.time.monotonic()
+        with mock.patch("builtins.open", side_effect=OSError), \
+                contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(orch.handle_stop(), 2)
+        self.assertLess(wo.time.monotonic() - started, 5)
+
+    def test_policy_validation(self):
+        policy = wo.WFOrchestrator._checkpoint_policy
+        self.assertEqual(policy({}), (wo.DEFAULT_CHECKPOINT_TIMEOUT, "continue"))
+        self.assertEqual(policy({"checkpointTimeout": 600}), (wo.MAX_CHECKPOINT_TIMEOUT, "continue"))
+        self.assertEqual(policy({"checkpointTimeout": "x", "timeoutAction": "maybe"}),
+                         (wo.DEFAULT_CHECKPOINT_TIMEOUT, "continue"))
+
+
+class TestTimedInput(unittest.TestCase):
+    """`_timed_input` reads `/dev/tty` only — stdin is the hook payload."""
+
+    def _with_tty(self, data: bytes, timeout: float):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, data)
+        with os.fdopen(write_fd, "w"), \
+                mock.patch("builtins.open", return_value=os.fdopen(read_fd, "rb", buffering=0)), \
+                contextlib.redirect_stdout(io.StringIO()):
+            return wo._timed_input("> ", timeout)
+
+    def test_answer(self):
+        self.assertEqual(self._with_tty(b" Stop\n", 1.0), "stop")
+
+    def test_timeout(self):
+        self.assertIsNone(self._with_tty(b"", 0.05))
+
+    def test_partial_answer_times_out(self):
+        started = time.monotonic()
+        self.assertIsNone(self._with_tty(b"sto", 0.1))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_raw_mode_carriage_return(self):
+        self.assertEqual(self._with_tty(b"c\r", 1.0), "c")
+
+    def test_answer_split_across_reads(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b"re")
+        timer = threading.Timer(0.05, os.write, (write_fd, b"view\n"))
+        timer.start()
+        self.addCleanup(os.close, write_fd)
+        self.addCleanup(timer.join)
+        with mock.patch("builtins.open", return_value=os.fdopen(read_fd, "rb", buffering=0)), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(wo._timed_input("> ", 1.0), "review")
+
+    def test_closed_terminal(self):
+        read_fd, write_fd = os.pipe()
+        os.close(write_fd)
+        with mock.patch("builtins.open", return_value=os.fdopen(read_fd, "rb", buffering=0)), \
+                contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(EOFError):
+                wo._timed_input("> ", 1.0)
+
+    def test_no_terminal_ignores_stdin(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b"s\n")
+        os.close(write_fd)
+        with os.fdopen(read_fd) as stdin, \
+                mock.patch("builtins.open", side_effect=OSError), \
+                mock.patch.object(wo.sys, "stdin", stdin), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(wo._timed_input("> ", 30))
+            self.assertEqual(stdin.read(), "s\n")
+
+
+class TestMaxTasks(CheckpointTestBase):
+
+    def test_counter_persists_and_cap_forces_stop(self):
+        self._workflow(maxTasks=2)
+        code, orch, _, _ = self._stop(None)
+        self.assertEqual(code, 2)
+        self.assertEqual(orch.state["autonomy_tasks"], 1)
+
+        code, orch, text, _ = self._stop(None)   # 2/2, nobody answers
+        self.assertEqual(code, 0)
+        self.assertIn("Tasks this run: 2/2 — limit reached", text)
+        self.assertIn("= stop", text)
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(saved["autonomy_tasks"], 0)
+
+    def test_unattended_run_stops_at_cap(self):
+        self._workflow(maxTasks=2)
+        os.environ["WF_UNATTENDED"] = "true"
+        self.addCleanup(os.environ.pop, "WF_UNATTENDED", None)
+        codes = [self._stop()[0] for _ in range(3)]
+        self.assertEqual(codes, [2, 0, 2])
+        self.assertEqual(self._stop()[3].call_count, 0)
+
+    def test_human_continue_starts_new_batch(self):
+        self._workflow(maxTasks=1)
+        code, orch, _, _ = self._stop("c")
+        self.assertEqual(code, 2)
+        self.assertEqual(orch.state["autonomy_tasks"], 0)
+
+
+class TestProgressPreview(CheckpointTestBase):
+
+    def test_review_shows_limited_preview(self):
+        self._workflow()
+        (self.tmp / "progress.md").write_text("".join(f"line {i}\n" for i in range(500)))
+        code, _, text, _ = self._stop("r", "")
+        self.assertEqual(code, 2)
+        self.assertIn(f"line {wo.PROGRESS_PREVIEW_LINES - 1}\n", text)
+        self.assertNotIn(f"line {wo.PROGRESS_PREVIEW_LINES}\n", text)
+        self.assertIn("... (truncated)", text)
+
+    def test_preview_reads_only_what_it_prints(self):
+        consumed = []
+
+        class _Lines:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def __iter__(self):
+                for i in range(10_000):
+                    consumed.append(i)
+                    yield f"line {i}\n"
+
+        out = io.StringIO()
+        with mock.patch("builtins.open", return_value=_Lines()), contextlib.redirect_stdout(out):
+            wo.WFOrchestrator._print_progress_preview(self.tmp / "progress.md", limit=3)
+        self.assertEqual(out.getvalue(), "line 0\nline 1\nline 2\n\n... (truncated)\n")
+        self.assertEqual(len(consumed), 4)
+
+    def test_short_file_not_marked_truncated(self):
+        path = self.tmp / "progress.md"
+        path.write_text("a\nb\n")
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            wo.WFOrchestrator._print_progress_preview(path)
+        self.assertEqual(out.getvalue(), "a\nb\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Tests for the read-only wf-brain reader used at session start.
+
+Covers:
+  - `.claude/brain.db` discovery and FTS query construction
+  - Shadow-index sync: initial build, signature short-circuit, updates,
+    deletions; the brain DB itself is never written
+  - BM25 ranking with tags weighted above content
+  - Session-start injection and the `brain.autoInject` opt-out
+"""
+
+import json
+import os
+import sqlite3
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, wo, wb
+
+
+_DDL = """
+CREATE TABLE entries (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  content     TEXT    NOT NULL,
+  category    TEXT    NOT NULL DEFAULT '',
+  tags        TEXT    NOT NULL DEFAULT '',
+  source      TEXT    NOT NULL DEFAULT '',
+  embedding   BLOB,
+  created_at  TEXT    NOT NULL DEFAULT (datetime('now')),
+  updated_at  TEXT    NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+
+class BrainTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.project = self.tmp / "proj"
+        (self.project / ".claude").mkdir(parents=True)
+        self.db_path = self.project / ".claude" / "brain.db"
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(_DDL)
+        conn.close()
+
+    def _sql(self, sql: str, *params):
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            cur = conn.execute(sql, params)
+        conn.close()
+        return cur.lastrowid
+
+    def _add(self, content: str, category: str = "pattern", tags: str = "") -> int:
+        return self._sql(
+            "INSERT INTO entries (content, category, tags) VALUES (?, ?, ?)", content, category, tags
+        )
+
+    def _index(self):
+        return wb.BrainIndex(self.db_path, wo.STATE_DIR / "brain")
+
+
+class TestHelpers(BrainTestBase):
+
+    def test_finds_db_walking_up(self):
+        nested = self.project / "src" / "pkg"
+        nested.mkdir(parents=True)
+        self.assertEqual(wb._find_brain_db(str(nested)), self.db_path)
+        self.assertIsNone(wb._find_brain_db(str(self.tmp)))
+
+    def test_fts_query(self):
+        self.assertEqual(
+            wb._fts_query('feat/123-login "form" AND NOT x'),
+            '"login" OR "form"',
+        )
+        self.assertIsNone(wb._fts_query("feat/123"))
+
+
+class TestBrainIndex(BrainTestBase):
+
+    def test_search_ranks_matches(self):
+        self._add("Use bcrypt for password hashing", tags="auth,security")
+        self._add("Login form validates email on blur", tags="frontend")
+        self._add("Deploys go through the staging pipeline")
+        hits = self._index().search("Build the login form")
+        self.assertEqual(hits[0]["content"], "Login form validates email on blur")
+        self.assertEqual(len(hits), 1)
+
+    def test_tags_outrank_content(self):
+        self._add("Notes mention auth once", tags="misc")
+        self._add("Session cookies are httpOnly", tags="auth")
+        hits = self._index().search("auth")
+        self.assertEqual(hits[0]["content"], "Session cookies are httpOnly")
+
+    def test_unchanged_db_skips_sync(self):
+        self._add("Login form validates email")
+        index = self._index()
+        index.search("login")
+        conn = index._open_index()
+        with mock.patch("sqlite3.connect", side_effect=AssertionError("brain.db reopened")):
+            self.assertFalse(index.sync(conn))
+        conn.close()
+
+    def test_updates_and_deletes_propagate(self):
+        keep = self._add("Login form validates email")
+        gone = self._add("Login uses magic links")
+        index = self._index()
+        self.assertEqual(len(index.search("login")), 2)
+
+        self._sql("DELETE FROM entries WHERE id = ?", gone)
+        self._sql(
+            "UPDATE entries SET content = 'Signup form validates email', "
+            "updated_at = datetime('now', '+1 second') WHERE id = ?", keep,
+        )
+        self.assertEqual(index.search("login"), [])
+        self.assertEqual([h["id"] for h in index.search("signup")], [keep])
+
+    def test_brain_db_opened_read_only(self):
+        self._add("Login form validates email")
+        before = self.db_path.stat().st_mtime_ns
+        real_connect = sqlite3.connect
+        uris = []
+
+        def spy(target, *args, **kwargs):
+            uris.append(str(target))
+            return real_connect(target, *args, **kwargs)
+
+        with mock.patch("sqlite3.connect", side_effect=spy):
+            self._index().search("login")
+        brain_opens = [u for u in uris if "brain.db" in u]
+        self.assertTrue(brain_opens)
+        self.assertTrue(all(u.startswith("file:") and u.endswith("?mode=ro") for u in brain_opens))
+        self.assertEqual(self.db_path.stat().st_mtime_ns, before)
+
+    def test_missing_entries_table_returns_empty(self):
+        os.remove(self.db_path)
+        sqlite3.connect(self.db_path).close()
+        self.assertEqual(self._index().search("login"), [])
+
+
+class TestSessionStartInjection(BrainTestBase):
+
+    def _workflow(self, **extra):
+        wf = {"project": "p", "github": {"owner": "o", "repo": "r"}, **extra}
+        (self.project / ".claude" / "workflow.json").write_text(json.dumps(wf))
+        (self.project / "progress.md").write_text("## In Progress\n- Build the login form\n")
+
+    def test_relevant_entries_injected(self):
+        self._add("Login form validates email on blur", category="decision")
+        self._add("Deploys go through staging")
+        self._workflow()
+        out = self._make_orch(cwd=str(self.project)).handle_first_run()
+        ctx = out["hookSpecificOutput"]["additionalContext"]
+        self.assertIn("Relevant brain entries", ctx)
+        self.assertIn("- [decision] Login form validates email on blur", ctx)
+        self.assertNotIn("staging", ctx)
+
+    def test_auto_inject_opt_out(self):
+        self._add("Login form validates email on blur")
+        self._workflow(brain={"autoInject": False})
+        out = self._make_orch(cwd=str(self.project)).handle_first_run()
+        self.assertNotIn("Relevant brain entries", out["hookSpecificOutput"]["additionalContext"])
+
+    def test_long_entries_clipped(self):
+        self._add("login " + "x" * 1000)
+        self._workflow()
+        out = self._make_orch(cwd=str(self.project)).handle_first_run()
+        line = [l for l in out["hookSpecificOutput"]["additionalContext"].splitlines() if l.startswith("- [")][0]
+        self.assertLessEqual(len(line), wo.BRAIN_ENTRY_CHARS + len("- [pattern] "))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""Tests for compressed and rotated transcript reading.
+
+Covers:
+  - Chunked streaming (lines spanning read boundaries)
+  - `.gz` segments and archived bases; `.zst` when `zstandard` is present
+  - Rotated chains (`.1`, `.2`, …) read oldest-first as one stream
+  - Per-segment caching that survives rotation renames
+  - `iter_transcript_entries` for replay tooling
+"""
+
+import gzip
+import importlib.util
+import json
+import os
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo
+
+
+_HAS_ZSTD = importlib.util.find_spec("zstandard") is not None
+
+
+def _lines(*totals: int) -> bytes:
+    return b"".join(
+        (json.dumps(_usage_entry(input_tokens=t)) + "\n").encode() for t in totals
+    )
+
+
+class ChainTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.base = str(self.tmp / "session.jsonl")
+
+    def _plain(self, path: str, *totals: int):
+        with open(path, "wb") as f:
+            f.write(_lines(*totals))
+
+    def _gz(self, path: str, *totals: int):
+        with gzip.open(path, "wb") as f:
+            f.write(_lines(*totals))
+
+
+class TestStreaming(ChainTestBase):
+
+    def test_lines_spanning_chunks(self):
+        self._plain(self.base, 10_000, 20_000, 15_000)
+        with mock.patch.object(wo, "TRANSCRIPT_READ_CHUNK", 16):
+            cur = wo._scan_transcript(self.base)
+        self.assertEqual(cur["latest"], 15_000)
+        self.assertEqual(cur["observed_max"], 20_000)
+        self.assertEqual(cur["offset"], os.path.getsize(self.base))
+
+    def test_gz_segment(self):
+        path = self.base + ".gz"
+        self._gz(path, 10_000, 40_000, 30_000)
+        self.assertEqual(wo._scan_segment(path), {"latest": 30_000, "observed_max": 40_000})
+
+    def test_truncated_gz_keeps_partial_reading(self):
+        path = self.base + ".gz"
+        self._gz(path, *range(1_000, 200_000, 1_000))
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[: len(data) // 2])
+        reading = wo._scan_segment(path)
+        self.assertIsNotNone(reading)
+        self.assertGreater(reading["observed_max"], 0)
+
+    @unittest.skipIf(_HAS_ZSTD, "zstandard installed")
+    def test_zst_skipped_without_module(self):
+        path = self.base + ".zst"
+        with open(path, "wb") as f:
+            f.write(b"\x28\xb5\x2f\xfd")
+        self.assertIsNone(wo._scan_segment(path))
+
+    @unittest.skipUnless(_HAS_ZSTD, "zstandard not installed")
+    def test_zst_segment(self):
+        import zstandard
+
+        path = self.base + ".zst"
+        with open(path, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(_lines(10_000, 70_000)))
+        self.assertEqual(wo._scan_segment(path), {"latest": 70_000, "observed_max": 70_000})
+
+
+class TestRotatedChain(ChainTestBase):
+
+    def test_chain_order_oldest_first(self):
+        self._plain(self.base + ".2", 1)
+        self._gz(self.base + ".1.gz", 2)
+        self._plain(self.base, 3)
+        self.assertEqual(
+            wo._transcript_chain(self.base),
+            [self.base + ".2", self.base + ".1.gz", self.base],
+        )
+
+    def test_archived_base_only(self):
+        self._gz(self.base + ".gz", 5_000)
+        self.assertEqual(wo._transcript_chain(self.base), [self.base + ".gz"])
+
+    def test_chain_reading(self):
+        self._plain(self.base + ".2", 100_000, 600_000)
+        self._gz(self.base + ".1.gz", 300_000)
+        self._plain(self.base, 50_000)
+        cursor, segments, latest, observed_max = wo._scan_transcript_chain(self.base)
+        self.assertEqual(latest, 50_000)
+        self.assertEqual(observed_max, 600_000)
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(cursor["latest"], 50_000)
+
+    def test_latest_falls_back_to_rotated_segment(self):
+        self._gz(self.base + ".1.gz", 80_000)
+        self._plain(self.base)  # freshly rotated, empty
+        _, _, latest, _ = wo._scan_transcript_chain(self.base)
+        self.assertEqual(latest, 80_000)
+
+    def test_segments_cached_across_calls_and_renames(self):
+        self._gz(self.base + ".1.gz", 300_000)
+        self._plain(self.base, 50_000)
+        cursor, segments, _, _ = wo._scan_transcript_chain(self.base)
+
+        # Rotate again: .1.gz → .2.gz (rename keeps size/mtime), base → .1
+        os.rename(self.base + ".1.gz", self.base + ".2.gz")
+        os.rename(self.base, self.base + ".1")
+        self._plain(self.base, 20_000)
+        with mock.patch.object(wo, "_scan_segment", wraps=wo._scan_segment) as scan:
+            _, segments, latest, observed_max = wo._scan_transcript_chain(
+                self.base, cursor, segments
+            )
+        # Only the newly rotated plain segment needed a full read.
+        self.assertEqual([c[0][0] for c in scan.call_args_list], [self.base + ".1"])
+        self.assertEqual((latest, observed_max), (20_000, 300_000))
+
+    def test_context_usage_over_rotated_chain(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        self._gz(self.base + ".1.gz", 190_000)
+        self._plain(self.base, 40_000)
+        orch = self._make_orch(transcript_path=self.base)
+        tokens, pct, _ = orch._get_context_usage()
+        self.assertEqual(tokens, 40_000)
+        self.assertAlmostEqual(pct, 20.0)
+        self.assertEqual(len(orch.state["transcript_segments"]), 1)
+
+    def test_rotation_does_not_drop_window_calibration(self):
+        self._gz(self.base + ".1.gz", 900_000)
+        self._plain(self.base, 100_000)
+        orch = self._make_orch(transcript_path=self.base)
+        _, _, window = orch._get_context_usage()
+        self.assertEqual(window, 1_000_000)
+
+
+class TestIterEntries(ChainTestBase):
+
+    def test_streams_whole_chain(self):
+        self._gz(self.base + ".1.gz", 1, 2)
+        with open(self.base, "wb") as f:
+            f.write(_lines(3) + b"garbage\n")
+        totals = [wo._usage_total(e) for e in wo.iter_transcript_entries(self.base)]
+        self.assertEqual(totals, [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
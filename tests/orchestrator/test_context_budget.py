@@ -0,0 +1,139 @@
+"""Tests for the injected-context budget (`contextBudget` in workflow.json).
+
+Covers:
+  - Accounting of every injection in `state["injected"]`
+  - Compact variants on repeat and when `compact: true`
+  - Dedupe within a compaction cycle, cleared on auto-reset
+  - `maxTokens` fallback: full → compact → status line only
+  - CRITICAL is never dropped
+  - PreToolUse event name and permission decisions
+"""
+
+import json
+import os
+import unittest
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo, wr
+
+
+class BudgetTestBase(ContextMonitorTestBase):
+
+    def _config(self, **budget):
+        wf = {"project": "p", "github": {"owner": "o", "repo": "r"}}
+        if budget:
+            wf["contextBudget"] = budget
+        (self.tmp / "workflow.json").write_text(json.dumps(wf))
+
+    def _orch(self):
+        return self._make_orch(cwd=str(self.tmp))
+
+
+class TestEmit(BudgetTestBase):
+
+    def test_accounts_for_injection(self):
+        orch = self._orch()
+        out = orch._emit("note", "m", "x" * 40, "y" * 8)
+        self.assertEqual(out["hookSpecificOutput"]["additionalContext"], "x" * 40)
+        injected = orch.state["injected"]
+        self.assertEqual(injected["tokens"], 10)
+        self.assertEqual(injected["requested_tokens"], 10)
+        self.assertEqual(injected["by_kind"]["note"], {"count": 1, "tokens": 10})
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(saved["injected"]["full"], 1)
+
+    def test_duplicate_within_cycle_not_reinjected(self):
+        orch = self._orch()
+        orch._emit("note", "m", "same text")
+        out = orch._emit("note", "m", "same text")
+        self.assertEqual(out, {"systemMessage": "m"})
+        self.assertEqual(orch.state["injected"]["deduped"], 1)
+
+        orch._start_injection_cycle()
+        out = orch._emit("note", "m", "same text")
+        self.assertIn("hookSpecificOutput", out)
+        self.assertEqual(orch.state["injected"]["cycles"], 1)
+
+    def test_repeat_uses_compact_variant(self):
+        orch = self._orch()
+        orch._emit("note", "m", "long " * 20, "short")
+        out = orch._emit("note", "m", "other long " * 20, "short")
+        self.assertEqual(out["hookSpecificOutput"]["additionalContext"], "short")
+
+    def test_compact_config(self):
+        self._config(compact=True)
+        out = self._orch()._emit("note", "m", "long " * 20, "short")
+        self.assertEqual(out["hookSpecificOutput"]["additionalContext"], "short")
+
+    def test_budget_falls_back_then_drops(self):
+        self._config(maxTokens=12)
+        orch = self._orch()
+        out = orch._emit("a", "m", "x" * 80, "y" * 40)    # 20 > 12 → compact (10)
+        self.assertEqual(out["hookSpecificOutput"]["additionalContext"], "y" * 40)
+        out = orch._emit("b", "m", "z" * 40, "w" * 20)    # 10 + 5 > 12 → dropped
+        self.assertNotIn("hookSpecificOutput", out)
+        injected = orch.state["injected"]
+        self.assertEqual((injected["compact"], injected["dropped"], injected["tokens"]), (1, 1, 10))
+        self.assertEqual(injected["requested_tokens"], 30)
+
+    def test_essential_exceeds_budget(self):
+        self._config(maxTokens=1)
+        out = self._orch()._emit("crit", "m", "x" * 80, "y" * 8, essential=True)
+        self.assertEqual(out["hookSpecificOutput"]["additionalContext"], "y" * 8)
+
+    def test_pre_tool_use_event(self):
+        out = self._orch()._emit("note", "m", "x" * 40, event="PreToolUse")
+        self.assertEqual(out["hookSpecificOutput"],
+                         {"hookEventName": "PreToolUse", "additionalContext": "x" * 40})
+
+    def test_decision_carries_context_as_reason(self):
+        self._config(maxTokens=1)
+        out = self._orch()._emit("guard", "m", "x" * 40, essential=True,
+                                 event="PreToolUse", decision="deny")
+        self.assertEqual(out["hookSpecificOutput"], {
+            "hookEventName": "PreToolUse",
+            "permissionDecision": "deny",
+            "permissionDecisionReason": "x" * 40,
+        })
+
+
+class TestHandlersUseBudget(BudgetTestBase):
+
+    def test_critical_compact_after_auto_reset(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        orch = self._orch()
+        orch.state["warning_shown"] = True
+        orch.transcript_path = self._write_transcript([_usage_entry(input_tokens=185_000)])
+        first = orch.handle_context_check()
+        self.assertIn("The /wf-core:wf-end-session skill will", first["hookSpecificOutput"]["additionalContext"])
+
+        orch.transcript_path = self._write_transcript([_usage_entry(input_tokens=40_000)])
+        orch.handle_context_check()     # compaction → reset
+        orch.transcript_path = self._write_transcript([_usage_entry(input_tokens=185_000)])
+        orch.state["warning_shown"] = True
+        second = orch.handle_context_check()
+        ctx = second["hookSpecificOutput"]["additionalContext"]
+        self.assertIn("Invoke Skill wf-end-session NOW", ctx)
+        self.assertLess(len(ctx), len(first["hookSpecificOutput"]["additionalContext"]))
+        self.assertIn("CRITICAL", second["systemMessage"])
+
+    def test_session_start_compact(self):
+        self._config(compact=True)
+        out = self._orch().handle_first_run()
+        ctx = out["hookSpecificOutput"]["additionalContext"]
+        self.assertTrue(ctx.startswith("SESSION START (o/r) no WIP."))
+        self.assertEqual(self._orch().state["injected"]["by_kind"]["session_start"]["count"], 1)
+
+
+class TestStatsReportSavings(BudgetTestBase):
+
+    def test_fleet_stats_sum_injection(self):
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        (wo.STATE_DIR / "s1.json").write_text(json.dumps({
+            "project": "p", "injected": {"tokens": 300, "requested_tokens": 1000},
+        }))
+        (group,) = wr.collect_stats(wo.STATE_DIR)
+        self.assertEqual((group["injected_tokens"], group["injected_saved_tokens"]), (300, 700))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -29,6 +29,10 @@ assert _spec is not None and _spec.loader is not None, f"failed to load {_SCRIPT
 wo = importlib.util.module_from_spec(_spec)
 sys.modules["wf_orchestrator"] = wo
 _spec.loader.exec_module(wo)
+# Offline tooling and the wf-brain reader live in sibling modules, loaded
+# the same way the orchestrator loads them.
+wr = wo._load_sibling("wf_reports", "wf-reports.py")
+wb = wo._load_sibling("wf_brain_reader", "wf-brain-reader.py")
 
 
 # Env vars the context monitor reads — clear them per-test so the
@@ -386,6 +390,8 @@ class TestDisableFlag(ContextMonitorTestBase):
         path = self._write_transcript([_usage_entry(input_tokens=190_000)])
         orch = self._make_orch(transcript_path=path)
         self.assertIsNone(orch.handle_context_check())
+        # Usage is still recorded for wf-supervisor's recycle decision.
+        self.assertEqual(orch.state["transcript_cursor"]["latest"], 190_000)
 
     def test_workflow_json_disable_short_circuits(self):
         # Per-project opt-out via workflow.json — no env-var gymnastics.
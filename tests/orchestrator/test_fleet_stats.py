@@ -0,0 +1,214 @@
+"""Tests for incremental transcript scanning and `--mode=stats`.
+
+Covers:
+  - Cursor resume: only bytes appended since the last scan are parsed
+  - Rewrite / truncation detection (tail fingerprint, offset past EOF)
+  - Partial trailing lines are re-read once complete
+  - Per-session event counters (warning/critical, warning→critical time)
+  - Fleet aggregation grouped by project + workflow type, JSON and CSV,
+    serial and process-pool paths
+"""
+
+import io
+import json
+import os
+import unittest
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo, wr
+
+
+class TestIncrementalScan(ContextMonitorTestBase):
+    """`_scan_transcript` resumes from the stored offset."""
+
+    def _append(self, path: str, *entries):
+        with open(path, "a") as f:
+            for e in entries:
+                f.write(json.dumps(e) + "\n")
+
+    def test_resume_only_reads_appended_bytes(self):
+        path = self._write_transcript([_usage_entry(input_tokens=10_000)])
+        first = wo._scan_transcript(path)
+        self.assertEqual(first["latest"], 10_000)
+        self.assertEqual(first["offset"], os.path.getsize(path))
+
+        self._append(path, _usage_entry(input_tokens=30_000), _usage_entry(input_tokens=20_000))
+        second = wo._scan_transcript(path, first)
+        self.assertEqual(second["latest"], 20_000)
+        self.assertEqual(second["observed_max"], 30_000)
+        self.assertEqual(second["offset"], os.path.getsize(path))
+        # Input cursor untouched.
+        self.assertEqual(first["latest"], 10_000)
+
+    def test_noop_when_nothing_appended(self):
+        path = self._write_transcript([_usage_entry(input_tokens=10_000)])
+        first = wo._scan_transcript(path)
+        self.assertEqual(wo._scan_transcript(path, first), first)
+
+    def test_rewritten_file_is_rescanned(self):
+        path = self._write_transcript([_usage_entry(input_tokens=160_000)])
+        first = wo._scan_transcript(path)
+        # Same length, different content — only the tail fingerprint catches it.
+        path = self._write_transcript([_usage_entry(input_tokens=100_000)])
+        second = wo._scan_transcript(path, first)
+        self.assertEqual(second["latest"], 100_000)
+        self.assertEqual(second["observed_max"], 100_000)
+
+    def test_truncated_file_is_rescanned(self):
+        path = self._write_transcript([
+            _usage_entry(input_tokens=10_000),
+            _usage_entry(input_tokens=90_000),
+        ])
+        first = wo._scan_transcript(path)
+        path = self._write_transcript([_usage_entry(input_tokens=5_000)])
+        second = wo._scan_transcript(path, first)
+        self.assertEqual(second["latest"], 5_000)
+        self.assertEqual(second["observed_max"], 5_000)
+
+    def test_partial_trailing_line_not_consumed(self):
+        path = self._write_transcript([_usage_entry(input_tokens=10_000)])
+        line = json.dumps(_usage_entry(input_tokens=40_000))
+        with open(path, "a") as f:
+            f.write(line[:20])
+        cur = wo._scan_transcript(path)
+        self.assertEqual(cur["latest"], 10_000)
+        with open(path, "a") as f:
+            f.write(line[20:] + "\n")
+        cur = wo._scan_transcript(path, cur)
+        self.assertEqual(cur["latest"], 40_000)
+        self.assertEqual(cur["offset"], os.path.getsize(path))
+
+    def test_cursor_persists_in_session_state(self):
+        path = self._write_transcript([_usage_entry(input_tokens=10_000)])
+        orch = self._make_orch(transcript_path=path)
+        orch._get_context_usage()
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(saved["transcript_cursor"]["latest"], 10_000)
+        self.assertEqual(saved["transcript_path"], path)
+        self.assertEqual(saved["context_window"], 1_000_000)
+
+        # A fresh orchestrator for the same session resumes from the cursor.
+        self._append(path, _usage_entry(input_tokens=25_000))
+        orch2 = self._make_orch(transcript_path=path)
+        tokens, _, _ = orch2._get_context_usage()
+        self.assertEqual(tokens, 25_000)
+
+
+class TestEventCounters(ContextMonitorTestBase):
+    """Warning/critical firings are counted for the stats tooling."""
+
+    def test_warning_then_critical_counts_and_interval(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        path = self._write_transcript([_usage_entry(input_tokens=160_000)])
+        orch = self._make_orch(transcript_path=path)
+        orch.handle_context_check()
+        self.assertEqual(orch.state["warning_count"], 1)
+        self.assertIn("warning_at", orch.state)
+
+        orch.transcript_path = self._write_transcript([_usage_entry(input_tokens=185_000)])
+        orch.handle_context_check()
+        self.assertEqual(orch.state["critical_count"], 1)
+        self.assertEqual(len(orch.state["warn_to_critical_s"]), 1)
+        self.assertGreaterEqual(orch.state["warn_to_critical_s"][0], 0.0)
+
+    def test_interval_history_is_capped(self):
+        orch = self._make_orch()
+        orch.state["warn_to_critical_s"] = [1.0] * wo.WARN_TO_CRITICAL_KEEP
+        orch.state["warning_at"] = "2026-01-01T00:00:00"
+        orch._record_critical()
+        self.assertEqual(len(orch.state["warn_to_critical_s"]), wo.WARN_TO_CRITICAL_KEEP)
+
+
+class TestFleetStats(ContextMonitorTestBase):
+    """`collect_stats` / `run_stats` aggregate across state files."""
+
+    def _write_session(self, sid: str, *, project="alpha", workflow="github",
+                       peak=0, window=None, warnings=0, criticals=0, w2c=(),
+                       transcript=None):
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        state = {
+            "project": project,
+            "workflow_detected": workflow,
+            "warning_count": warnings,
+            "critical_count": criticals,
+            "warn_to_critical_s": list(w2c),
+        }
+        if window:
+            state["context_window"] = window
+        if transcript:
+            state["transcript_path"] = transcript
+            state["transcript_cursor"] = wo._scan_transcript(transcript)
+        elif peak:
+            cursor = wo._new_cursor("")
+            cursor.update(latest=peak, observed_max=peak)
+            state["transcript_cursor"] = cursor
+        (wo.STATE_DIR / f"{sid}.json").write_text(json.dumps(state))
+
+    def test_groups_by_project_and_workflow(self):
+        self._write_session("a1", peak=150_000, warnings=1, criticals=1, w2c=(30.0,))
+        self._write_session("a2", peak=700_000, window=1_000_000, criticals=2, w2c=(10.0, 50.0))
+        self._write_session("b1", project="beta", workflow="jira", peak=90_000)
+        groups = {(g["project"], g["workflow"]): g for g in wr.collect_stats(wo.STATE_DIR)}
+
+        alpha = groups[("alpha", "github")]
+        self.assertEqual(alpha["sessions"], 2)
+        self.assertEqual(alpha["peak_tokens"], 700_000)
+        self.assertEqual(alpha["criticals"], 3)
+        self.assertEqual(alpha["warn_to_critical_n"], 3)
+        self.assertEqual(alpha["warn_to_critical_mean_s"], 30.0)
+        self.assertEqual(alpha["warn_to_critical_max_s"], 50.0)
+        self.assertEqual(alpha["tiers"], {"1000000": 2})
+        self.assertEqual(groups[("beta", "jira")]["sessions"], 1)
+
+    def test_reads_transcript_past_stored_cursor(self):
+        path = self._write_transcript([_usage_entry(input_tokens=100_000)])
+        self._write_session("s1", transcript=path)
+        with open(path, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=450_000)) + "\n")
+        (group,) = wr.collect_stats(wo.STATE_DIR)
+        self.assertEqual(group["peak_tokens"], 450_000)
+        self.assertEqual(group["tiers"], {"1000000": 1})
+
+    def test_project_falls_back_to_workflow_json(self):
+        proj = self.tmp / "proj"
+        (proj / ".claude").mkdir(parents=True)
+        (proj / ".claude" / "workflow.json").write_text(json.dumps({
+            "project": "gamma", "breakdown": {"jiraProject": "GAM"},
+        }))
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        (wo.STATE_DIR / "g1.json").write_text(json.dumps({"cwd": str(proj)}))
+        (group,) = wr.collect_stats(wo.STATE_DIR)
+        self.assertEqual((group["project"], group["workflow"]), ("gamma", "jira"))
+
+    def test_corrupt_state_files_skipped(self):
+        self._write_session("ok", peak=10_000)
+        (wo.STATE_DIR / "broken.json").write_text("{nope")
+        (group,) = wr.collect_stats(wo.STATE_DIR)
+        self.assertEqual(group["sessions"], 1)
+
+    def test_pool_matches_serial(self):
+        for i in range(wr.STATS_POOL_MIN_FILES + 6):
+            self._write_session(f"s{i}", project=f"p{i % 3}", peak=1_000 * i, criticals=i % 2)
+        serial = wr.collect_stats(wo.STATE_DIR, workers=1)
+        pooled = wr.collect_stats(wo.STATE_DIR, workers=2)
+        self.assertEqual(serial, pooled)
+        self.assertEqual(sum(g["sessions"] for g in pooled), wr.STATS_POOL_MIN_FILES + 6)
+
+    def test_csv_output(self):
+        self._write_session("a1", peak=150_000, window=200_000)
+        out = io.StringIO()
+        self.assertEqual(wr.run_stats(fmt="csv", workers=1, out=out), 0)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(","), list(wr._STATS_CSV_FIELDS))
+        self.assertIn("200000:1", lines[1])
+
+    def test_json_output(self):
+        self._write_session("a1", peak=150_000)
+        out = io.StringIO()
+        wr.run_stats(fmt="json", workers=1, out=out)
+        doc = json.loads(out.getvalue())
+        self.assertEqual(doc["sessions"], 1)
+        self.assertEqual(doc["groups"][0]["project"], "alpha")
+
+
+if __name__ == "__main__":
+    unittest.main()
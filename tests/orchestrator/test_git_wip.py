@@ -0,0 +1,224 @@
+"""Tests for subprocess-free git WIP detection at session start.
+
+Covers:
+  - Branch / detached HEAD from `.git/HEAD`, including linked worktrees
+  - Issue references parsed from branch names
+  - Dirty flag from the index: staged entries and stat-modified files,
+    checked against real repositories (index v2 and v4)
+  - mtime-keyed caching in session state
+  - Fallback WIP in the GitHub session-start message
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, wo
+
+
+class GitTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.repo = self.tmp / "repo"
+        self.git = self.repo / ".git"
+        (self.git / "refs" / "heads" / "feat").mkdir(parents=True)
+        (self.git / "logs").mkdir()
+
+    def _checkout(self, branch: str, *, commit_at: float = 1_000_000, index_at: float = None):
+        """Fake `.git` on `branch` with an empty, clean index."""
+        (self.git / "HEAD").write_text(f"ref: refs/heads/{branch}\n")
+        ref = self.git / "refs" / "heads" / branch
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        ref.write_text("a" * 40 + "\n")
+        (self.git / "logs" / "HEAD").write_text("reflog\n")
+        (self.git / "index").write_bytes(b"DIRC" + bytes([0, 0, 0, 2, 0, 0, 0, 0]) + bytes(20))
+        for path in (self.git / "HEAD", ref, self.git / "logs" / "HEAD"):
+            os.utime(path, (commit_at, commit_at))
+        index_at = commit_at if index_at is None else index_at
+        os.utime(self.git / "index", (index_at, index_at))
+
+
+class TestIssueFromBranch(unittest.TestCase):
+
+    def test_patterns(self):
+        cases = {
+            "feat/123-login": "#123",
+            "fix/#77": "#77",
+            "issue-9": "#9",
+            "feature/PROJ-45-signup": "PROJ-45",
+            "feat/proj-45-x": "PROJ-45",
+            "PROJ-7": "PROJ-7",
+            "fix-77": "#77",
+            "hotfix/2024-01-15": None,
+            "hotfix/20240115": None,
+            "bug/2024-01-15-123-crash": "#123",
+            "main": None,
+            "release/2.3": None,
+            "dependabot/npm_and_yarn/lodash-4.17.21": None,
+        }
+        for branch, expected in cases.items():
+            with self.subTest(branch=branch):
+                self.assertEqual(wo._issue_from_branch(branch), expected)
+
+
+class TestGitWip(GitTestBase):
+
+    def test_branch_issue_and_clean(self):
+        self._checkout("feat/123-x")
+        orch = self._make_orch(cwd=str(self.repo))
+        self.assertEqual(
+            orch._get_git_wip(),
+            {"branch": "feat/123-x", "detached": None, "issue": "#123", "dirty": False},
+        )
+
+    def test_unreadable_index_is_unknown(self):
+        self._checkout("feat/123-x")
+        (self.git / "index").write_bytes(b"DIRC")
+        self.assertIsNone(self._make_orch(cwd=str(self.repo))._get_git_wip()["dirty"])
+
+    def test_detached_head(self):
+        (self.git / "HEAD").write_text("0123456789abcdef" * 2 + "\n")
+        orch = self._make_orch(cwd=str(self.repo / "sub"))
+        git = orch._get_git_wip()
+        self.assertIsNone(git["branch"])
+        self.assertEqual(git["detached"], "0123456789ab")
+
+    def test_linked_worktree(self):
+        self._checkout("main")
+        wt_git = self.git / "worktrees" / "wt1"
+        wt_git.mkdir(parents=True)
+        (wt_git / "HEAD").write_text("ref: refs/heads/feat/42-y\n")
+        (wt_git / "commondir").write_text("../..\n")
+        (self.git / "refs" / "heads" / "feat" / "42-y").write_text("b" * 40 + "\n")
+        worktree = self.tmp / "wt1"
+        worktree.mkdir()
+        (worktree / ".git").write_text(f"gitdir: {wt_git}\n")
+        git = self._make_orch(cwd=str(worktree))._get_git_wip()
+        self.assertEqual((git["branch"], git["issue"]), ("feat/42-y", "#42"))
+
+    def test_not_a_repository(self):
+        outside = self.tmp / "plain"
+        outside.mkdir()
+        with mock.patch.object(wo, "_find_git_dirs", return_value=None):
+            self.assertIsNone(self._make_orch(cwd=str(outside))._get_git_wip())
+
+    def test_cached_until_mtimes_move(self):
+        self._checkout("feat/123-x")
+        orch = self._make_orch(cwd=str(self.repo))
+        orch._get_git_wip()
+        with mock.patch.object(wo, "_issue_from_branch") as parse:
+            orch._get_git_wip()
+        parse.assert_not_called()
+
+        self._checkout("feat/200-z", commit_at=2_000_000)
+        self.assertEqual(orch._get_git_wip()["issue"], "#200")
+
+
+@unittest.skipUnless(shutil.which("git"), "git not installed")
+class TestDirtyFromIndex(ContextMonitorTestBase):
+    """`dirty` against indexes written by git itself."""
+
+    def setUp(self):
+        super().setUp()
+        self.repo = self.tmp / "real"
+        self.repo.mkdir()
+        self._git("init", "-q", "-b", "main")
+        (self.repo / "a.txt").write_text("one\n")
+        (self.repo / "sub").mkdir()
+        (self.repo / "sub" / "b.txt").write_text("two\n")
+        self._git("add", ".")
+        self._git("commit", "-q", "-m", "init")
+        # Move every file out of the racy window of the index just written.
+        past = self.repo.stat().st_mtime - 60
+        for path in (self.repo / "a.txt", self.repo / "sub" / "b.txt"):
+            os.utime(path, (past, past))
+        self._git("update-index", "--refresh")
+
+    def _git(self, *args):
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+            cwd=self.repo, check=True, capture_output=True,
+        )
+
+    def _dirty(self):
+        return self._make_orch(cwd=str(self.repo / "sub"))._get_git_wip()["dirty"]
+
+    def test_clean_after_commit(self):
+        self.assertIs(self._dirty(), False)
+
+    def test_index_rewrite_alone_is_clean(self):
+        future = self.repo.stat().st_mtime + 3600
+        os.utime(self.repo / ".git" / "index", (future, future))
+        self.assertIs(self._dirty(), False)
+
+    def test_unstaged_edit(self):
+        orch = self._make_orch(cwd=str(self.repo))
+        self.assertIs(orch._get_git_wip()["dirty"], False)
+        (self.repo / "sub" / "b.txt").write_text("two, edited\n")
+        self.assertIs(orch._get_git_wip()["dirty"], True)
+
+    def test_deleted_file(self):
+        (self.repo / "a.txt").unlink()
+        self.assertIs(self._dirty(), True)
+
+    def test_staged_change(self):
+        (self.repo / "a.txt").write_text("staged\n")
+        self._git("add", "a.txt")
+        self.assertIs(self._dirty(), True)
+
+    def test_racily_clean_entry_is_hashed(self):
+        now = self.repo.stat().st_mtime + 3600
+        index = self.repo / ".git" / "index"
+        (self.repo / "a.txt").write_text("one\n")  # same content, fresh mtime
+        os.utime(self.repo / "a.txt", (now, now))
+        self._git("update-index", "--refresh")
+        os.utime(index, (now, now))
+        self.assertIs(self._dirty(), False)
+        (self.repo / "a.txt").write_text("uno\n")  # same size, same second
+        os.utime(self.repo / "a.txt", (now, now))
+        self.assertIs(self._dirty(), True)
+
+    def test_index_v4(self):
+        self._git("update-index", "--index-version", "4")
+        self.assertIs(self._dirty(), False)
+        (self.repo / "sub" / "b.txt").write_text("changed\n")
+        self.assertIs(self._dirty(), True)
+
+
+class TestSessionStartIntegration(GitTestBase):
+
+    def test_github_wip_falls_back_to_branch(self):
+        self._checkout("feat/123-x")
+        (self.repo / ".claude").mkdir()
+        (self.repo / ".claude" / "workflow.json").write_text(json.dumps({
+            "project": "p", "github": {"owner": "o", "repo": "r"},
+        }))
+        out = self._make_orch(cwd=str(self.repo)).handle_first_run()
+        self.assertIn("WIP: #123", out["systemMessage"])
+        ctx = out["hookSpecificOutput"]["additionalContext"]
+        self.assertIn("Branch: feat/123-x (issue #123)", ctx)
+
+    def test_progress_md_wip_still_wins(self):
+        self._checkout("feat/123-x")
+        (self.repo / "workflow.json").write_text(json.dumps({
+            "github": {"owner": "o", "repo": "r"},
+        }))
+        (self.repo / "progress.md").write_text("## In Progress\n- Build the login form\n")
+        out = self._make_orch(cwd=str(self.repo)).handle_first_run()
+        self.assertIn("WIP: Build the login form", out["systemMessage"])
+
+    def test_jira_branch_key_in_message(self):
+        self._checkout("feature/PROJ-45-signup")
+        (self.repo / "workflow.json").write_text(json.dumps({
+            "project": "p", "breakdown": {"jiraProject": "PROJ"},
+        }))
+        out = self._make_orch(cwd=str(self.repo)).handle_first_run()
+        self.assertIn("PROJ-45", out["systemMessage"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Tests for the session handoff digest.
+
+Covers:
+  - Incremental transcript folding: edits / reads per file, open errors
+    cleared by a later success, partial trailing lines
+  - Deterministic rendering under the size cap
+  - Written on Stop and at CRITICAL, injected once at the next session
+    start in the same directory (not the writer's own, not stale)
+"""
+
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo
+
+
+def _tool_use(tool_id: str, name: str, **tool_input) -> dict:
+    return {"type": "assistant", "message": {"content": [
+        {"type": "tool_use", "id": tool_id, "name": name, "input": tool_input},
+    ]}}
+
+
+def _tool_result(tool_id: str, text: str = "ok", is_error: bool = False) -> dict:
+    block = {"type": "tool_result", "tool_use_id": tool_id, "content": text}
+    if is_error:
+        block["is_error"] = True
+    return {"type": "user", "message": {"content": [block]}}
+
+
+class HandoffTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.project = self.tmp / "proj"
+        self.project.mkdir()
+        self.transcript = self.tmp / "t.jsonl"
+
+    def _append(self, *entries):
+        with open(self.transcript, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+    def _session(self, entries_for_edits: int = 3):
+        src = str(self.project / "src" / "app.py")
+        entries = []
+        for i in range(entries_for_edits):
+            entries += [_tool_use(f"e{i}", "Edit", file_path=src), _tool_result(f"e{i}")]
+        entries += [
+            _tool_use("r1", "Read", file_path=str(self.project / "standards.md")), _tool_result("r1"),
+            _tool_use("b1", "Bash", command="npm test"),
+            _tool_result("b1", "\nFAIL src/app.test.js\n  expected 2", is_error=True),
+        ]
+        self._append(*entries)
+
+
+class TestScan(HandoffTestBase):
+
+    def test_counts_and_open_errors(self):
+        self._session()
+        acc = wo.scan_handoff(str(self.transcript))
+        self.assertEqual(acc["edited"], {str(self.project / "src" / "app.py"): 3})
+        self.assertEqual(acc["read"], {str(self.project / "standards.md"): 1})
+        self.assertEqual(acc["errors"], {"Bash npm test": "FAIL src/app.test.js"})
+
+        # Incremental: only new lines are read; a later success closes the error.
+        self._append(_tool_use("b2", "Bash", command="npm test"), _tool_result("b2"))
+        with mock.patch.object(wo.json, "loads", wraps=wo.json.loads) as loads:
+            acc = wo.scan_handoff(str(self.transcript), acc)
+        self.assertEqual(acc["errors"], {})
+        self.assertLessEqual(loads.call_count, 3)  # acc copy + two new lines
+
+    def test_failed_edit_not_counted_and_partial_line_deferred(self):
+        self._append(_tool_use("e1", "Edit", file_path="x.py"), _tool_result("e1", "no match", is_error=True))
+        with open(self.transcript, "a") as f:
+            f.write('{"type": "assist')
+        acc = wo.scan_handoff(str(self.transcript))
+        self.assertEqual(acc["edited"], {})
+        self.assertLess(acc["offset"], os.path.getsize(self.transcript))
+
+    def test_rewritten_transcript_restarts(self):
+        self._session()
+        acc = wo.scan_handoff(str(self.transcript))
+        self.transcript.write_text("")
+        self.assertEqual(wo.scan_handoff(str(self.transcript), acc)["edited"], {})
+
+
+class TestRender(HandoffTestBase):
+
+    def test_deterministic_and_relative(self):
+        self._session()
+        acc = wo.scan_handoff(str(self.transcript))
+        kwargs = dict(wip="#42 login form", tokens=150_000, peak=170_000, window=200_000, tool_calls=40, ended=0)
+        digest = wo.render_handoff(acc, str(self.project), **kwargs)
+        self.assertEqual(digest, wo.render_handoff(acc, str(self.project), **kwargs))
+        self.assertIn("WIP: #42 login form", digest)
+        self.assertIn(f"Edited: {os.path.join('src', 'app.py')} ×3", digest)
+        self.assertIn("- Bash npm test: FAIL src/app.test.js", digest)
+        self.assertIn("peak 170,000 of 200,000, 40 tool calls", digest)
+
+    def test_size_cap(self):
+        acc = {"edited": {f"/p/{'x' * 60}{i}.py": i for i in range(50)}, "read": {}, "errors": {
+            f"Bash cmd{i}": "e" * 160 for i in range(12)}}
+        digest = wo.render_handoff(acc, "/p", wip="w" * 900, window=1)
+        self.assertLessEqual(len(digest), wo.HANDOFF_MAX_CHARS)
+
+
+class TestLifecycle(HandoffTestBase):
+
+    def _orch(self, session_id: str):
+        return self._make_orch(transcript_path=str(self.transcript), cwd=str(self.project),
+                               session_id=session_id)
+
+    def test_stop_writes_and_next_session_injects(self):
+        self._session()
+        (self.project / "workflow.json").write_text(json.dumps({"github": {"owner": "o", "repo": "r"}}))
+        self.assertEqual(self._orch("s1").handle_stop(), 0)
+
+        # The writer itself never gets its own digest back.
+        self.assertEqual(self._orch("s1")._handoff_block(), "")
+        out = self._orch("s2").handle_first_run()
+        ctx = out["hookSpecificOutput"]["additionalContext"]
+        self.assertIn("HANDOFF from the previous session", ctx)
+        self.assertIn("app.py ×3", ctx)
+
+    def test_stale_or_other_directory_ignored(self):
+        self._session()
+        self._orch("s1").write_handoff()
+        path = wo._handoff_path(str(self.project))
+        data = json.loads(path.read_text())
+        data["created"] = time.time() - wo.HANDOFF_MAX_AGE_S - 1
+        path.write_text(json.dumps(data))
+        self.assertEqual(self._orch("s2")._handoff_block(), "")
+
+    def test_written_at_critical(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        self._session()
+        self._append(_usage_entry(input_tokens=185_000))
+        orch = self._orch("s1")
+        orch.state["warning_shown"] = True
+        self.assertIn("CRITICAL", orch.handle_context_check()["systemMessage"])
+        digest = json.loads(wo._handoff_path(str(self.project)).read_text())["digest"]
+        self.assertIn("Tokens: 185,000 at end", digest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+"""Tests for the Prometheus textfile exporter.
+
+Covers:
+  - Opt-in via WF_METRICS_TEXTFILE (no state writes otherwise)
+  - Hook latency histogram and scan-outcome counters in session state
+  - Rendering: per-session gauges, per-project counts, cumulative buckets
+  - Per-subagent occupancy, fullest agents first
+  - Label cardinality caps and stale-session expiry
+  - Throttled, atomic rewrites of the `.prom` file
+"""
+
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo, wr
+
+
+class MetricsTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        os.environ.pop("WF_METRICS_TEXTFILE", None)
+        self.addCleanup(os.environ.pop, "WF_METRICS_TEXTFILE", None)
+        wo._SCAN_STATS.clear()
+        self.prom = self.tmp / "wf.prom"
+
+    def _write_state(self, sid: str, **state):
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        path = wo.STATE_DIR / f"{sid}.json"
+        path.write_text(json.dumps(state))
+        return path
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe_and_merge(self):
+        hist = wo._new_histogram()
+        wo._observe(hist, 0.003)
+        wo._observe(hist, 0.2)
+        wo._observe(hist, 60.0)
+        self.assertEqual(hist["buckets"][0], 1)
+        self.assertEqual(hist["buckets"][wo.HOOK_LATENCY_BUCKETS.index(0.25)], 1)
+        self.assertEqual(hist["buckets"][-1], 1)
+        self.assertEqual(hist["count"], 3)
+
+        total = wo._new_histogram()
+        wr._merge_histogram(total, hist)
+        wr._merge_histogram(total, hist)
+        self.assertEqual(total["count"], 6)
+        wr._merge_histogram(total, {"buckets": [1, 2], "sum": 1, "count": 3})
+        self.assertEqual(total["count"], 6)
+
+
+class TestRecordHookMetrics(MetricsTestBase):
+
+    def test_disabled_by_default(self):
+        orch = self._make_orch()
+        orch.record_hook_metrics("post_tool_use", 0.01)
+        self.assertNotIn("metrics", orch.state)
+        self.assertFalse((wo.STATE_DIR / "test-session.json").exists())
+
+    def test_records_latency_and_scan_outcomes(self):
+        os.environ["WF_METRICS_TEXTFILE"] = str(self.prom)
+        path = self._write_transcript([_usage_entry(input_tokens=10_000)])
+        orch = self._make_orch(transcript_path=path)
+        orch._get_context_usage()   # full
+        orch._get_context_usage()   # noop
+        orch.record_hook_metrics("post_tool_use", 0.02)
+        metrics = orch.state["metrics"]
+        self.assertEqual(metrics["hook_latency"]["post_tool_use"]["count"], 1)
+        self.assertEqual(metrics["scans"], {"full": 1, "noop": 1})
+        self.assertEqual(len(wo._SCAN_STATS), 0)
+        self.assertTrue(self.prom.exists())
+
+    def test_export_throttled(self):
+        os.environ["WF_METRICS_TEXTFILE"] = str(self.prom)
+        orch = self._make_orch()
+        orch.record_hook_metrics("post_tool_use", 0.01)
+        with mock.patch.object(wr, "export_metrics") as export:
+            orch.record_hook_metrics("post_tool_use", 0.01)
+        export.assert_not_called()
+
+        past = time.time() - wo.METRICS_INTERVAL_S - 1
+        os.utime(self.prom, (past, past))
+        with mock.patch.object(wr, "export_metrics") as export:
+            orch.record_hook_metrics("post_tool_use", 0.01)
+        export.assert_called_once()
+
+
+class TestRender(MetricsTestBase):
+
+    def test_session_and_project_series(self):
+        cursor = wo._new_cursor("")
+        cursor.update(latest=150_000, observed_max=150_000)
+        hist = wo._new_histogram()
+        wo._observe(hist, 0.004)
+        wo._observe(hist, 0.3)
+        self._write_state(
+            "s1", project="alpha", transcript_cursor=cursor, context_window=200_000,
+            warning_count=2, critical_count=1,
+            metrics={"hook_latency": {"post_tool_use": hist},
+                     "scans": {"noop": 3, "full": 1}},
+        )
+        text = wr.render_metrics(wo.STATE_DIR)
+        self.assertIn('wf_context_tokens{session="s1",project="alpha"} 150000', text)
+        self.assertIn('wf_context_pct{session="s1",project="alpha"} 75.00', text)
+        self.assertIn('wf_context_window_tokens{session="s1",project="alpha"} 200000', text)
+        self.assertIn('wf_context_warnings{project="alpha"} 2', text)
+        self.assertIn('wf_context_criticals{project="alpha"} 1', text)
+        self.assertIn('wf_hook_latency_seconds_bucket{mode="post_tool_use",le="0.005"} 1', text)
+        self.assertIn('wf_hook_latency_seconds_bucket{mode="post_tool_use",le="0.5"} 2', text)
+        self.assertIn('wf_hook_latency_seconds_bucket{mode="post_tool_use",le="+Inf"} 2', text)
+        self.assertIn("wf_transcript_cache_hit_ratio 0.7500", text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_subagent_series(self):
+        agents = {f"a{i}": {"pct": float(i), "window": 200_000} for i in range(wr.METRICS_MAX_SUBAGENTS + 2)}
+        self._write_state("s1", project="alpha", subagents=agents)
+        text = wr.render_metrics(wo.STATE_DIR)
+        self.assertIn("# TYPE wf_subagent_context_pct gauge", text)
+        top = wr.METRICS_MAX_SUBAGENTS + 1
+        self.assertIn(f'wf_subagent_context_pct{{session="s1",agent="a{top}"}} {top}.00', text)
+        self.assertNotIn('agent="a0"', text)
+        self.assertEqual(text.count("wf_subagent_context_pct{"), wr.METRICS_MAX_SUBAGENTS)
+
+    def test_label_values_escaped(self):
+        self._write_state("s1", project='we"ird\\name')
+        text = wr.render_metrics(wo.STATE_DIR)
+        self.assertIn('project="we\\"ird\\\\name"', text)
+
+    def test_stale_sessions_expire(self):
+        path = self._write_state("old", project="alpha")
+        past = time.time() - wr.METRICS_STALE_S - 60
+        os.utime(path, (past, past))
+        self._write_state("new", project="beta")
+        text = wr.render_metrics(wo.STATE_DIR)
+        self.assertNotIn('session="old"', text)
+        self.assertNotIn('project="alpha"', text)
+        self.assertIn('wf_active_sessions{project="beta"} 1', text)
+
+    def test_cardinality_caps(self):
+        with mock.patch.object(wr, "METRICS_MAX_SESSIONS", 2), \
+                mock.patch.object(wr, "METRICS_MAX_PROJECTS", 1):
+            for i, project in enumerate(["a", "a", "b", "c"]):
+                self._write_state(f"s{i}", project=project)
+            text = wr.render_metrics(wo.STATE_DIR)
+        self.assertEqual(text.count("wf_context_tokens{"), 2)
+        self.assertIn('wf_active_sessions{project="a"} 2', text)
+        self.assertIn('wf_active_sessions{project="other"} 2', text)
+
+    def test_export_is_atomic_replace(self):
+        self._write_state("s1", project="alpha")
+        wr.export_metrics(self.prom, wo.STATE_DIR)
+        self.assertIn("wf_active_sessions", self.prom.read_text())
+        self.assertEqual([p.name for p in self.tmp.iterdir() if p.name.endswith(".tmp")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""Tests for the `--mode=pre-tool-use` context guard.
+
+Covers:
+  - Cost estimates: Read via `os.stat` (+ `limit`), `cat` arguments,
+    known-verbose vs bounded Bash commands
+  - Uses cached session usage only — never scans the transcript
+  - advise / block / off modes and the shared opt-outs
+  - Notices spend the injected-context budget; a block always keeps its reason
+  - Latency stays in single-digit milliseconds
+"""
+
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, wo
+
+
+class GuardTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.big = self.tmp / "big.log"
+        self.big.write_bytes(b"x" * 80_000)          # ~20K tokens
+        self.small = self.tmp / "small.py"
+        self.small.write_bytes(b"y" * 400)
+
+    def _orch(self, tool_name: str, tool_input: dict, *, latest: int = 170_000,
+              window: int = 200_000, guard: str = None):
+        if guard:
+            (self.tmp / "workflow.json").write_text(json.dumps({"contextMonitor": {"preToolGuard": guard}}))
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        cursor = wo._new_cursor("")
+        cursor.update(latest=latest, observed_max=latest)
+        (wo.STATE_DIR / "test-session.json").write_text(json.dumps({
+            "first_run_handled": True, "warning_shown": True, "pre_compact_ran": False,
+            "transcript_cursor": cursor, "context_window": window,
+        }))
+        return wo.WFOrchestrator({
+            "session_id": "test-session",
+            "transcript_path": str(self.tmp / "missing.jsonl"),
+            "cwd": str(self.tmp),
+            "hook_event_name": "PreToolUse",
+            "tool_name": tool_name,
+            "tool_input": tool_input,
+        }, cleanup=False)
+
+
+class TestCostEstimates(GuardTestBase):
+
+    def test_read(self):
+        orch = self._orch("Read", {})
+        self.assertEqual(orch._estimate_tool_cost("Read", {"file_path": str(self.big)})[0], 20_000)
+        self.assertEqual(orch._estimate_tool_cost("Read", {"file_path": str(self.big), "limit": 100})[0],
+                         100 * wo.READ_BYTES_PER_LINE // wo.CHARS_PER_TOKEN)
+        self.assertEqual(orch._estimate_tool_cost("Read", {"file_path": "nope"})[0], 0)
+
+    def test_read_capped(self):
+        huge = self.tmp / "huge.bin"
+        with open(huge, "wb") as f:
+            f.truncate(10_000_000)
+        orch = self._orch("Read", {})
+        self.assertEqual(orch._estimate_tool_cost("Read", {"file_path": "huge.bin"})[0], wo.READ_MAX_TOKENS)
+
+    def test_bash(self):
+        orch = self._orch("Bash", {})
+        cost = lambda cmd: orch._estimate_tool_cost("Bash", {"command": cmd})[0]
+        self.assertEqual(cost("cat big.log"), 20_000 if 20_000 < wo.BASH_MAX_TOKENS else wo.BASH_MAX_TOKENS)
+        self.assertEqual(cost("cat small.py"), 100)
+        self.assertEqual(cost("git log"), wo.BASH_MAX_TOKENS)
+        self.assertEqual(cost("pytest -q"), wo.BASH_MAX_TOKENS)
+        for bounded in ("git log | head -20", "git log -n 5", "pytest > out.txt", "grep -rl foo ."):
+            with self.subTest(cmd=bounded):
+                self.assertEqual(cost(bounded), 0)
+        self.assertEqual(cost("echo hi"), 0)
+
+
+class TestGuard(GuardTestBase):
+
+    def test_advises_near_critical(self):
+        out = self._orch("Read", {"file_path": str(self.big)}).handle_pre_tool_use()
+        spec = out["hookSpecificOutput"]
+        self.assertEqual(spec["hookEventName"], "PreToolUse")
+        self.assertNotIn("permissionDecision", spec)
+        self.assertIn("offset/limit", spec["additionalContext"])
+        self.assertIn("85% → ~95%", spec["additionalContext"])
+
+    def test_block_mode_denies(self):
+        out = self._orch("Bash", {"command": "git log"}, latest=175_000, guard="block").handle_pre_tool_use()
+        spec = out["hookSpecificOutput"]
+        self.assertEqual(spec["permissionDecision"], "deny")
+        self.assertIn("head -n 100", spec["permissionDecisionReason"])
+
+    def test_notices_use_context_budget(self):
+        self._orch("Read", {"file_path": str(self.big)}).handle_pre_tool_use()
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(saved["injected"]["by_kind"]["pre_tool_guard"]["count"], 1)
+
+        (self.tmp / "workflow.json").write_text(json.dumps({
+            "contextMonitor": {"preToolGuard": "advise"}, "contextBudget": {"maxTokens": 1},
+        }))
+        out = self._orch("Read", {"file_path": str(self.big)}, latest=175_000).handle_pre_tool_use()
+        self.assertNotIn("hookSpecificOutput", out)
+        self.assertIn("consider a smaller read", out["systemMessage"])
+
+    def test_block_reason_survives_exhausted_budget(self):
+        (self.tmp / "workflow.json").write_text(json.dumps({
+            "contextMonitor": {"preToolGuard": "block"}, "contextBudget": {"maxTokens": 1},
+        }))
+        orch = self._orch("Bash", {"command": "git log"}, latest=175_000)
+        for _ in range(2):
+            spec = orch.handle_pre_tool_use()["hookSpecificOutput"]
+            self.assertEqual(spec["permissionDecision"], "deny")
+            self.assertIn("head -n 100", spec["permissionDecisionReason"])
+
+    def test_quiet_with_headroom_or_small_calls(self):
+        self.assertIsNone(self._orch("Read", {"file_path": str(self.big)}, latest=50_000).handle_pre_tool_use())
+        self.assertIsNone(self._orch("Read", {"file_path": str(self.small)}).handle_pre_tool_use())
+        self.assertIsNone(self._orch("Edit", {"file_path": str(self.big)}).handle_pre_tool_use())
+
+    def test_off_and_opt_outs(self):
+        self.assertIsNone(self._orch("Read", {"file_path": str(self.big)}, guard="off").handle_pre_tool_use())
+        os.environ["WF_DISABLE_CONTEXT_CHECK"] = "true"
+        self.assertIsNone(self._orch("Read", {"file_path": str(self.big)}).handle_pre_tool_use())
+
+    def test_no_transcript_scan_and_fast(self):
+        orch = self._orch("Read", {"file_path": str(self.big)})
+        with mock.patch.object(wo, "_scan_transcript_chain", side_effect=AssertionError("scanned")), \
+                mock.patch.object(wo, "_scan_transcript", side_effect=AssertionError("scanned")):
+            started = time.perf_counter()
+            for _ in range(20):
+                orch.handle_pre_tool_use()
+            per_call = (time.perf_counter() - started) / 20
+        self.assertLess(per_call, 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
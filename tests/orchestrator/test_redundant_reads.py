@@ -0,0 +1,205 @@
+"""Tests for redundant Read/Grep detection.
+
+Covers:
+  - Unchanged re-reads flagged at PreToolUse with the earlier tool call
+  - Reads stamped with current usage, even before the first reading
+  - Edits (size/mtime), touched-but-identical files (content hash)
+  - Line-range spans (default Read limit, returned range, EOF), subagent
+    scoping, compaction; failed calls not indexed
+  - Grep repeats invalidated by edits
+  - Bounded index and the `redundantReads` opt-out
+"""
+
+import contextlib
+import io
+import json
+import os
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo
+
+
+class ReadTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.file = self.tmp / "standards.md"
+        self.file.write_text("rule one\n" * 500)
+        self.latest = 50_000
+
+    def _hook(self, tool_name: str, **tool_input):
+        hook = {
+            "session_id": "test-session",
+            "transcript_path": str(self.tmp / "missing.jsonl"),
+            "cwd": str(self.tmp),
+            "tool_name": tool_name,
+            "tool_input": tool_input,
+        }
+        agent = tool_input.pop("agent_id", None)
+        if agent:
+            hook["agent_id"] = agent
+        response = tool_input.pop("tool_response", None)
+        if response is not None:
+            hook["tool_response"] = response
+        return hook
+
+    def _orch(self, tool_name: str, **tool_input):
+        orch = wo.WFOrchestrator(self._hook(tool_name, **tool_input), cleanup=False)
+        orch.state["transcript_cursor"] = dict(wo._new_cursor(""), latest=self.latest)
+        return orch
+
+    def _read(self, tool_name: str = "Read", **tool_input):
+        """Run the PreToolUse check then record the PostToolUse; returns the notice."""
+        response = tool_input.pop("tool_response", None)
+        notice = self._orch(tool_name, **tool_input)._redundant_read_notice()
+        self._orch(tool_name, tool_response=response, **tool_input).record_read()
+        return notice
+
+
+class TestReads(ReadTestBase):
+
+    def test_unchanged_reread_flagged(self):
+        self.assertIsNone(self._read(file_path="standards.md"))
+        notice = self._read(file_path=str(self.file))
+        self.assertIn("standards.md is already in context", notice["systemMessage"])
+        self.assertEqual(notice["hookSpecificOutput"]["hookEventName"], "PreToolUse")
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(saved["read_index"]["redundant"], 1)
+
+    def test_names_call_of_first_read(self):
+        for _ in range(3):
+            self._orch("Edit", file_path="x").count_tool_call()
+        self._read(file_path="standards.md")
+        self._orch("Bash", command="ls").count_tool_call()
+        self._read(file_path="standards.md")
+        notice = self._read(file_path="standards.md")
+        self.assertIn("(read at tool call 3, unchanged)", notice["systemMessage"])
+
+    def test_without_call_number(self):
+        self._read(file_path="standards.md")
+        notice = self._read(file_path="standards.md")
+        self.assertIn("(read earlier this session, unchanged)", notice["systemMessage"])
+        self.assertIn("since you read it earlier this session,",
+                      notice["hookSpecificOutput"]["additionalContext"])
+
+    def test_first_read_takes_a_usage_reading(self):
+        transcript = self._write_transcript([_usage_entry(input_tokens=150_000)])
+        hook = dict(self._hook("Read", file_path="standards.md"), transcript_path=transcript)
+        wo.WFOrchestrator(hook, cleanup=False).record_read()
+        entry = next(iter(json.loads((wo.STATE_DIR / "test-session.json").read_text())
+                          ["read_index"]["entries"].values()))
+        self.assertEqual(entry["ctx"], 150_000)
+        self.latest = 40_000   # compacted since
+        self.assertIsNone(self._read(file_path="standards.md"))
+
+    def test_post_tool_use_counts_calls_and_stamps_usage(self):
+        transcript = self._write_transcript([_usage_entry(input_tokens=150_000)])
+        hook = dict(self._hook("Read", file_path="standards.md"), transcript_path=transcript)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(2):
+                self.assertEqual(wo.run_hook("post_tool_use", hook, 0.0), 0)
+        state = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(state["tool_calls"], 2)
+        (entry,) = state["read_index"]["entries"].values()
+        self.assertEqual((entry["call"], entry["ctx"]), (1, 150_000))
+
+    def test_edited_file_not_flagged(self):
+        self._read(file_path="standards.md")
+        self.file.write_text("rule two\n" * 600)
+        self.assertIsNone(self._read(file_path="standards.md"))
+        self.assertIsNotNone(self._read(file_path="standards.md"))
+
+    def test_touched_but_identical_uses_hash(self):
+        self._read(file_path="standards.md")
+        os.utime(self.file, (2_000_000, 2_000_000))
+        self.assertIsNotNone(self._read(file_path="standards.md"))
+        self.file.write_text("rule ONE\n" * 500)  # same size, new content
+        os.utime(self.file, (3_000_000, 3_000_000))
+        self.assertIsNone(self._read(file_path="standards.md"))
+
+    def test_spans(self):
+        self._read(file_path="standards.md", offset=100, limit=50)
+        self.assertIsNone(self._read(file_path="standards.md"))
+        self.assertIsNotNone(self._read(file_path="standards.md", offset=300, limit=20))
+
+    def test_default_read_covers_first_2000_lines_only(self):
+        self.file.write_text("line\n" * 10_000)
+        self._read(file_path="standards.md")
+        self.assertIsNone(self._read(file_path="standards.md", offset=5000, limit=200))
+        self.assertIsNotNone(self._read(file_path="standards.md", offset=100, limit=50))
+        self.assertIsNotNone(self._read(file_path="standards.md", offset=5100, limit=100))
+        self.assertIsNone(self._read(file_path="standards.md", offset=1900, limit=200))
+
+    def test_returned_range_to_end_of_file(self):
+        returned = {"type": "text", "file": {"startLine": 1, "numLines": 500, "totalLines": 500}}
+        self._read(file_path="standards.md", tool_response=returned)
+        self.assertIsNotNone(self._read(file_path="standards.md", offset=400, limit=3000))
+        (entry,) = json.loads((wo.STATE_DIR / "test-session.json").read_text())["read_index"]["entries"].values()
+        self.assertEqual(entry["spans"], [[1, None]])
+
+    def test_returned_range_short_of_requested(self):
+        returned = {"type": "text", "file": {"startLine": 1, "numLines": 100, "totalLines": 500}}
+        self._read(file_path="standards.md", tool_response=returned)
+        self.assertIsNone(self._read(file_path="standards.md", offset=50, limit=100))
+
+    def test_failed_read_not_indexed(self):
+        self._read(file_path="standards.md", tool_response="<tool_use_error>File is too large</tool_use_error>")
+        self._read(file_path="standards.md", tool_response={"is_error": True})
+        self.assertIsNone(self._read(file_path="standards.md"))
+
+    def test_subagents_scoped_separately(self):
+        self._read(file_path="standards.md")
+        self.assertIsNone(self._read(file_path="standards.md", agent_id="agent-1"))
+        self.assertIsNotNone(self._read(file_path="standards.md", agent_id="agent-1"))
+
+    def test_compaction_forgets_reads(self):
+        self.latest = 150_000
+        self._read(file_path="standards.md")
+        self.latest = 40_000
+        self.assertIsNone(self._read(file_path="standards.md"))
+
+
+class TestGrep(ReadTestBase):
+
+    def test_repeat_until_edit(self):
+        self._read("Grep", pattern="TODO", path="src")
+        self.assertIsNotNone(self._read("Grep", pattern="TODO", path="src"))
+        self.assertIsNone(self._read("Grep", pattern="FIXME", path="src"))
+        self._orch("Edit", file_path="x").record_read()
+        self.assertIsNone(self._read("Grep", pattern="TODO", path="src"))
+
+
+class TestBoundsAndOptOut(ReadTestBase):
+
+    def test_index_bounded(self):
+        with mock.patch.object(wo, "READ_INDEX_MAX", 4):
+            for i in range(6):
+                (self.tmp / f"f{i}.py").write_text("x")
+                self._read(file_path=f"f{i}.py")
+        entries = json.loads((wo.STATE_DIR / "test-session.json").read_text())["read_index"]["entries"]
+        self.assertEqual([k.rsplit("/", 1)[1] for k in entries], ["f2.py", "f3.py", "f4.py", "f5.py"])
+
+    def test_opt_out(self):
+        (self.tmp / "workflow.json").write_text(json.dumps({"contextMonitor": {"redundantReads": False}}))
+        self._read(file_path="standards.md")
+        self.assertIsNone(self._read(file_path="standards.md"))
+
+    def test_pre_tool_use_routes_notice(self):
+        self._read(file_path="standards.md")
+        out = self._orch("Read", file_path="standards.md").handle_pre_tool_use()
+        self.assertIn("Redundant read", out["hookSpecificOutput"]["additionalContext"])
+
+    def test_notice_accounted_and_deduped(self):
+        self._read(file_path="standards.md")
+        first = self._read(file_path="standards.md")
+        self.assertIn("additionalContext", first["hookSpecificOutput"])
+        second = self._read(file_path="standards.md")
+        self.assertEqual(second, {"systemMessage": first["systemMessage"]})
+        injected = json.loads((wo.STATE_DIR / "test-session.json").read_text())["injected"]
+        self.assertEqual(injected["by_kind"]["redundant_read"]["count"], 1)
+        self.assertEqual(injected["deduped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests for host-wide transcript-scan admission control.
+
+Covers:
+  - flock'd slot files bound concurrent scans (`WF_MAX_CONCURRENT_SCANS`)
+  - A process without a slot answers from the cached reading
+  - Subagent scans and the handoff refresh defer when the host is busy
+  - Admission counts / waits in state, `--mode=stats` and the textfile
+"""
+
+import json
+import os
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo, wr
+
+
+class AdmissionTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self._saved_slots = os.environ.pop("WF_MAX_CONCURRENT_SCANS", None)
+        os.environ["WF_MAX_CONCURRENT_SCANS"] = "2"
+
+    def tearDown(self):
+        os.environ.pop("WF_MAX_CONCURRENT_SCANS", None)
+        if self._saved_slots is not None:
+            os.environ["WF_MAX_CONCURRENT_SCANS"] = self._saved_slots
+        super().tearDown()
+
+
+class TestScanSlot(AdmissionTestBase):
+
+    def test_bounded_by_slot_count(self):
+        with wo.scan_slot() as a, wo.scan_slot() as b:
+            self.assertTrue(a and b)
+            with wo.scan_slot(wait=0.02) as c:
+                self.assertFalse(c)
+        with wo.scan_slot(wait=0) as again:
+            self.assertTrue(again)  # released on exit
+
+    def test_zero_means_unlimited(self):
+        os.environ["WF_MAX_CONCURRENT_SCANS"] = "0"
+        with mock.patch.object(wo, "_acquire_scan_slot") as acquire:
+            with wo.scan_slot() as admitted:
+                self.assertTrue(admitted)
+        acquire.assert_not_called()
+
+    def test_default_tracks_cpu_count(self):
+        os.environ.pop("WF_MAX_CONCURRENT_SCANS")
+        with mock.patch.object(wo.os, "cpu_count", return_value=12):
+            self.assertEqual(wo._max_concurrent_scans(), 12)
+        with mock.patch.object(wo.os, "cpu_count", return_value=None):
+            self.assertEqual(wo._max_concurrent_scans(), 2)
+
+
+class TestCachedFallback(AdmissionTestBase):
+
+    def test_rejected_scan_returns_cached_reading(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        path = self._write_transcript([_usage_entry(input_tokens=100_000)])
+        orch = self._make_orch(transcript_path=path)
+        self.assertEqual(orch._get_context_usage()[0], 100_000)
+        with open(path, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=150_000)) + "\n")
+
+        with wo.scan_slot(), wo.scan_slot(), \
+                mock.patch.object(wo, "SCAN_ADMIT_WAIT_S", 0.0), \
+                mock.patch.object(wo, "_scan_transcript_chain", side_effect=AssertionError("scanned")):
+            tokens, pct, window = self._make_orch(transcript_path=path)._get_context_usage()
+        self.assertEqual((tokens, pct, window), (100_000, 50.0, 200_000))
+
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertEqual(saved["admission"]["rejected"], 1)
+        self.assertEqual(self._make_orch(transcript_path=path)._get_context_usage()[0], 150_000)
+
+    def test_cold_session_without_slot_reads_zero(self):
+        path = self._write_transcript([_usage_entry(input_tokens=100_000)])
+        with wo.scan_slot(), wo.scan_slot(), mock.patch.object(wo, "SCAN_ADMIT_WAIT_S", 0.0):
+            self.assertEqual(self._make_orch(transcript_path=path)._get_context_usage()[0], 0)
+
+    def test_handoff_refresh_deferred(self):
+        path = self._write_transcript([_usage_entry(input_tokens=1)])
+        with wo.scan_slot(), wo.scan_slot(), mock.patch.object(wo, "SCAN_ADMIT_WAIT_S", 0.0):
+            self._make_orch(transcript_path=path, cwd=str(self.tmp)).write_handoff()
+        self.assertFalse(wo._handoff_path(str(self.tmp)).exists())
+
+
+class TestRecording(AdmissionTestBase):
+
+    def test_counts_in_state_stats_and_textfile(self):
+        path = self._write_transcript([_usage_entry(input_tokens=1_000)])
+        orch = self._make_orch(transcript_path=path)
+        orch._get_context_usage()
+        with wo.scan_slot(), wo.scan_slot(), mock.patch.object(wo, "SCAN_ADMIT_WAIT_S", 0.0):
+            self._make_orch(transcript_path=path)._get_context_usage()
+        admission = json.loads((wo.STATE_DIR / "test-session.json").read_text())["admission"]
+        self.assertEqual((admission["admitted"], admission["rejected"]), (1, 1))
+        self.assertEqual(admission["wait"]["count"], 2)
+
+        (group,) = wr.collect_stats(wo.STATE_DIR, workers=1)
+        self.assertEqual((group["scans_admitted"], group["scans_rejected"]), (1, 1))
+        self.assertIsNotNone(group["scan_wait_mean_ms"])
+
+        text = wr.render_metrics(wo.STATE_DIR)
+        self.assertIn('wf_scan_admissions{outcome="rejected"} 1', text)
+        self.assertIn("wf_scan_admission_wait_seconds_count 2", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Tests for the per-session state lock.
+
+Covers:
+  - Updates skipped while another hook holds the lock; other sessions
+    unaffected
+  - Each update applies to the state peers saved; the lock is held only
+    for the update (nested updates share it)
+  - PreToolUse answers without waiting for a held lock
+  - Parallel PostToolUse hook processes don't lose each other's updates
+"""
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from test_context_monitor import ContextMonitorTestBase, _SCRIPT_PATH, wo
+
+
+class TestSessionLock(ContextMonitorTestBase):
+
+    def _hold(self, session_id: str) -> int:
+        acquired, fd = wo._acquire_session_lock(session_id, 0)
+        self.assertTrue(acquired)
+        self.addCleanup(os.close, fd)
+        return fd
+
+    def _saved(self, session_id: str) -> dict:
+        return json.loads((wo.STATE_DIR / f"{session_id}.json").read_text())
+
+    def test_update_skipped_while_held(self):
+        self._hold("s1")
+        blocked = wo.WFOrchestrator({"session_id": "s1", "cwd": str(self.tmp)}, cleanup=False, lock_wait=0.05)
+        with blocked._state_update() as locked:
+            blocked.state["tool_calls"] = 1
+        self.assertFalse(locked)
+        self.assertFalse((wo.STATE_DIR / "s1.json").exists())
+        other = wo.WFOrchestrator({"session_id": "s2", "cwd": str(self.tmp)}, cleanup=False, lock_wait=0)
+        with other._state_update() as locked:
+            other.state["tool_calls"] = 1
+        self.assertTrue(locked)
+        self.assertEqual(self._saved("s2")["tool_calls"], 1)
+
+    def test_update_applies_to_peers_changes(self):
+        orch = wo.WFOrchestrator({"session_id": "s1", "cwd": str(self.tmp)}, cleanup=False)
+        peer = wo.WFOrchestrator({"session_id": "s1", "cwd": str(self.tmp)}, cleanup=False)
+        with peer._state_update():
+            peer.state["tool_calls"] = 5
+        with orch._state_update():
+            orch.state["tool_calls"] = orch.state.get("tool_calls", 0) + 1
+        self.assertEqual(self._saved("s1")["tool_calls"], 6)
+
+    def test_held_only_for_the_update(self):
+        orch = wo.WFOrchestrator({"session_id": "s1", "cwd": str(self.tmp)}, cleanup=False, lock_wait=0)
+        peer = wo.WFOrchestrator({"session_id": "s1", "cwd": str(self.tmp)}, cleanup=False, lock_wait=0)
+        with orch._state_update():
+            with orch._state_update() as nested:
+                self.assertTrue(nested)
+            with peer._state_update() as locked:
+                self.assertFalse(locked)
+        with peer._state_update() as locked:
+            self.assertTrue(locked)
+
+    def test_pre_tool_use_does_not_wait_for_lock(self):
+        (self.tmp / "a.md").write_text("text\n")
+        hook = {
+            "session_id": "s1", "cwd": str(self.tmp), "tool_name": "Read",
+            "tool_input": {"file_path": "a.md"}, "tool_use_id": "toolu_1",
+            "transcript_path": str(self.tmp / "missing.jsonl"),
+        }
+        orch = wo.WFOrchestrator(hook, cleanup=False)
+        with orch._state_update():
+            orch.state["transcript_cursor"] = dict(wo._new_cursor(""), latest=50_000)
+        wo.WFOrchestrator(hook, cleanup=False).record_read()
+
+        _, fd = wo._acquire_session_lock("s1", 0)
+        out = io.StringIO()
+        started = time.monotonic()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(wo.run_hook("pre-tool-use", hook, 0.0), 0)
+        self.assertLess(time.monotonic() - started, wo.SESSION_LOCK_WAIT_S / 3)
+        self.assertIn("a.md is already in context", out.getvalue())
+        self.assertNotIn("redundant", self._saved("s1")["read_index"])   # bump skipped
+
+        os.close(fd)
+        with contextlib.redirect_stdout(io.StringIO()):
+            wo.run_hook("pre-tool-use", hook, 0.0)
+        self.assertEqual(self._saved("s1")["read_index"]["redundant"], 1)
+
+
+class TestParallelHooks(ContextMonitorTestBase):
+
+    def test_parallel_post_tool_use_keeps_every_update(self):
+        home = self.tmp / "home"
+        start_dir = home / ".wf-state" / "tool_start"
+        start_dir.mkdir(parents=True)
+        env = dict(os.environ, HOME=str(home))
+        env.pop("CLAUDE_PLUGIN_ROOT", None)
+        env.pop("WF_METRICS_TEXTFILE", None)
+
+        n = 10
+        procs = []
+        for i in range(n):
+            target = self.tmp / f"f{i}.txt"
+            target.write_text("x" * 100)
+            (start_dir / f"par.toolu_{i}").write_text(f"{time.time() - 0.5:.3f}")
+            hook_input = json.dumps({
+                "session_id": "par",
+                "cwd": str(self.tmp),
+                "tool_name": "Read",
+                "tool_input": {"file_path": str(target)},
+                "tool_use_id": f"toolu_{i}",
+            })
+            proc = subprocess.Popen(
+                [sys.executable, str(_SCRIPT_PATH)], env=env, stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+            procs.append((proc, hook_input))
+        for proc, hook_input in procs:
+            proc.stdin.write(hook_input.encode())
+            proc.stdin.close()
+        for proc, _ in procs:
+            self.assertEqual(proc.wait(timeout=60), 0, proc.stderr.read())
+            proc.stderr.close()
+
+        state = json.loads((home / ".wf-state" / "par.json").read_text())
+        self.assertEqual(state["tool_latency"]["Read"]["count"], n)
+        self.assertEqual(len(state["read_index"]["entries"]), n)
+
+
+if __name__ == "__main__":
+    unittest.main()
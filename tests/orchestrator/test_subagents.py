@@ -0,0 +1,188 @@
+"""Tests for subagent (sidechain) transcript monitoring.
+
+Covers:
+  - Discovery in both layouts (`<session>/subagents/` and legacy
+    `agent-*.jsonl` tagged with the parent sessionId)
+  - Incremental per-agent cursors persisted in session state
+  - Per-call byte cap and a scan budget that bounds the hook process
+  - One warning per agent per crossing, re-armed after it drops
+  - Window pin resolved once per check, not once per agent
+  - Opt-outs shared with the main context monitor
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _SCRIPT_PATH, _usage_entry, wo
+
+
+class SubagentTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.project_dir = self.tmp / "projects" / "proj"
+        self.project_dir.mkdir(parents=True)
+        self.main = self.project_dir / "sess-1.jsonl"
+        self.main.write_text(json.dumps(_usage_entry(input_tokens=10_000)) + "\n")
+
+    def _agent(self, agent_id: str, *totals: int, legacy: bool = False, session="sess-1"):
+        if legacy:
+            path = self.project_dir / f"agent-{agent_id}.jsonl"
+        else:
+            folder = self.project_dir / session / "subagents"
+            folder.mkdir(parents=True, exist_ok=True)
+            path = folder / f"agent-{agent_id}.jsonl"
+        with open(path, "a") as f:
+            for t in totals:
+                entry = _usage_entry(input_tokens=t)
+                entry["sessionId"] = session
+                entry["isSidechain"] = True
+                f.write(json.dumps(entry) + "\n")
+        return path
+
+    def _orch(self):
+        return self._make_orch(transcript_path=str(self.main), session_id="sess-1")
+
+
+class TestDiscovery(SubagentTestBase):
+
+    def test_nested_and_legacy_layouts(self):
+        self._agent("aaa", 1_000)
+        self._agent("bbb", 1_000, legacy=True)
+        self._agent("ccc", 1_000, legacy=True, session="other-session")
+        probe = {}
+        found = wo._discover_subagent_transcripts(str(self.main), "sess-1", 0.0, probe)
+        self.assertEqual(set(found), {"aaa", "bbb"})
+        self.assertEqual(probe["names"], {"agent-bbb.jsonl": True, "agent-ccc.jsonl": False})
+
+    def test_legacy_files_probed_once(self):
+        self._agent("bbb", 1_000, legacy=True)
+        probe = {}
+        wo._discover_subagent_transcripts(str(self.main), "sess-1", 0.0, probe)
+        with mock.patch("builtins.open", side_effect=AssertionError("re-probed")):
+            found = wo._discover_subagent_transcripts(str(self.main), "sess-1", 0.0, probe)
+        self.assertEqual(set(found), {"bbb"})
+
+    def test_legacy_files_older_than_session_ignored(self):
+        path = self._agent("old", 1_000, legacy=True)
+        os.utime(path, (1_000, 1_000))
+        found = wo._discover_subagent_transcripts(str(self.main), "sess-1", 2_000.0, {})
+        self.assertEqual(found, {})
+
+
+class TestSubagentCheck(SubagentTestBase):
+
+    def test_reports_and_persists_per_agent_usage(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        self._agent("aaa", 50_000)
+        orch = self._orch()
+        self.assertIsNone(orch.handle_subagent_check())
+        saved = json.loads((wo.STATE_DIR / "sess-1.json").read_text())
+        self.assertEqual(saved["subagents"]["aaa"]["pct"], 25.0)
+        self.assertEqual(saved["subagents"]["aaa"]["cursor"]["latest"], 50_000)
+
+    def test_window_pin_resolved_once_per_check(self):
+        (self.tmp / "workflow.json").write_text(json.dumps({"contextLimit": 200_000}))
+        for agent_id in ("aaa", "bbb", "ccc"):
+            self._agent(agent_id, 50_000)
+        orch = self._orch()
+        orch.state["cwd"] = str(self.tmp)
+        with mock.patch.object(orch, "_pinned_context_window", wraps=orch._pinned_context_window) as pin:
+            orch.handle_subagent_check()
+        self.assertEqual(pin.call_count, 1)
+        self.assertEqual({rec["window"] for rec in orch.state["subagents"].values()}, {200_000})
+
+    def test_warns_once_for_agent_near_limit(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        self._agent("aaa", 50_000)
+        self._agent("bbb", 170_000)  # 85%
+        orch = self._orch()
+        out = orch.handle_subagent_check()
+        self.assertIsNotNone(out)
+        self.assertIn("agent-bbb", out["systemMessage"])
+        self.assertNotIn("agent-aaa", out["systemMessage"])
+        # Both agents listed in the detail, fullest first.
+        detail = out["hookSpecificOutput"]["additionalContext"]
+        self.assertLess(detail.index("agent-bbb"), detail.index("agent-aaa"))
+        self.assertIsNone(orch.handle_subagent_check())
+
+    def test_rearms_after_agent_drops(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        path = self._agent("bbb", 170_000)
+        orch = self._orch()
+        self.assertIsNotNone(orch.handle_subagent_check())
+        with open(path, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=20_000)) + "\n")
+        self.assertIsNone(orch.handle_subagent_check())
+        with open(path, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=180_000)) + "\n")
+        self.assertIsNotNone(orch.handle_subagent_check())
+
+    def test_unchanged_agents_not_rescanned(self):
+        self._agent("aaa", 50_000)
+        orch = self._orch()
+        orch.handle_subagent_check()
+        with mock.patch.object(wo, "_scan_transcript") as scan:
+            orch.handle_subagent_check()
+        scan.assert_not_called()
+
+    def test_external_loop_short_circuits(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        os.environ["WF_EXTERNAL_LOOP"] = "true"
+        self._agent("bbb", 190_000)
+        self.assertIsNone(self._orch().handle_subagent_check())
+
+    def test_run_post_tool_use_surfaces_subagent_warning(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        self._agent("bbb", 190_000)
+        orch = self._orch()
+        orch.state["first_run_handled"] = True
+        out = orch.run_post_tool_use()
+        self.assertIn("agent-bbb", out["systemMessage"])
+
+
+class TestScanBudget(SubagentTestBase):
+
+    def test_backlog_scanned_in_capped_steps(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        self._agent("aaa", *range(1_000, 41_000, 1_000))
+        orch = self._orch()
+        offsets = []
+        with mock.patch.object(wo, "SUBAGENT_SCAN_MAX_BYTES", 1_000):
+            for _ in range(20):
+                orch.handle_subagent_check()
+                record = orch.state["subagents"]["aaa"]
+                offsets.append(record["cursor"]["offset"])
+                if record["sig"]:
+                    break
+        self.assertGreater(len(offsets), 2)
+        self.assertEqual(offsets, sorted(set(offsets)))  # always moves forward
+        self.assertEqual(record["cursor"]["latest"], 40_000)
+
+    def test_budget_bounds_process_wall_time(self):
+        # Two scans that would take 3 s each, a 0.2 s budget: the process
+        # itself must exit promptly, not just the method.
+        script = textwrap.dedent(f"""
+            import importlib.util, sys, time
+            spec = importlib.util.spec_from_file_location("wf_orchestrator", {str(_SCRIPT_PATH)!r})
+            wo = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(wo)
+            wo.SUBAGENT_SCAN_BUDGET_S = 0.2
+            wo._scan_transcript = lambda *a, **k: time.sleep(3)
+            orch = wo.WFOrchestrator({{"session_id": "s", "cwd": {str(self.tmp)!r}}}, cleanup=False)
+            orch._scan_subagent_batch({{}}, [("a", "x", (1, 1)), ("b", "y", (1, 1))])
+        """)
+        env = dict(os.environ, HOME=str(self.tmp))
+        started = time.monotonic()
+        subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=30)
+        self.assertLess(time.monotonic() - started, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
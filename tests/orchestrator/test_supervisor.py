@@ -0,0 +1,175 @@
+"""Tests for `wf-supervisor.py` (parallel external-loop workers).
+
+Covers:
+  - fcntl-locked queue: comments / list markers, concurrent pops
+  - Worktree creation and reuse
+  - Session resume vs recycle driven by orchestrator session state
+  - Throughput stats and per-task result log, using a stand-in
+    `WF_CLAUDE_BIN` script instead of Claude Code
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import unittest
+from pathlib import Path
+
+from test_context_monitor import ContextMonitorTestBase, wo
+
+
+_SCRIPT_PATH = Path(wo.__file__).with_name("wf-supervisor.py")
+_spec = importlib.util.spec_from_file_location("wf_supervisor", _SCRIPT_PATH)
+sup = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(sup)
+
+# Stand-in for `claude --print --output-format json`: appends its argv to a
+# log, grows the session's context in orchestrator state, prints a result.
+_FAKE_CLAUDE = textwrap.dedent('''
+    import json, os, sys
+    args = sys.argv[1:]
+    flag = "--resume" if "--resume" in args else "--session-id"
+    sid = args[args.index(flag) + 1]
+    prompt = args[-1]
+    with open(os.environ["FAKE_LOG"], "a") as f:
+        f.write(json.dumps({"flag": flag, "sid": sid, "prompt": prompt,
+                            "cwd": os.getcwd(), "loop": os.environ.get("WF_EXTERNAL_LOOP")}) + "\\n")
+    path = os.path.join(os.environ["FAKE_STATE_DIR"], sid + ".json")
+    try:
+        state = json.load(open(path))
+    except OSError:
+        state = {"context_window": 200000, "transcript_cursor": {"latest": 0}}
+    state["transcript_cursor"]["latest"] += int(os.environ.get("FAKE_GROWTH", "50000"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    json.dump(state, open(path, "w"))
+    if "fail" in prompt:
+        print(json.dumps({"is_error": True, "usage": {}}))
+        sys.exit(1)
+    print(json.dumps({"is_error": False, "num_turns": 3, "session_id": sid,
+                      "usage": {"input_tokens": 100, "cache_read_input_tokens": 900, "output_tokens": 50}}))
+''')
+
+
+class SupervisorTestBase(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.repo = self.tmp / "repo"
+        self.repo.mkdir()
+        for cmd in (["init", "-q"], ["-c", "user.name=t", "-c", "user.email=t@t",
+                                     "commit", "-q", "--allow-empty", "-m", "init"]):
+            subprocess.run(["git", "-C", str(self.repo), *cmd], check=True)
+        fake = self.tmp / "fake-claude.py"
+        fake.write_text(_FAKE_CLAUDE)
+        self.log = self.tmp / "claude.log"
+        self._env = {
+            "WF_CLAUDE_BIN": f"{sys.executable} {fake}",
+            "FAKE_LOG": str(self.log),
+            "FAKE_STATE_DIR": str(wo.STATE_DIR),
+        }
+        for key, value in self._env.items():
+            os.environ[key] = value
+        self.queue = self.tmp / "tasks.md"
+
+    def tearDown(self):
+        for key in (*self._env, "FAKE_GROWTH"):
+            os.environ.pop(key, None)
+        super().tearDown()
+
+    def _calls(self):
+        return [json.loads(line) for line in self.log.read_text().splitlines()]
+
+    def _supervisor(self, workers: int = 1, **kwargs):
+        return sup.Supervisor(self.queue, self.repo, workers=workers,
+                              worktrees=self.tmp / "wt", **kwargs)
+
+
+class TestTaskQueue(SupervisorTestBase):
+
+    def test_pop_skips_comments_and_markers(self):
+        self.queue.write_text("# backlog\n\n- [ ] first\n- second\nthird\n")
+        q = sup.TaskQueue(self.queue)
+        self.assertEqual([q.pop(), q.pop(), q.pop(), q.pop()], ["first", "second", "third", None])
+        self.assertEqual(self.queue.read_text(), "# backlog\n\n")
+
+    def test_concurrent_pops_hand_out_each_task_once(self):
+        self.queue.write_text("".join(f"task {i}\n" for i in range(200)))
+        q = sup.TaskQueue(self.queue)
+        got, lock = [], threading.Lock()
+
+        def drain():
+            while True:
+                task = q.pop()
+                if task is None:
+                    return
+                with lock:
+                    got.append(task)
+
+        threads = [threading.Thread(target=drain) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(got), sorted(f"task {i}" for i in range(200)))
+
+    def test_missing_queue_is_empty(self):
+        self.assertIsNone(sup.TaskQueue(self.tmp / "nope.md").pop())
+
+
+class TestWorktrees(SupervisorTestBase):
+
+    def test_created_per_worker_and_reused(self):
+        self._supervisor(workers=2)
+        for i in (1, 2):
+            self.assertTrue((self.tmp / "wt" / f"worker-{i}" / ".git").is_file())
+        self._supervisor(workers=2)  # reuse, no error
+        branches = subprocess.run(["git", "-C", str(self.repo), "branch"],
+                                  capture_output=True, text=True).stdout
+        self.assertIn("wf-worker-2", branches)
+
+
+class TestRun(SupervisorTestBase):
+
+    def test_resumes_session_until_recycle(self):
+        self.queue.write_text("a\nb\nc\nd\n")
+        # 50K growth per task on a 200K window: after task 3 (75%) the
+        # next task would cross critical (90%) → fresh session.
+        stats = self._supervisor(prompt="/wf-core:wf-implement {task}").run()
+        calls = self._calls()
+        self.assertEqual([c["flag"] for c in calls], ["--session-id", "--resume", "--resume", "--session-id"])
+        self.assertEqual(len({c["sid"] for c in calls}), 2)
+        self.assertEqual(calls[0]["prompt"], "/wf-core:wf-implement a")
+        self.assertTrue(calls[0]["cwd"].endswith("worker-1"))
+        self.assertEqual(calls[0]["loop"], "true")
+        self.assertEqual((stats["done"], stats["recycles"], stats["tokens_per_task"]), (4, 1, 1050))
+
+    def test_recycle_at_threshold(self):
+        os.environ["FAKE_GROWTH"] = "170000"
+        self.queue.write_text("a\nb\n")
+        self._supervisor().run()
+        self.assertEqual([c["flag"] for c in self._calls()], ["--session-id", "--session-id"])
+
+    def test_failed_task_logged_and_session_recycled(self):
+        self.queue.write_text("fail me\nok\n")
+        stats = self._supervisor().run()
+        results = [json.loads(line) for line in (self.tmp / "tasks.md.results.jsonl").read_text().splitlines()]
+        self.assertEqual([(r["task"], r["ok"]) for r in results], [("fail me", False), ("ok", True)])
+        self.assertEqual([c["flag"] for c in self._calls()], ["--session-id", "--session-id"])
+        self.assertEqual((stats["done"], stats["failed"]), (1, 1))
+
+    def test_parallel_workers_drain_queue_and_write_stats(self):
+        self.queue.write_text("".join(f"t{i}\n" for i in range(9)))
+        supervisor = self._supervisor(workers=3)
+        stats = supervisor.run()
+        self.assertEqual(stats["done"], 9)
+        self.assertEqual(len({c["cwd"] for c in self._calls()}), 3)
+        saved = json.loads((wo.STATE_DIR / "supervisor" / f"{supervisor.run_id}.json").read_text())
+        self.assertEqual(saved["done"], 9)
+        self.assertGreater(saved["tasks_per_hour"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
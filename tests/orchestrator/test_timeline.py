@@ -0,0 +1,129 @@
+"""Tests for the per-session token timeline and time-to-critical forecast.
+
+Covers:
+  - Fixed-width sidecar: append, tail reads, torn records, cap trimming
+  - One record per newly observed turn total
+  - Rolling growth rate reset by compaction; turns-to-critical forecast
+  - Forecast in the warning message
+  - `--mode=timeline` dump and stats aggregation
+"""
+
+import io
+import json
+import os
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo, wr
+
+
+class TestTimelineFile(ContextMonitorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = wo.STATE_DIR / "timeline" / "s.tl"
+
+    def test_append_and_read(self):
+        for i, tokens in enumerate((1_000, 2_000, 3_000)):
+            wo.append_timeline(self.path, tokens, ts=100 + i)
+        self.assertEqual(self.path.stat().st_size, 3 * wo.TIMELINE_RECORD.size)
+        self.assertEqual(wo.read_timeline(self.path), [(100, 1_000), (101, 2_000), (102, 3_000)])
+        self.assertEqual(wo.read_timeline(self.path, last=2), [(101, 2_000), (102, 3_000)])
+
+    def test_torn_record_ignored(self):
+        wo.append_timeline(self.path, 5_000, ts=1)
+        with open(self.path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        self.assertEqual(wo.read_timeline(self.path), [(1, 5_000)])
+
+    def test_missing_file(self):
+        self.assertEqual(wo.read_timeline(self.path), [])
+
+    def test_trimmed_past_cap(self):
+        with mock.patch.object(wo, "TIMELINE_MAX_RECORDS", 8):
+            for i in range(9):
+                wo.append_timeline(self.path, i, ts=i)
+        self.assertEqual([n for _, n in wo.read_timeline(self.path)], [5, 6, 7, 8])
+
+
+class TestForecast(unittest.TestCase):
+
+    def test_rate_and_turns(self):
+        samples = [(t, 100_000 + 10_000 * t) for t in range(5)]   # 140K now
+        rate, turns = wo._growth_forecast(samples, 180_000)
+        self.assertEqual(rate, 10_000)
+        self.assertEqual(turns, 4)
+
+    def test_compaction_resets_window(self):
+        samples = [(0, 150_000), (1, 170_000), (2, 40_000), (3, 45_000)]
+        rate, turns = wo._growth_forecast(samples, 180_000)
+        self.assertEqual(rate, 5_000)
+        self.assertEqual(turns, 27)
+
+    def test_no_forecast_without_growth(self):
+        self.assertEqual(wo._growth_forecast([(0, 1)], 10), (None, None))
+        self.assertEqual(wo._growth_forecast([(0, 5), (1, 5)], 10), (0.0, None))
+        self.assertIsNone(wo._growth_forecast([(0, 5), (1, 20)], 10)[1])
+
+
+class TestHookIntegration(ContextMonitorTestBase):
+
+    def _append(self, path: str, tokens: int):
+        with open(path, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=tokens)) + "\n")
+
+    def test_one_record_per_new_turn(self):
+        path = self._write_transcript([_usage_entry(input_tokens=10_000)])
+        orch = self._make_orch(transcript_path=path)
+        orch._get_context_usage()
+        orch._get_context_usage()
+        self._append(path, 12_000)
+        orch._get_context_usage()
+        records = wo.read_timeline(wo._timeline_path("test-session"))
+        self.assertEqual([n for _, n in records], [10_000, 12_000])
+
+    def test_warning_includes_forecast(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        path = self._write_transcript([_usage_entry(input_tokens=120_000)])
+        orch = self._make_orch(transcript_path=path)
+        for tokens in (130_000, 140_000):
+            self.assertIsNone(orch.handle_context_check())
+            self._append(path, tokens)
+        self.assertIsNone(orch.handle_context_check())
+        self._append(path, 150_000)   # 75% — warning
+        out = orch.handle_context_check()
+        self.assertIn("(~3 tool calls to critical)", out["systemMessage"])
+        self.assertIn("Growth: ~10,000 tokens/turn", out["hookSpecificOutput"]["additionalContext"])
+
+    def test_warning_without_history_has_no_forecast(self):
+        os.environ["WF_CONTEXT_LIMIT"] = "200000"
+        path = self._write_transcript([_usage_entry(input_tokens=160_000)])
+        out = self._make_orch(transcript_path=path).handle_context_check()
+        self.assertNotIn("tool calls to critical", out["systemMessage"])
+
+
+class TestTooling(ContextMonitorTestBase):
+
+    def test_timeline_mode_csv_and_json(self):
+        path = wo._timeline_path("abc")
+        wo.append_timeline(path, 1_000, ts=10)
+        wo.append_timeline(path, 3_000, ts=20)
+        out = io.StringIO()
+        self.assertEqual(wr.run_timeline("abc", out=out), 0)
+        self.assertEqual(out.getvalue(), "ts,tokens\n10,1000\n20,3000\n")
+        out = io.StringIO()
+        wr.run_timeline("abc", fmt="json", out=out)
+        self.assertEqual(json.loads(out.getvalue())[1], {"ts": 20, "tokens": 3_000})
+
+    def test_stats_mean_growth(self):
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        (wo.STATE_DIR / "abc.json").write_text(json.dumps({"project": "p"}))
+        for ts, tokens in enumerate((10_000, 20_000, 40_000, 5_000, 15_000)):
+            wo.append_timeline(wo._timeline_path("abc"), tokens, ts=ts)
+        (group,) = wr.collect_stats(wo.STATE_DIR)
+        self.assertEqual(group["turns"], 5)
+        self.assertEqual(group["mean_growth_per_turn"], 13_333)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""Tests for per-tool wall-clock latency profiling.
+
+Covers:
+  - PreToolUse start markers paired with PostToolUse by `tool_use_id`
+  - Tool labels (Bash split by program) and the label cap
+  - Histogram quantiles and `--mode=report`
+  - `wf_tool_latency_seconds` in the metrics textfile
+  - wf-hook.py marking unguarded tools without loading the orchestrator
+"""
+
+import importlib.util
+import io
+import json
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _SCRIPT_PATH, wo, wr
+
+_HOOK_PATH = _SCRIPT_PATH.with_name("wf-hook.py")
+_hook_spec = importlib.util.spec_from_file_location("wf_hook", _HOOK_PATH)
+wh = importlib.util.module_from_spec(_hook_spec)
+_hook_spec.loader.exec_module(wh)
+
+
+class LatencyTestBase(ContextMonitorTestBase):
+
+    def _call(self, tool_name: str, started: float, ended: float, tool_use_id: str = "toolu_1",
+              **tool_input):
+        hook_input = {
+            "session_id": "test-session",
+            "transcript_path": str(self.tmp / "missing.jsonl"),
+            "cwd": str(self.tmp),
+            "tool_name": tool_name,
+            "tool_input": tool_input,
+            "tool_use_id": tool_use_id,
+        }
+        wo.mark_tool_start(hook_input, now=started)
+        orch = wo.WFOrchestrator(hook_input, cleanup=False)
+        orch.state["cwd"] = str(self.tmp)
+        orch.record_tool_latency(now=ended)
+        return orch
+
+
+class TestToolLabel(unittest.TestCase):
+
+    def test_labels(self):
+        cases = {
+            "pytest -q tests": "Bash:pytest",
+            "cd web && CI=1 npm test": "Bash:npm",
+            "FOO=1 time /usr/bin/gh pr list | head": "Bash:gh",
+            "cd sub": "Bash",
+        }
+        for command, expected in cases.items():
+            with self.subTest(command=command):
+                self.assertEqual(wo._tool_label("Bash", {"command": command}), expected)
+        self.assertEqual(wo._tool_label("mcp__playwright__browser_click", {}), "mcp__playwright__browser_click")
+
+
+class TestRecording(LatencyTestBase):
+
+    def test_pairs_start_and_end(self):
+        self._call("Bash", 1_000.0, 1_042.0, command="pytest")
+        orch = self._call("Read", 1_050.0, 1_050.2, tool_use_id="toolu_2", file_path="x")
+        hist = orch.state["tool_latency"]["Bash:pytest"]
+        self.assertEqual((hist["count"], hist["max"]), (1, 42.0))
+        self.assertEqual(orch.state["tool_latency"]["Read"]["count"], 1)
+        self.assertEqual(list((wo.STATE_DIR / "tool_start").iterdir()), [])
+        saved = json.loads((wo.STATE_DIR / "test-session.json").read_text())
+        self.assertIn("Read", saved["tool_latency"])
+
+    def test_parallel_calls_keyed_by_id(self):
+        base = {"session_id": "test-session", "tool_name": "Bash", "tool_input": {"command": "gh api x"}}
+        wo.mark_tool_start(dict(base, tool_use_id="a"), now=100.0)
+        wo.mark_tool_start(dict(base, tool_use_id="b"), now=110.0)
+        orch = wo.WFOrchestrator(dict(base, tool_use_id="a"), cleanup=False)
+        orch.record_tool_latency(now=115.0)
+        orch.hook_input = dict(base, tool_use_id="b")
+        orch.record_tool_latency(now=115.0)
+        self.assertEqual(orch.state["tool_latency"]["Bash:gh"]["sum"], 20.0)
+
+    def test_missing_or_stale_start_ignored(self):
+        orch = wo.WFOrchestrator({"session_id": "test-session", "tool_name": "Read"}, cleanup=False)
+        orch.record_tool_latency(now=10.0)
+        self.assertNotIn("tool_latency", orch.state)
+        orch = self._call("Read", 0.0, wo.TOOL_START_MAX_AGE_S + 1.0)
+        self.assertNotIn("tool_latency", orch.state)
+
+    def test_label_cap_folds_into_other(self):
+        orch = None
+        for i in range(wo.TOOL_LATENCY_MAX_TOOLS + 3):
+            orch = self._call(f"mcp__t{i}", 0.0, 1.0, tool_use_id=f"id{i}")
+        tools = orch.state["tool_latency"]
+        self.assertEqual(len(tools), wo.TOOL_LATENCY_MAX_TOOLS + 1)
+        self.assertEqual(tools["other"]["count"], 3)
+
+
+class TestQuantiles(unittest.TestCase):
+
+    def test_interpolates_within_bucket(self):
+        hist = wo._new_histogram(wo.TOOL_LATENCY_BUCKETS)
+        for value in (12.0, 14.0, 16.0, 18.0):  # all in the (10, 30] bucket
+            wo._observe(hist, value, wo.TOOL_LATENCY_BUCKETS)
+        hist["max"] = 18.0
+        self.assertAlmostEqual(wr._histogram_quantile(hist, 0.5, wo.TOOL_LATENCY_BUCKETS), 14.0)
+        self.assertLessEqual(wr._histogram_quantile(hist, 0.95, wo.TOOL_LATENCY_BUCKETS), 18.0)
+
+    def test_overflow_bucket_uses_max(self):
+        hist = wo._new_histogram(wo.TOOL_LATENCY_BUCKETS)
+        wo._observe(hist, 900.0, wo.TOOL_LATENCY_BUCKETS)
+        hist["max"] = 900.0
+        self.assertEqual(wr._histogram_quantile(hist, 1.0, wo.TOOL_LATENCY_BUCKETS), 900.0)
+        self.assertGreater(wr._histogram_quantile(hist, 0.5, wo.TOOL_LATENCY_BUCKETS), 600.0)
+
+
+class TestReport(LatencyTestBase):
+
+    def test_text_report_for_cwd(self):
+        self._call("Bash", 0.0, 90.0, command="pytest")
+        self._call("Read", 0.0, 0.5, tool_use_id="toolu_2")
+        out = io.StringIO()
+        self.assertEqual(wr.run_report(cwd=str(self.tmp), out=out), 0)
+        text = out.getvalue()
+        self.assertIn("2 calls, 1m30s in tools", text)
+        self.assertLess(text.index("Bash:pytest"), text.index("Read"))
+
+    def test_json_report_by_session(self):
+        self._call("Bash", 0.0, 3.0, command="gh pr view")
+        out = io.StringIO()
+        wr.run_report("test-session", fmt="json", out=out)
+        (row,) = json.loads(out.getvalue())["tools"]
+        self.assertEqual((row["tool"], row["calls"], row["max_s"]), ("Bash:gh", 1, 3.0))
+
+    def test_unknown_session(self):
+        self.assertEqual(wr.run_report("nope", out=io.StringIO()), 1)
+
+
+class TestExport(LatencyTestBase):
+
+    def test_tool_histogram_in_textfile(self):
+        self._call("Bash", 0.0, 42.0, command="pytest")
+        text = wr.render_metrics(wo.STATE_DIR)
+        self.assertIn("# TYPE wf_tool_latency_seconds histogram", text)
+        self.assertIn('wf_tool_latency_seconds_bucket{tool="Bash:pytest",le="30.0"} 0', text)
+        self.assertIn('wf_tool_latency_seconds_bucket{tool="Bash:pytest",le="60.0"} 1', text)
+        self.assertIn('wf_tool_latency_seconds_count{tool="Bash:pytest"} 1', text)
+
+
+class TestHookStub(LatencyTestBase):
+
+    def _run_stub(self, hook_input):
+        with mock.patch.object(wh, "_STATE_DIR", str(wo.STATE_DIR)), \
+                mock.patch.object(wh.sys, "argv", ["wf-hook.py", "--mode=pre-tool-use"]), \
+                mock.patch.object(wh.sys, "stdin", io.StringIO(json.dumps(hook_input))), \
+                mock.patch.object(wh, "_load_orchestrator", side_effect=AssertionError("loaded")), \
+                self.assertRaises(SystemExit) as exit_:
+            wh.main()
+        self.assertEqual(exit_.exception.code, 0)
+
+    def test_guarded_tools_match(self):
+        self.assertEqual(wh._GUARDED_TOOLS, wo.PRE_TOOL_GUARDED_TOOLS)
+
+    def test_unguarded_tool_marked_without_orchestrator(self):
+        hook_input = {"session_id": "test-session", "tool_name": "mcp__x__y", "tool_use_id": "toolu_9/.."}
+        self._run_stub(hook_input)
+        self.assertIsNotNone(wo.take_tool_start(hook_input))
+        self.assertEqual(list((wo.STATE_DIR / "tool_start").iterdir()), [])
+
+    def test_guarded_tool_loads_orchestrator(self):
+        with self.assertRaises(AssertionError):
+            self._run_stub({"session_id": "test-session", "tool_name": "Read", "tool_use_id": "t"})
+
+
+if __name__ == "__main__":
+    unittest.main()
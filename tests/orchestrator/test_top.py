@@ -0,0 +1,130 @@
+"""Tests for the `--mode=top` live session view.
+
+Covers:
+  - Active-session filtering by state-file mtime
+  - Incremental polling: cursors seeded from state, transcripts only
+    re-read when size/mtime move
+  - Growth rate and flags
+  - Subagent rows under their session
+  - Single-frame rendering
+"""
+
+import io
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+from test_context_monitor import ContextMonitorTestBase, _usage_entry, wo, wr
+
+
+class TopTestBase(ContextMonitorTestBase):
+
+    def _write_state(self, sid: str, transcript: str = "", **fields) -> str:
+        wo.STATE_DIR.mkdir(parents=True, exist_ok=True)
+        state = dict(fields)
+        if transcript:
+            state["transcript_path"] = transcript
+        path = wo.STATE_DIR / f"{sid}.json"
+        path.write_text(json.dumps(state))
+        return str(path)
+
+    def _transcript(self, name: str, *totals: int) -> str:
+        path = self.tmp / f"{name}.jsonl"
+        with open(path, "w") as f:
+            for t in totals:
+                f.write(json.dumps(_usage_entry(input_tokens=t)) + "\n")
+        return str(path)
+
+
+class TestSessionTop(TopTestBase):
+
+    def test_lists_active_sessions_fullest_first(self):
+        self._write_state("low", self._transcript("low", 100_000), project="a")
+        self._write_state("high", self._transcript("high", 180_000), project="b",
+                          context_window=200_000, warning_shown=True)
+        rows = wr.SessionTop(wo.STATE_DIR).poll()
+        self.assertEqual([r["session"] for r in rows], ["high", "low"])
+        self.assertAlmostEqual(rows[0]["pct"], 90.0)
+        self.assertEqual(rows[0]["window"], 200_000)
+        self.assertEqual(rows[0]["flags"], "W!")
+        self.assertEqual(rows[1]["window"], wo.DEFAULT_CONTEXT_LIMIT)
+
+    def test_stale_sessions_hidden(self):
+        path = self._write_state("old", self._transcript("old", 10_000))
+        past = time.time() - wr.TOP_ACTIVE_SECONDS - 60
+        os.utime(path, (past, past))
+        self.assertEqual(wr.SessionTop(wo.STATE_DIR).poll(), [])
+
+    def test_seeds_from_persisted_cursor(self):
+        transcript = self._transcript("t", 50_000)
+        cursor = wo._scan_transcript(transcript)
+        self._write_state("s", transcript, transcript_cursor=cursor)
+        with mock.patch.object(wo, "_scan_transcript", wraps=wo._scan_transcript) as scan:
+            wr.SessionTop(wo.STATE_DIR).poll()
+        # Resumed at the stored offset rather than byte 0.
+        self.assertEqual(scan.call_args[0][1]["offset"], cursor["offset"])
+
+    def test_unchanged_transcript_not_rescanned(self):
+        self._write_state("s", self._transcript("t", 50_000))
+        top = wr.SessionTop(wo.STATE_DIR)
+        top.poll()
+        with mock.patch.object(wo, "_scan_transcript") as scan:
+            rows = top.poll()
+        scan.assert_not_called()
+        self.assertEqual(rows[0]["tokens"], 50_000)
+
+    def test_growth_rate_from_appended_turns(self):
+        transcript = self._transcript("t", 100_000)
+        self._write_state("s", transcript)
+        top = wr.SessionTop(wo.STATE_DIR)
+        t0 = time.time()
+        top.poll(now=t0)
+        with open(transcript, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=130_000)) + "\n")
+        (row,) = top.poll(now=t0 + 60)
+        self.assertEqual(row["tokens"], 130_000)
+        self.assertAlmostEqual(row["rate_per_min"], 30_000)
+
+    def test_compaction_resets_growth(self):
+        transcript = self._transcript("t", 150_000)
+        self._write_state("s", transcript)
+        top = wr.SessionTop(wo.STATE_DIR)
+        t0 = time.time()
+        top.poll(now=t0)
+        with open(transcript, "a") as f:
+            f.write(json.dumps(_usage_entry(input_tokens=40_000)) + "\n")
+        (row,) = top.poll(now=t0 + 30)
+        self.assertEqual(row["rate_per_min"], 0.0)
+
+
+    def test_subagent_rows(self):
+        agents = {
+            "low": {"pct": 10.0, "window": 200_000, "cursor": {"latest": 20_000}},
+            "high": {"pct": 90.0, "window": 200_000, "cursor": {"latest": 180_000}},
+        }
+        self._write_state("s1", self._transcript("s1", 10_000), subagents=agents)
+        (row,) = wr.SessionTop(wo.STATE_DIR).poll()
+        self.assertEqual([a["agent"] for a in row["subagents"]], ["high", "low"])
+        self.assertEqual(row["subagents"][0]["tokens"], 180_000)
+        lines = wr._format_top([row]).splitlines()
+        self.assertTrue(lines[-2].startswith("  └ agent-high"))
+        self.assertIn("180K  90.0%    200K", lines[-2])
+
+
+class TestRunTop(TopTestBase):
+
+    def test_once_renders_single_frame(self):
+        self._write_state("abc", self._transcript("t", 123_000), project="proj")
+        out = io.StringIO()
+        self.assertEqual(wr.run_top(once=True, out=out), 0)
+        text = out.getvalue()
+        self.assertIn("1 active session", text)
+        self.assertIn("proj", text)
+        self.assertIn("123K", text)
+        self.assertNotIn("\x1b[2J", text)
+
+
+if __name__ == "__main__":
+    unittest.main()